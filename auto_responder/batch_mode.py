@@ -0,0 +1,289 @@
+"""
+Deferred reply generation through the OpenAI Batch API.
+
+Brands outside their working hours (or any low-priority backlog with --all) don't need
+an answer right away, so their pending comments are sent as one Batch API job at the
+lower batch price instead of through the synchronous path:
+
+    submit  fetch new comments for brands outside working hours, write every pending
+            comment as a combined classify-and-generate request to batches/*.jsonl and
+            submit the file
+    poll    check open batches and ingest finished results into comment_store
+            (replies are stored as drafts, declined comments are marked skipped)
+    post    post stored drafts for brands whose working hours are open
+
+The "local" backend is an offline stand-in for the batch endpoint: it runs each line
+through llm.chat_completion when first polled and writes output in the Batch API's
+output format, so the whole flow can be exercised without the real endpoint. The
+"openai" backend also honors OPENAI_BASE_URL for a local fake server.
+
+Run from the repository root:
+    python -m auto_responder.batch_mode submit --backend local
+    python -m auto_responder.batch_mode poll
+    python -m auto_responder.batch_mode post --dry-run
+"""
+
+import os
+import json
+import uuid
+import argparse
+import datetime
+from auto_responder import responder, metrics
+from auto_responder.llm import chat_completion, get_scheduler
+from auto_responder.comment_store import get_store, init_comment_db, claim_comments, release_comments
+from auto_responder.config_registry import get_registry
+from auto_responder.reply_index import remember_reply
+from auto_responder.event_log import log_event
+
+BATCH_FOLDER = "batches"
+BATCH_ENDPOINT = "/v1/chat/completions"
+COMPLETION_WINDOW = "24h"
+MAX_REQUESTS_PER_BATCH = 50000  # Batch API limit per input file
+IN_PROGRESS_STATUSES = {"validating", "in_progress", "finalizing", "submitted"}
+
+
+class OpenAIBatchBackend:
+    """
+    Submits batch files to the OpenAI Files and Batches APIs.
+    """
+
+    name = "openai"
+
+    def __init__(self, client=None):
+        self.client = client or get_scheduler().client
+
+    def submit(self, input_file):
+        with open(input_file, "rb") as f:
+            uploaded = self.client.files.create(file=f, purpose="batch")
+        batch = self.client.batches.create(
+            input_file_id=uploaded.id, endpoint=BATCH_ENDPOINT, completion_window=COMPLETION_WINDOW
+        )
+        return batch.id
+
+    def status(self, batch):
+        """
+        Returns:
+            tuple: (status, output JSONL text or None until the batch has completed)
+        """
+        remote = self.client.batches.retrieve(batch["batch_id"])
+        if remote.status != "completed" or not remote.output_file_id:
+            return remote.status, None
+        return remote.status, self.client.files.content(remote.output_file_id).text
+
+
+class LocalBatchBackend:
+    """
+    Offline stand-in for the Batch API that runs requests through the normal LLM scheduler.
+    """
+
+    name = "local"
+
+    def submit(self, input_file):
+        return f"local_{uuid.uuid4().hex[:12]}"
+
+    def status(self, batch):
+        output_file = os.path.join(BATCH_FOLDER, f"{batch['batch_id']}.output.jsonl")
+        if not os.path.exists(output_file):
+            with open(batch["input_file"]) as src, open(output_file, "w") as out:
+                for line in src:
+                    out.write(json.dumps(self._run(json.loads(line))) + "\n")
+        with open(output_file) as f:
+            return "completed", f.read()
+
+    def _run(self, request):
+        result = {"id": f"batch_req_{uuid.uuid4().hex[:12]}", "custom_id": request["custom_id"], "response": None, "error": None}
+        try:
+            response = chat_completion(**request["body"])
+            result["response"] = {"status_code": 200, "body": response.model_dump()}
+        except Exception as e:
+            result["error"] = {"code": type(e).__name__, "message": str(e)}
+        return result
+
+
+BACKENDS = {backend.name: backend for backend in (OpenAIBatchBackend, LocalBatchBackend)}
+
+
+def batch_line(comment, client_config):
+    return {
+        "custom_id": comment["id"],
+        "method": "POST",
+        "url": BATCH_ENDPOINT,
+        "body": responder.combined_request(comment["message"], client_config)
+    }
+
+
+def submit_pending(backend, all_brands=False, verbose=False):
+    """
+    Collect pending comments into a batch file and submit it.
+
+    Parameters:
+        backend: OpenAIBatchBackend or LocalBatchBackend instance.
+        all_brands (bool): Also include brands that are within working hours.
+        verbose (bool): If True, print detailed information about the process.
+
+    Returns:
+        str or None: The batch ID, or None if nothing was pending.
+    """
+    store = get_store()
+    lines = []
+    for client_config in get_registry().configs():
+        brand_name = client_config.brand_name
+        page_id = client_config.facebook_page_id
+        page_access_token = client_config.page_access_token
+        if not client_config.auto_reply_enabled or not page_id or not page_access_token:
+            continue
+        if client_config.within_working_hours() and not all_brands:
+            continue  # urgent traffic stays on the synchronous path
+        responder.fetch_comments(page_id, page_access_token, brand_name, verbose)
+
+        skipped = []
+        for comment in store.get_pending_comments(page_id, limit=MAX_REQUESTS_PER_BATCH - len(lines)):
+            if responder.cached_decision(comment["message"], client_config) is False:
+                skipped.append(comment["id"])
+            else:
+                lines.append(batch_line(comment, client_config))
+        store.mark_comments_as_skipped(skipped)
+        if verbose:
+            print(f"[{brand_name}] {len(lines)} request(s) queued so far, {len(skipped)} skipped by filters.")
+
+    if not lines:
+        print("No pending comments to submit.")
+        return None
+
+    os.makedirs(BATCH_FOLDER, exist_ok=True)
+    input_file = os.path.join(BATCH_FOLDER, f"requests_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}.jsonl")
+    with open(input_file, "w") as f:
+        for line in lines:
+            f.write(json.dumps(line, ensure_ascii=False) + "\n")
+
+    batch_id = backend.submit(input_file)
+    store.record_batch(batch_id, backend.name, input_file, [line["custom_id"] for line in lines])
+    print(f"✅ Submitted batch {batch_id} with {len(lines)} request(s) ({input_file}).")
+    return batch_id
+
+
+def ingest_results(output_text, record_usage=True):
+    """
+    Store the replies from a batch output file as drafts and mark declined comments as skipped.
+
+    Lines that errored or don't parse are left alone; closing the batch returns those
+    comments to the pending pool so the next submit retries them. Token usage of the
+    results is added to the metrics unless `record_usage` is False (the local backend's
+    calls were already counted when they ran).
+
+    Returns:
+        tuple: (drafts, skipped, failed) counts.
+    """
+    drafts, skipped, failed = [], [], 0
+    for line in output_text.splitlines():
+        if not line.strip():
+            continue
+        try:
+            result = json.loads(line)
+        except ValueError:
+            failed += 1
+            continue
+        if not isinstance(result, dict) or "custom_id" not in result:
+            failed += 1
+            continue
+        response = result.get("response") or {}
+        if result.get("error") or not isinstance(response, dict) or response.get("status_code") != 200:
+            failed += 1
+            continue
+        usage = response["body"].get("usage") if isinstance(response.get("body"), dict) else None
+        if record_usage and usage:
+            metrics.record_tokens(
+                response["body"].get("model"), usage.get("prompt_tokens", 0), usage.get("completion_tokens", 0)
+            )
+        try:
+            decision = responder.parse_triage_result(response["body"]["choices"][0]["message"]["content"])
+        except (ValueError, KeyError, IndexError, TypeError):
+            failed += 1
+            continue
+        if decision["respond"]:
+            drafts.append((decision["reply"], result["custom_id"]))
+        else:
+            skipped.append(result["custom_id"])
+
+    store = get_store()
+    with store.transaction():
+        store.save_draft_replies(drafts)
+        store.mark_comments_as_skipped(skipped)
+    return len(drafts), len(skipped), failed
+
+
+def poll_batches():
+    """
+    Check every open batch and ingest the ones that have finished.
+    """
+    store = get_store()
+    for batch in store.get_open_batches():
+        backend = BACKENDS[batch["backend"]]()
+        status, output_text = backend.status(batch)
+        if status in IN_PROGRESS_STATUSES:
+            print(f"Batch {batch['batch_id']} is {status}.")
+            continue
+        if status == "completed" and output_text is not None:
+            record_usage = batch["backend"] != LocalBatchBackend.name
+            drafts, skipped, failed = ingest_results(output_text, record_usage)
+            store.close_batch(batch["batch_id"], "ingested")
+            print(f"✅ Batch {batch['batch_id']}: {drafts} draft(s), {skipped} skipped, {failed} to retry.")
+        else:
+            store.close_batch(batch["batch_id"], "failed")
+            print(f"❌ Batch {batch['batch_id']} ended as {status}; its comments will be resubmitted.")
+
+
+def post_ready_drafts(dry_run=False):
+    """
+    Post stored draft replies for every brand that is currently within working hours.
+    """
+    store = get_store()
+    for client_config in get_registry().configs():
+        if responder.skip_reason(client_config):
+            continue
+        brand_name = client_config.brand_name
+        drafts = claim_comments(store.get_draft_replies(client_config.facebook_page_id))
+        if not drafts:
+            continue
+        responded = []
+        try:
+            if dry_run:
+                for draft in drafts:
+                    print(f"[DRY RUN] Reply for comment ID {draft['id']}: {draft['reply_text']}")
+                continue
+            results = responder.post_comment_replies(
+                [(draft["id"], draft["reply_text"]) for draft in drafts], client_config.page_access_token
+            )
+            for draft, result in zip(drafts, results):
+                if result["ok"]:
+                    responded.append(draft["id"])
+                    remember_reply(draft["id"], draft["message"], draft["reply_text"], client_config)
+                    log_event("reply", brand=brand_name, comment_id=draft["id"], message=draft["message"],
+                              reply=draft["reply_text"], deferred=True)
+                else:
+                    print(f"[{brand_name}] ❌ Failed to post draft reply to {draft['id']}: {result['error']}")
+            store.mark_comments_as_responded(responded)
+            metrics.count(brand_name, "replied", len(responded))
+            metrics.count(brand_name, "failed", len(drafts) - len(responded))
+            print(f"[{brand_name}] Posted {len(responded)}/{len(drafts)} deferred replies.")
+        finally:
+            release_comments(responded, handled=True)
+            release_comments([draft["id"] for draft in drafts if draft["id"] not in set(responded)])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate replies for off-hours comments with the OpenAI Batch API.")
+    parser.add_argument("command", choices=["submit", "poll", "post"], help="Step to run.")
+    parser.add_argument("--backend", choices=sorted(BACKENDS), default="openai", help="Batch backend for submit.")
+    parser.add_argument("--all", action="store_true", help="Submit pending comments for all brands, not only closed ones.")
+    parser.add_argument("--dry-run", action="store_true", help="Preview draft replies without posting them.")
+    parser.add_argument("--verbose", action="store_true", help="Print per-brand details.")
+    args = parser.parse_args()
+
+    init_comment_db()
+    if args.command == "submit":
+        submit_pending(BACKENDS[args.backend](), all_brands=args.all, verbose=args.verbose)
+    elif args.command == "poll":
+        poll_batches()
+    else:
+        post_ready_drafts(dry_run=args.dry_run)
@@ -0,0 +1,96 @@
+"""
+Runtime form of a configs/*_config.json file.
+
+Each config is compiled once into a ClientConfig: the timezone is resolved, filters are
+compiled and the reply prompt prefix and config version hash are precomputed, so the
+per-comment path only reads attributes.
+"""
+
+import datetime
+import json
+import pytz
+from auto_responder.filters import compile_client_filters
+from auto_responder.decision_cache import config_version
+
+DEFAULT_RESPONSE_PROMPT = "You are a helpful social media assistant."
+
+
+class ClientConfig:
+    """
+    A brand's configuration with everything the hot path needs resolved up front.
+
+    The original JSON is kept in `raw` for anything not lifted into an attribute. Two configs
+    are equal only if their whole JSON is; `version` covers just the fields that change triage
+    decisions and is what caches key on.
+    """
+
+    __slots__ = (
+        "raw", "brand_name", "page_ids", "facebook_page_id", "instagram_page_id", "page_access_token",
+        "auto_reply_enabled", "tzinfo", "work_start", "work_end", "reply_style", "response_prompt",
+        "reply_prompt_prefix", "triage_mode", "triage_batch_size", "reply_reuse_threshold", "filters",
+        "version", "_hash",
+    )
+
+    def __init__(self, raw):
+        self.raw = raw
+        self.brand_name = raw["brand_name"]
+        self.page_ids = raw.get("page_ids", {})
+        self.facebook_page_id = self.page_ids.get("facebook")
+        self.instagram_page_id = self.page_ids.get("instagram")
+        self.page_access_token = raw.get("page_access_token")
+        self.auto_reply_enabled = raw.get("auto_reply_enabled", False)
+        self.tzinfo = pytz.timezone(raw["timezone"])
+        self.work_start = raw["working_hours"]["start"]
+        self.work_end = raw["working_hours"]["end"]
+        self.reply_style = raw.get("reply_style")
+        self.response_prompt = raw.get("response_prompt", DEFAULT_RESPONSE_PROMPT)
+        self.reply_prompt_prefix = f"Respond to the following comment in a {self.reply_style} tone:\n\n"
+        self.triage_mode = raw.get("triage_mode", "two_call")
+        self.triage_batch_size = raw.get("triage_batch_size")
+        self.reply_reuse_threshold = raw.get("reply_reuse_threshold")
+        self.filters = compile_client_filters(raw)
+        self.version = config_version(raw)
+        self._hash = hash(json.dumps(raw, sort_keys=True, default=str))
+
+    def __hash__(self):
+        return self._hash
+
+    def __eq__(self, other):
+        if not isinstance(other, ClientConfig):
+            return NotImplemented
+        return self._hash == other._hash and self.raw == other.raw
+
+    def __repr__(self):
+        return f"ClientConfig({self.brand_name!r}, version={self.version!r})"
+
+    def within_working_hours(self, now=None):
+        """
+        True if the current hour in the brand's timezone is within its working hours.
+        """
+        now = (now or datetime.datetime.now(self.tzinfo)).astimezone(self.tzinfo)
+        return self.work_start <= now.hour < self.work_end
+
+    def next_transition(self, now=None):
+        """
+        Return the next time the brand opens or closes as an aware datetime, or None if
+        its hours never change (always open or never open).
+        """
+        if self.work_start >= self.work_end or (self.work_start <= 0 and self.work_end >= 24):
+            return None
+        now = (now or datetime.datetime.now(self.tzinfo)).astimezone(self.tzinfo)
+        midnight = datetime.datetime.combine(now.date(), datetime.time())
+        if self.within_working_hours(now):
+            local = midnight + datetime.timedelta(hours=self.work_end)
+        elif now.hour < self.work_start:
+            local = midnight + datetime.timedelta(hours=self.work_start)
+        else:
+            local = midnight + datetime.timedelta(days=1, hours=self.work_start)
+        return self.tzinfo.localize(local)
+
+
+def load_client_config(path):
+    """
+    Read and compile a single config file.
+    """
+    with open(path, "r") as f:
+        return ClientConfig(json.load(f))
@@ -1,80 +1,605 @@
+import time
 import sqlite3
-from datetime import datetime
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from auto_responder import metrics
 
 DB_FILE = "comments.db"
 
+# Tuned for a single-writer, many-small-writes workload: WAL lets readers run alongside the
+# writer, and synchronous=NORMAL only fsyncs at checkpoints instead of on every commit.
+PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA cache_size=-20000",  # ~20 MB page cache
+    "PRAGMA busy_timeout=30000",
+)
 
-# Initialize the SQLite database for storing comments and posts
-def init_comment_db():
-    conn = sqlite3.connect(DB_FILE)
-    cursor = conn.cursor()
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS posts (
-            post_id TEXT PRIMARY KEY,
-            page_id TEXT,
+
+# Schema migrations, applied in order on top of the original tables. The database's
+# PRAGMA user_version records how many have run; append new steps, never edit old ones.
+MIGRATIONS = (
+    # 1: integer epoch timestamps (ISO strings with mixed +0000/+00:00 offsets don't sort
+    #    correctly) and indexes for per-post lookups and scans over unanswered comments.
+    (
+        "ALTER TABLE posts ADD COLUMN created_ts INTEGER",
+        "ALTER TABLE comments ADD COLUMN created_ts INTEGER",
+        "UPDATE posts SET created_ts = to_epoch(created_time) WHERE created_ts IS NULL",
+        "UPDATE comments SET created_ts = to_epoch(created_time) WHERE created_ts IS NULL",
+        "CREATE INDEX IF NOT EXISTS idx_posts_page_ts ON posts (page_id, created_ts)",
+        "CREATE INDEX IF NOT EXISTS idx_comments_post_page_ts ON comments (post_id, page_id, created_ts)",
+        "CREATE INDEX IF NOT EXISTS idx_comments_unresponded ON comments (page_id, created_ts) WHERE responded = 0",
+    ),
+    # 2: durable should_respond decisions shared across runs (see decision_cache.py).
+    (
+        """CREATE TABLE IF NOT EXISTS decision_cache (
+            cache_key TEXT PRIMARY KEY,
             brand_name TEXT,
-            created_time TEXT
+            decision INTEGER,
+            created_ts INTEGER,
+            last_used_ts INTEGER,
+            hits INTEGER DEFAULT 0
+        )""",
+        "CREATE INDEX IF NOT EXISTS idx_decision_cache_last_used ON decision_cache (last_used_ts)",
+    ),
+    # 3: deferred OpenAI Batch API generation (see batch_mode.py). Comments queued in a batch
+    #    carry its batch_id; finished replies wait in reply_text until the brand's hours open.
+    (
+        "ALTER TABLE comments ADD COLUMN reply_text TEXT",
+        "ALTER TABLE comments ADD COLUMN batch_id TEXT",
+        """CREATE TABLE IF NOT EXISTS llm_batches (
+            batch_id TEXT PRIMARY KEY,
+            backend TEXT,
+            status TEXT,
+            input_file TEXT,
+            request_count INTEGER,
+            created_ts INTEGER,
+            completed_ts INTEGER
+        )""",
+    ),
+    # 4: sharded workers (see sharding.py): worker heartbeats and expiring per-page leases.
+    (
+        """CREATE TABLE IF NOT EXISTS workers (
+            worker_id TEXT PRIMARY KEY,
+            started_ts INTEGER,
+            heartbeat_ts INTEGER
+        )""",
+        """CREATE TABLE IF NOT EXISTS client_leases (
+            page_id TEXT PRIMARY KEY,
+            worker_id TEXT,
+            expires_ts INTEGER
+        )""",
+    ),
+    # 5: staged work queue (see work_queue.py). Each comment records the stage it is waiting
+    #    for, with per-stage retry bookkeeping; existing rows are placed from their current state.
+    (
+        "ALTER TABLE comments ADD COLUMN stage TEXT DEFAULT 'triage'",
+        "ALTER TABLE comments ADD COLUMN attempts INTEGER DEFAULT 0",
+        "ALTER TABLE comments ADD COLUMN next_attempt_ts INTEGER",
+        "ALTER TABLE comments ADD COLUMN last_error TEXT",
+        """UPDATE comments SET stage = CASE
+            WHEN responded = 1 THEN 'done'
+            WHEN responded = 2 THEN 'skipped'
+            WHEN reply_text IS NOT NULL THEN 'post'
+            ELSE 'triage' END""",
+        "CREATE INDEX IF NOT EXISTS idx_comments_stage ON comments (stage, next_attempt_ts) "
+        "WHERE stage IN ('triage', 'generate', 'post')",
+    ),
+)
+SCHEMA_VERSION = len(MIGRATIONS)
+# Values of comments.responded
+PENDING = 0
+RESPONDED = 1
+SKIPPED = 2  # decided not to reply; never reconsidered
+# Values of comments.stage: the step a comment waits for, or where it ended up
+QUEUED_STAGES = ("triage", "generate", "post")
+FINAL_STAGES = ("done", "skipped", "failed")
+
+HANDLED_CACHE_SIZE = 100_000  # comment IDs remembered in memory as already answered
+
+
+class CommentStore:
+    """
+    Comment database with one long-lived connection shared by all threads.
+
+    Statements run in autocommit mode unless they are inside `transaction()`, which
+    groups any number of writes (including the bulk executemany helpers) into a
+    single commit. Access is serialized with a re-entrant lock, so the store can be
+    used from the responder's worker threads.
+    """
+
+    def __init__(self, db_file=DB_FILE):
+        self.db_file = db_file
+        self.conn = sqlite3.connect(db_file, check_same_thread=False, isolation_level=None, timeout=30)
+        for pragma in PRAGMAS:
+            self.conn.execute(pragma)
+        self.conn.create_function("to_epoch", 1, _sql_to_epoch, deterministic=True)
+        self.lock = threading.RLock()
+        self._depth = 0
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+    @contextmanager
+    def transaction(self):
+        """
+        Run the enclosed writes as one transaction; nested calls join the outer one.
+        The outermost transaction is timed as a db_write.
+        """
+        started = time.perf_counter()
+        with self.lock:
+            if self._depth == 0:
+                self.conn.execute("BEGIN IMMEDIATE")
+            self._depth += 1
+            try:
+                yield self
+            except BaseException:
+                self._depth -= 1
+                if self._depth == 0:
+                    self.conn.execute("ROLLBACK")
+                raise
+            self._depth -= 1
+            if self._depth == 0:
+                self.conn.execute("COMMIT")
+                metrics.observe("db_write", time.perf_counter() - started)
+
+    # Single write statement; autocommitted ones are timed as a db_write
+    def execute(self, sql, params=()):
+        started = time.perf_counter()
+        with self.lock:
+            cursor = self.conn.execute(sql, params)
+            if self._depth == 0:
+                metrics.observe("db_write", time.perf_counter() - started)
+            return cursor
+
+    def executemany(self, sql, rows):
+        with self.transaction():
+            return self.conn.executemany(sql, rows)
+
+    def query(self, sql, params=()):
+        with self.lock:
+            return self.conn.execute(sql, params).fetchall()
+
+    # Create the tables if they don't exist and bring the schema up to SCHEMA_VERSION
+    def init_schema(self):
+        self._create_base_tables()
+        self.migrate()
+
+    def schema_version(self):
+        return self.query("PRAGMA user_version")[0][0]
+
+    # Apply each pending migration in its own transaction, recording progress in user_version.
+    # user_version is re-read inside the write transaction, so when several processes open an
+    # older database at once each step is applied by exactly one of them.
+    def migrate(self):
+        with self.lock:
+            for version, statements in enumerate(MIGRATIONS, start=1):
+                if self.schema_version() >= version:
+                    continue
+                with self.transaction():
+                    if self.schema_version() >= version:
+                        continue
+                    for statement in statements:
+                        self.conn.execute(statement)
+                    self.conn.execute(f"PRAGMA user_version = {version}")
+                print(f"Migrated {self.db_file} to schema version {version}")
+
+    def _create_base_tables(self):
+        with self.transaction():
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS posts (
+                    post_id TEXT PRIMARY KEY,
+                    page_id TEXT,
+                    brand_name TEXT,
+                    created_time TEXT
+                )
+            """)
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS comments (
+                    comment_id TEXT PRIMARY KEY,
+                    user_id TEXT,
+                    page_id TEXT,
+                    post_id TEXT,
+                    brand_name TEXT,
+                    message TEXT,
+                    created_time TEXT,
+                    responded INTEGER DEFAULT 0
+                )
+            """)
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS sync_state (
+                    page_id TEXT PRIMARY KEY,
+                    last_synced_ts INTEGER
+                )
+            """)
+
+    # Insert post records, ignoring ones already stored
+    def log_posts(self, rows):
+        """rows: (post_id, page_id, brand_name, created_time) tuples."""
+        self.executemany("""
+            INSERT OR IGNORE INTO posts (post_id, page_id, brand_name, created_time, created_ts)
+            VALUES (?, ?, ?, ?, ?)
+        """, [(*row, _sql_to_epoch(row[3])) for row in rows])
+
+    # Insert comment records; returns the set of comment IDs that were not stored before
+    def log_comments(self, rows):
+        """rows: (comment_id, user_id, page_id, post_id, brand_name, message, created_time) tuples."""
+        rows = list(rows)
+        if not rows:
+            return set()
+        with self.transaction():
+            existing = self.existing_comment_ids([row[0] for row in rows])
+            self.conn.executemany("""
+                INSERT OR IGNORE INTO comments (comment_id, user_id, page_id, post_id, brand_name, message, created_time, created_ts)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            """, [(*row, _sql_to_epoch(row[6])) for row in rows])
+        return {row[0] for row in rows} - existing
+
+    # Return which of the given comment IDs are already in the database
+    def existing_comment_ids(self, comment_ids, chunk_size=500):
+        found = set()
+        comment_ids = list(comment_ids)
+        with self.lock:
+            for start in range(0, len(comment_ids), chunk_size):
+                chunk = comment_ids[start:start + chunk_size]
+                placeholders = ",".join("?" * len(chunk))
+                rows = self.conn.execute(
+                    f"SELECT comment_id FROM comments WHERE comment_id IN ({placeholders})", chunk
+                ).fetchall()
+                found.update(row[0] for row in rows)
+        return found
+
+    # Return which of the given comment IDs have already been responded to (or skipped)
+    def get_handled_comment_ids(self, comment_ids, chunk_size=500):
+        found = set()
+        comment_ids = list(comment_ids)
+        with self.lock:
+            for start in range(0, len(comment_ids), chunk_size):
+                chunk = comment_ids[start:start + chunk_size]
+                placeholders = ",".join("?" * len(chunk))
+                rows = self.conn.execute(
+                    f"SELECT comment_id FROM comments WHERE comment_id IN ({placeholders}) AND responded != 0", chunk
+                ).fetchall()
+                found.update(row[0] for row in rows)
+        return found
+
+    # Mark comments as responded in one statement batch
+    def mark_comments_as_responded(self, comment_ids, reply_texts=None):
+        reply_texts = reply_texts or {}
+        self.executemany(
+            "UPDATE comments SET responded = ?, stage = 'done', reply_text = COALESCE(?, reply_text) WHERE comment_id = ?",
+            [(RESPONDED, reply_texts.get(cid), cid) for cid in comment_ids]
         )
-    """)
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS comments (
-            comment_id TEXT PRIMARY KEY,
-            user_id TEXT,
-            page_id TEXT,
-            post_id TEXT,
-            brand_name TEXT,
-            message TEXT,
-            created_time TEXT,
-            responded INTEGER DEFAULT 0
+
+    # Mark comments the brand decided not to answer, so they are not triaged again
+    def mark_comments_as_skipped(self, comment_ids):
+        self.executemany(
+            "UPDATE comments SET responded = ?, stage = 'skipped' WHERE comment_id = ?", [(SKIPPED, cid) for cid in comment_ids]
+        )
+
+    # Unanswered comments for a page that have no draft reply and aren't queued in a batch
+    def get_pending_comments(self, page_id, limit=1000):
+        rows = self.query("""
+            SELECT comment_id, message, post_id, created_time FROM comments
+            WHERE page_id = ? AND stage = 'triage' AND responded = 0 AND reply_text IS NULL AND batch_id IS NULL
+            ORDER BY created_ts
+            LIMIT ?
+        """, (page_id, limit))
+        return [{"id": r[0], "message": r[1], "post_id": r[2], "created_time": r[3]} for r in rows]
+
+    # Unanswered comments for a page created since since_ts that are due for another try:
+    # still waiting for triage or for their draft reply to be posted, and not in a batch
+    def get_retry_comments(self, page_id, since_ts, now, limit=1000):
+        rows = self.query("""
+            SELECT comment_id, message, post_id, created_time, user_id, reply_text, attempts FROM comments
+            WHERE page_id = ? AND responded = 0 AND stage IN ('triage', 'post') AND batch_id IS NULL
+              AND created_ts >= ? AND (next_attempt_ts IS NULL OR next_attempt_ts <= ?)
+            ORDER BY created_ts
+            LIMIT ?
+        """, (page_id, since_ts, now, limit))
+        return [
+            {"id": r[0], "message": r[1], "post_id": r[2], "created_time": r[3], "from": r[4], "reply_text": r[5], "attempts": r[6]}
+            for r in rows
+        ]
+
+    # Unanswered comments for a page whose reply has been generated but not posted
+    def get_draft_replies(self, page_id, limit=1000):
+        rows = self.query("""
+            SELECT comment_id, message, post_id, created_time, reply_text FROM comments
+            WHERE page_id = ? AND responded = 0 AND reply_text IS NOT NULL
+            ORDER BY created_ts
+            LIMIT ?
+        """, (page_id, limit))
+        return [{"id": r[0], "message": r[1], "post_id": r[2], "created_time": r[3], "reply_text": r[4]} for r in rows]
+
+    # Most recently answered comments for a page with the reply that was posted, newest first
+    def get_answered_replies(self, page_id, limit=1000):
+        return self.query("""
+            SELECT comment_id, message, reply_text FROM comments
+            WHERE page_id = ? AND responded = ? AND reply_text IS NOT NULL
+            ORDER BY created_ts DESC
+            LIMIT ?
+        """, (page_id, RESPONDED, limit))
+
+    # Store generated replies to post later; rows are (reply_text, comment_id)
+    def save_draft_replies(self, rows):
+        self.executemany("""
+            UPDATE comments SET reply_text = ?, batch_id = NULL, stage = 'post', attempts = 0, next_attempt_ts = NULL
+            WHERE comment_id = ?
+        """, rows)
+
+    # Comments waiting for a queue stage whose retry time has come, oldest first
+    def get_stage_batch(self, stage, now, limit=100):
+        rows = self.query("""
+            SELECT comment_id, message, post_id, page_id, created_time, reply_text, attempts FROM comments
+            WHERE stage = ? AND (next_attempt_ts IS NULL OR next_attempt_ts <= ?) AND batch_id IS NULL
+            ORDER BY created_ts
+            LIMIT ?
+        """, (stage, now, limit))
+        return [
+            {"id": r[0], "message": r[1], "post_id": r[2], "page_id": r[3], "created_time": r[4], "reply_text": r[5], "attempts": r[6]}
+            for r in rows
+        ]
+
+    # Move comments that should be answered on to reply generation
+    def queue_for_generation(self, comment_ids):
+        self.executemany(
+            "UPDATE comments SET stage = 'generate', attempts = 0, next_attempt_ts = NULL WHERE comment_id = ?",
+            [(cid,) for cid in comment_ids]
+        )
+
+    # Count a try at a stage before it has side effects (used before posting)
+    def count_attempts(self, comment_ids):
+        self.executemany("UPDATE comments SET attempts = attempts + 1 WHERE comment_id = ?", [(cid,) for cid in comment_ids])
+
+    # Schedule retries for comments that failed a stage; rows are (error, next_attempt_ts, comment_id).
+    # Comments that have used up max_attempts are parked in the 'failed' stage.
+    def record_stage_failures(self, rows, max_attempts, count_attempt=True):
+        increment = 1 if count_attempt else 0
+        self.executemany(f"""
+            UPDATE comments SET
+                attempts = attempts + {increment},
+                last_error = ?,
+                next_attempt_ts = ?,
+                stage = CASE WHEN attempts + {increment} >= {int(max_attempts)} THEN 'failed' ELSE stage END
+            WHERE comment_id = ?
+        """, rows)
+
+    # Put off comments without counting an attempt (e.g. their brand is closed right now)
+    def defer_comments(self, comment_ids, next_attempt_ts):
+        self.executemany(
+            "UPDATE comments SET next_attempt_ts = ? WHERE comment_id = ?", [(next_attempt_ts, cid) for cid in comment_ids]
+        )
+
+    # Number of comments in each stage
+    def stage_counts(self):
+        return dict(self.query("SELECT stage, COUNT(*) FROM comments GROUP BY stage"))
+
+    # Record a submitted batch and tag its comments with the batch ID
+    def record_batch(self, batch_id, backend, input_file, comment_ids):
+        with self.transaction():
+            self.conn.execute("""
+                INSERT INTO llm_batches (batch_id, backend, status, input_file, request_count, created_ts)
+                VALUES (?, ?, 'submitted', ?, ?, strftime('%s', 'now'))
+            """, (batch_id, backend, input_file, len(comment_ids)))
+            self.conn.executemany("UPDATE comments SET batch_id = ? WHERE comment_id = ?",
+                                  [(batch_id, cid) for cid in comment_ids])
+
+    # Batches that have been submitted but not yet ingested
+    def get_open_batches(self):
+        rows = self.query(
+            "SELECT batch_id, backend, input_file FROM llm_batches WHERE status NOT IN ('ingested', 'failed')"
         )
-    """)
-    conn.commit()
-    conn.close()
+        return [{"batch_id": r[0], "backend": r[1], "input_file": r[2]} for r in rows]
+
+    # Close a batch; comments it didn't produce a reply for become pending again
+    def close_batch(self, batch_id, status):
+        with self.transaction():
+            self.conn.execute(
+                "UPDATE llm_batches SET status = ?, completed_ts = strftime('%s', 'now') WHERE batch_id = ?",
+                (status, batch_id)
+            )
+            self.conn.execute("UPDATE comments SET batch_id = NULL WHERE batch_id = ?", (batch_id,))
+
+    # Retrieve latest N comments for a specific post
+    def get_recent_post_comments(self, post_id, page_id, limit=5):
+        rows = self.query("""
+            SELECT message FROM comments
+            WHERE post_id = ? AND page_id = ?
+            ORDER BY created_ts DESC
+            LIMIT ?
+        """, (post_id, page_id, limit))
+        return [row[0] for row in reversed(rows)]
+
+    # Read the per-page sync watermark (epoch seconds of the newest ingested comment)
+    def get_sync_watermark(self, page_id):
+        rows = self.query("SELECT last_synced_ts FROM sync_state WHERE page_id = ?", (page_id,))
+        return rows[0][0] if rows else None
+
+    # Advance the per-page sync watermark; it never moves backwards
+    def set_sync_watermark(self, page_id, last_synced_ts):
+        self.execute("""
+            INSERT INTO sync_state (page_id, last_synced_ts) VALUES (?, ?)
+            ON CONFLICT(page_id) DO UPDATE SET last_synced_ts = MAX(last_synced_ts, excluded.last_synced_ts)
+        """, (page_id, last_synced_ts))
+
+    # Record that a worker is alive; drops workers that stopped heartbeating long ago
+    def heartbeat_worker(self, worker_id, now, forget_before):
+        with self.transaction():
+            self.conn.execute("""
+                INSERT INTO workers (worker_id, started_ts, heartbeat_ts) VALUES (?, ?, ?)
+                ON CONFLICT(worker_id) DO UPDATE SET heartbeat_ts = excluded.heartbeat_ts
+            """, (worker_id, now, now))
+            self.conn.execute("DELETE FROM workers WHERE heartbeat_ts < ?", (forget_before,))
+
+    # Remove a worker and give up all of its leases
+    def remove_worker(self, worker_id):
+        with self.transaction():
+            self.conn.execute("DELETE FROM workers WHERE worker_id = ?", (worker_id,))
+            self.conn.execute("DELETE FROM client_leases WHERE worker_id = ?", (worker_id,))
+
+    # Workers that have heartbeated since the given time
+    def get_live_workers(self, since_ts):
+        return [row[0] for row in self.query("SELECT worker_id FROM workers WHERE heartbeat_ts >= ?", (since_ts,))]
+
+    # Take or renew the lease on a page; succeeds if it is free, expired or already ours
+    def acquire_lease(self, page_id, worker_id, now, expires_ts):
+        with self.transaction():
+            self.conn.execute("""
+                INSERT INTO client_leases (page_id, worker_id, expires_ts) VALUES (?, ?, ?)
+                ON CONFLICT(page_id) DO UPDATE SET worker_id = excluded.worker_id, expires_ts = excluded.expires_ts
+                WHERE client_leases.worker_id = excluded.worker_id OR client_leases.expires_ts < ?
+            """, (page_id, worker_id, expires_ts, now))
+            row = self.conn.execute("SELECT worker_id FROM client_leases WHERE page_id = ?", (page_id,)).fetchone()
+        return row is not None and row[0] == worker_id
+
+    # Give up a page lease if we still hold it
+    def release_lease(self, page_id, worker_id):
+        self.execute("DELETE FROM client_leases WHERE page_id = ? AND worker_id = ?", (page_id, worker_id))
+
+
+class HandledCache:
+    """
+    In-memory membership cache in front of the comments table's `responded` flag.
+
+    claim() checks a whole fetch batch at once: IDs the cache doesn't know are looked up in
+    one query, anything already answered (or currently being handled by another thread in
+    this process) is dropped, and the rest are marked in flight until release().
+    """
+
+    def __init__(self, max_size=HANDLED_CACHE_SIZE):
+        self.max_size = max_size
+        self.handled = OrderedDict()
+        self.in_flight = set()
+        self.lock = threading.Lock()
+
+    def _remember(self, comment_id):
+        self.handled[comment_id] = True
+        self.handled.move_to_end(comment_id)
+        while len(self.handled) > self.max_size:
+            self.handled.popitem(last=False)
+
+    def _is_busy(self, comment_id):
+        return comment_id in self.handled or comment_id in self.in_flight
+
+    def claim(self, comments, store):
+        """
+        Return the comments that still need handling and mark them in flight.
+        """
+        with self.lock:
+            unknown = [c["id"] for c in comments if not self._is_busy(c["id"])]
+        answered = store.get_handled_comment_ids(unknown) if unknown else set()
+        claimed = []
+        with self.lock:
+            for comment_id in answered:
+                self._remember(comment_id)
+            for comment in comments:
+                if not self._is_busy(comment["id"]):
+                    self.in_flight.add(comment["id"])
+                    claimed.append(comment)
+        return claimed
+
+    def release(self, comment_ids, handled=False):
+        """
+        Clear the in-flight mark; if handled, remember the IDs as answered.
+        """
+        with self.lock:
+            for comment_id in comment_ids:
+                self.in_flight.discard(comment_id)
+                if handled:
+                    self._remember(comment_id)
+
+
+_store = None
+_store_lock = threading.Lock()
+handled_cache = HandledCache()
+
+
+def get_store():
+    """
+    Return the process-wide CommentStore for DB_FILE, opening it on first use.
+    """
+    global _store
+    if _store is None or _store.db_file != DB_FILE:
+        with _store_lock:
+            if _store is None or _store.db_file != DB_FILE:
+                _store = CommentStore(DB_FILE)
+    return _store
+
+
+# Initialize the SQLite database for storing comments and posts
+def init_comment_db():
+    get_store().init_schema()
 
 
 # Insert or update post records in the database
 def log_post(post_id, page_id, brand_name, created_time):
-    conn = sqlite3.connect(DB_FILE)
-    cursor = conn.cursor()
-    cursor.execute("""
-        INSERT OR IGNORE INTO posts (post_id, page_id, brand_name, created_time)
-        VALUES (?, ?, ?, ?)
-    """, (post_id, page_id, brand_name, created_time))
-    conn.commit()
-    conn.close()
+    get_store().log_posts([(post_id, page_id, brand_name, created_time)])
 
 
-# Insert or update comment records in the database
+# Insert comment records in the database; returns True only the first time a comment is seen
 def log_comment(comment_id, user_id, page_id, post_id, brand_name, message, created_time):
-    conn = sqlite3.connect(DB_FILE)
-    cursor = conn.cursor()
-    cursor.execute("""
-        INSERT OR IGNORE INTO comments (comment_id, user_id, page_id, post_id, brand_name, message, created_time)
-        VALUES (?, ?, ?, ?, ?, ?, ?)
-    """, (comment_id, user_id, page_id, post_id, brand_name, message, created_time))
-    conn.commit()
-    conn.close()
+    row = (comment_id, user_id, page_id, post_id, brand_name, message, created_time)
+    return comment_id in get_store().log_comments([row])
+
+
+# Update an existing comment record to mark it as responded, keeping the reply that was posted
+def mark_comment_as_responded(comment_id, reply_text=None):
+    get_store().mark_comments_as_responded([comment_id], {comment_id: reply_text})
+
+
+# Mark a comment the brand decided not to answer
+def mark_comment_as_skipped(comment_id):
+    get_store().mark_comments_as_skipped([comment_id])
+
 
+# Drop comments that were already answered or are being handled; claim the rest
+def claim_comments(comments):
+    return handled_cache.claim(comments, get_store())
 
-# Update an existing comment record to mark it as responded
-def mark_comment_as_responded(comment_id):
-    conn = sqlite3.connect(DB_FILE)
-    cursor = conn.cursor()
-    cursor.execute("UPDATE comments SET responded = 1 WHERE comment_id = ?", (comment_id,))
-    conn.commit()
-    conn.close()
+
+# Release claimed comments; handled=True records them as answered in the cache
+def release_comments(comment_ids, handled=False):
+    handled_cache.release(comment_ids, handled)
 
 
 # Retrieve latest N comments for a specific post
 def get_recent_post_comments(post_id, page_id, limit=5):
-    conn = sqlite3.connect(DB_FILE)
-    cursor = conn.cursor()
-    cursor.execute("""
-        SELECT message FROM comments
-        WHERE post_id = ? AND page_id = ?
-        ORDER BY created_time DESC
-        LIMIT ?
-    """, (post_id, page_id, limit))
-    rows = cursor.fetchall()
-    conn.close()
-    return [row[0] for row in reversed(rows)]
+    return get_store().get_recent_post_comments(post_id, page_id, limit)
+
+
+# Read the per-page sync watermark (epoch seconds of the newest ingested comment)
+def get_sync_watermark(page_id):
+    return get_store().get_sync_watermark(page_id)
+
+
+# Advance the per-page sync watermark; it never moves backwards
+def set_sync_watermark(page_id, last_synced_ts):
+    get_store().set_sync_watermark(page_id, last_synced_ts)
+
+
+# Convert a Graph API timestamp ("2025-05-14T20:31:36+0000") or ISO string to epoch seconds
+def to_epoch(timestamp):
+    if isinstance(timestamp, (int, float)):
+        return int(timestamp)
+    value = timestamp.replace("Z", "+00:00")
+    if len(value) > 5 and value[-5] in "+-" and value[-3] != ":":
+        value = f"{value[:-2]}:{value[-2:]}"  # +0000 -> +00:00
+    dt = datetime.fromisoformat(value)
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return int(dt.timestamp())
+
+
+# to_epoch for SQL and insert paths: unparseable or missing timestamps become NULL
+def _sql_to_epoch(timestamp):
+    if timestamp is None:
+        return None
+    try:
+        return to_epoch(timestamp)
+    except ValueError:
+        return None
@@ -0,0 +1,172 @@
+"""
+Registry of client configs that follows changes to the configs folder without a restart.
+
+Configs are indexed by Facebook and Instagram page ID. refresh() only stats the folder and
+reparses files whose mtime, size or inode changed, so it is cheap enough to call every poll
+cycle or webhook delivery; calls closer together than CONFIG_RELOAD_INTERVAL seconds
+reuse the last scan. A file that fails to parse keeps its last good version.
+
+Config writes go through write_config_atomic() (temp file + rename), so a reader never
+sees a half-written file.
+"""
+
+import os
+import json
+import time
+import tempfile
+import threading
+from auto_responder.client_config import ClientConfig
+
+CONFIG_FOLDER = "configs"
+CONFIG_SUFFIX = "_config.json"
+CONFIG_RELOAD_INTERVAL = float(os.getenv("CONFIG_RELOAD_INTERVAL", "5"))  # seconds
+
+
+def write_config_atomic(path, config):
+    """
+    Write a config as JSON to a temp file in the same folder, then rename it over `path`.
+    """
+    folder = os.path.dirname(path) or "."
+    fd, tmp_path = tempfile.mkstemp(dir=folder, prefix=f".{os.path.basename(path)}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w") as f:
+            json.dump(config, f, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+class ConfigRegistry:
+    """
+    ClientConfigs for every *_config.json in a folder, reloaded file by file on change.
+    """
+
+    def __init__(self, folder=CONFIG_FOLDER, reload_interval=CONFIG_RELOAD_INTERVAL):
+        self.folder = folder
+        self.reload_interval = reload_interval
+        self.entries = {}  # path -> ((mtime_ns, size, inode), ClientConfig)
+        self.by_facebook_id = {}
+        self.by_instagram_id = {}
+        self.paths = {}  # brand_name -> path
+        self.last_scan = None
+        self.lock = threading.RLock()
+
+    def refresh(self, force=False):
+        """
+        Reload files that were added or changed since the last scan and drop removed ones.
+
+        Returns:
+            bool: True if any config changed.
+        """
+        with self.lock:
+            now = time.monotonic()
+            if not force and self.last_scan is not None and now - self.last_scan < self.reload_interval:
+                return False
+            self.last_scan = now
+
+            seen = {}
+            try:
+                with os.scandir(self.folder) as it:
+                    for entry in it:
+                        if entry.name.endswith(CONFIG_SUFFIX) and entry.is_file():
+                            stat = entry.stat()
+                            seen[entry.path] = (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+            except FileNotFoundError:
+                print(f"⚠️ Config folder '{self.folder}' does not exist.")
+
+            changed = False
+            for path in list(self.entries):
+                if path not in seen:
+                    del self.entries[path]
+                    changed = True
+            for path, signature in seen.items():
+                current = self.entries.get(path)
+                if current is not None and current[0] == signature:
+                    continue
+                try:
+                    with open(path, "r") as f:
+                        config = ClientConfig(json.load(f))
+                except Exception as e:  # bad JSON or a field ClientConfig can't use (KeyError, TypeError, ...)
+                    print(f"❌ Failed to load {path}: {e}")
+                    if current is not None:
+                        # Keep serving the last good version, but don't retry until the file changes again.
+                        self.entries[path] = (signature, current[1])
+                    continue
+                self.entries[path] = (signature, config)
+                changed = True
+
+            if changed:
+                self._reindex()
+            return changed
+
+    def _reindex(self):
+        # Build the new indexes aside and swap them in, so lock-free readers never see a partial one.
+        by_facebook_id, by_instagram_id, paths = {}, {}, {}
+        for path, (_, config) in sorted(self.entries.items()):
+            paths[config.brand_name] = path
+            if config.facebook_page_id:
+                by_facebook_id[config.facebook_page_id] = config
+            if config.instagram_page_id:
+                by_instagram_id[config.instagram_page_id] = config
+        self.by_facebook_id, self.by_instagram_id, self.paths = by_facebook_id, by_instagram_id, paths
+
+    def configs(self):
+        """
+        Return every loaded ClientConfig, ordered by file name.
+        """
+        self.refresh()
+        with self.lock:
+            return [config for _, (_, config) in sorted(self.entries.items())]
+
+    def get_by_page_id(self, page_id, platform="facebook"):
+        self.refresh()
+        index = self.by_instagram_id if platform == "instagram" else self.by_facebook_id
+        return index.get(page_id)
+
+    def path_for(self, client_config):
+        with self.lock:
+            return self.paths.get(client_config.brand_name)
+
+    def update(self, client_config, changes):
+        """
+        Apply top-level `changes` to a client's config file atomically and reload it.
+
+        The file is reread from disk rather than serialized from the ClientConfig, so
+        edits made by hand since the last reload are kept.
+
+        Returns:
+            ClientConfig: The reloaded config.
+        """
+        with self.lock:
+            path = self.path_for(client_config)
+            if path is None:
+                raise KeyError(f"No config file loaded for {client_config.brand_name}")
+            with open(path, "r") as f:
+                raw = json.load(f)
+            raw.update(changes)
+            write_config_atomic(path, raw)
+            stat = os.stat(path)
+            config = ClientConfig(raw)
+            self.entries[path] = ((stat.st_mtime_ns, stat.st_size, stat.st_ino), config)
+            self._reindex()
+            return config
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def get_registry():
+    """
+    Return the process-wide ConfigRegistry for CONFIG_FOLDER, creating it on first use.
+    """
+    global _registry
+    if _registry is None:
+        with _registry_lock:
+            if _registry is None:
+                _registry = ConfigRegistry()
+    return _registry
@@ -0,0 +1,234 @@
+"""
+Long-running scheduler that polls each client on its own adaptive interval.
+
+Every brand sits in a priority queue ordered by its next poll time:
+- a brand outside its working hours is parked until its next opening time, computed in
+  its own timezone, so closed brands cost nothing until they open,
+- an open brand is polled and then rescheduled after an interval derived from its recent
+  comment rate (an exponential moving average of comments per second): busy pages are
+  polled as often as every MIN_POLL_INTERVAL seconds, quiet pages back off toward
+  MAX_POLL_INTERVAL,
+- disabled or incomplete configs are rechecked every IDLE_RECHECK_INTERVAL seconds.
+Configs come from the config registry, so added or edited brands are picked up without a restart.
+
+While running, metrics are served in Prometheus text format on
+http://<host>:<--metrics-port>/metrics (see metrics.py).
+
+With --sharded, several daemons (on one host or several sharing comments.db) split the
+brands between them by consistent hashing on page ID; see sharding.py.
+
+Run from the repository root:
+    python -m auto_responder.daemon --max-workers 4 --verbose
+    python -m auto_responder.daemon --sharded   # once per worker
+"""
+
+import os
+import time
+import heapq
+import argparse
+import itertools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from auto_responder import responder, metrics
+from auto_responder.config_registry import get_registry
+from auto_responder.sharding import ShardCoordinator, HEARTBEAT_INTERVAL
+
+MIN_POLL_INTERVAL = int(os.getenv("DAEMON_MIN_POLL_INTERVAL", "30"))  # seconds
+MAX_POLL_INTERVAL = int(os.getenv("DAEMON_MAX_POLL_INTERVAL", "900"))  # seconds
+TARGET_COMMENTS_PER_POLL = 5  # busy pages are polled often enough to see about this many per poll
+RATE_SMOOTHING = 0.3  # weight of the latest poll in the comment-rate average
+IDLE_RECHECK_INTERVAL = 300  # seconds between checks of disabled or incomplete configs
+
+
+class ClientSchedule:
+    """
+    Poll interval and recent comment rate of one brand.
+    """
+
+    def __init__(self, interval=MIN_POLL_INTERVAL):
+        self.interval = interval
+        self.rate = 0.0  # comments per second
+        self.readings = 0  # polls that contributed to the rate
+        self.last_poll = None
+
+    def record_poll(self, comments, now):
+        """
+        Fold one poll's comment count into the rate and derive the next interval.
+
+        A poll with no previous one to measure from (at startup or after reopening) gives no
+        rate, so the next poll follows after MIN_POLL_INTERVAL to take a first reading instead
+        of backing off on a rate that isn't known yet.
+        """
+        if self.last_poll is None:
+            self.last_poll = now
+            self.interval = MIN_POLL_INTERVAL
+            return
+        elapsed = max(now - self.last_poll, 1.0)
+        if self.readings:
+            self.rate = RATE_SMOOTHING * (comments / elapsed) + (1 - RATE_SMOOTHING) * self.rate
+        else:
+            self.rate = comments / elapsed  # first reading seeds the average
+        self.readings += 1
+        self.last_poll = now
+        wanted = TARGET_COMMENTS_PER_POLL / self.rate if self.rate > 0 else MAX_POLL_INTERVAL
+        self.interval = min(MAX_POLL_INTERVAL, max(MIN_POLL_INTERVAL, wanted))
+
+    def park(self):
+        # The first poll after reopening covers the whole closed period, so it says nothing about the rate.
+        self.last_poll = None
+
+
+class Daemon:
+    """
+    Priority queue of per-brand poll times, drained by a bounded worker pool.
+    """
+
+    def __init__(self, dry_run=False, verbose=False, max_workers=responder.MAX_WORKERS, shard=None,
+                 metrics_port=metrics.METRICS_PORT):
+        self.dry_run = dry_run
+        self.verbose = verbose
+        self.shard = shard  # ShardCoordinator when running as one of several workers
+        self.metrics_port = metrics_port  # 0 disables the /metrics endpoint
+        self.queue = []  # heap of (due_ts, seq, brand_name)
+        self.seq = itertools.count()
+        self.schedules = {}  # brand_name -> ClientSchedule
+        self.in_flight = set()
+        self.lock = threading.Lock()
+        self.wake = threading.Event()
+        self.stop_event = threading.Event()
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="poll")
+
+    def schedule(self, brand_name, due):
+        heapq.heappush(self.queue, (due, next(self.seq), brand_name))
+
+    def sync_clients(self, now):
+        """
+        Queue brands that appeared in the registry and forget ones that were removed.
+        """
+        configs = {config.brand_name: config for config in get_registry().configs()}
+        with self.lock:
+            for brand_name in configs:
+                if brand_name not in self.schedules:
+                    self.schedules[brand_name] = ClientSchedule()
+                    self.schedule(brand_name, now)
+            for brand_name in list(self.schedules):
+                if brand_name not in configs and brand_name not in self.in_flight:
+                    del self.schedules[brand_name]
+        return configs
+
+    def pop_due(self, now):
+        due = []
+        with self.lock:
+            while self.queue and self.queue[0][0] <= now:
+                _, _, brand_name = heapq.heappop(self.queue)
+                if brand_name in self.schedules and brand_name not in self.in_flight:
+                    due.append(brand_name)
+        return due
+
+    def dispatch(self, client_config, now):
+        """
+        Poll an open brand on the worker pool, or park it until it can be polled.
+        """
+        brand_name = client_config.brand_name
+        if (not client_config.auto_reply_enabled or not client_config.facebook_page_id
+                or not client_config.page_access_token):
+            with self.lock:
+                self.schedule(brand_name, now + IDLE_RECHECK_INTERVAL)
+            return
+        if not client_config.within_working_hours():
+            opens = client_config.next_transition()
+            due = opens.timestamp() if opens is not None else now + IDLE_RECHECK_INTERVAL
+            with self.lock:
+                self.schedules[brand_name].park()
+                self.schedule(brand_name, due)
+            if self.verbose:
+                print(f"[{brand_name}] Closed; next check at {opens.isoformat() if opens else 'the next recheck'}.")
+            return
+        if self.shard is not None and not self.shard.claim(client_config.facebook_page_id):
+            # Owned (or still leased) by another worker; look again after the ring may have changed.
+            with self.lock:
+                self.schedule(brand_name, now + HEARTBEAT_INTERVAL)
+            return
+        with self.lock:
+            self.in_flight.add(brand_name)
+        self.executor.submit(self.poll, client_config)
+
+    def poll(self, client_config):
+        brand_name = client_config.brand_name
+        comments = 0
+        try:
+            comments = responder.process_client(client_config, self.dry_run, self.verbose) or 0
+        except Exception as e:
+            print(f"[{brand_name}] ❌ Error while processing client: {e}")
+        finally:
+            if self.shard is not None:
+                self.shard.finished(client_config.facebook_page_id)
+            now = time.time()
+            with self.lock:
+                self.in_flight.discard(brand_name)
+                schedule = self.schedules.get(brand_name)
+                if schedule is not None:
+                    schedule.record_poll(comments, now)
+                    self.schedule(brand_name, now + schedule.interval)
+            self.wake.set()
+        if self.verbose and schedule is not None:
+            print(f"[{brand_name}] Next poll in {schedule.interval:.0f}s ({schedule.rate * 60:.2f} comments/min).")
+
+    def run(self):
+        """
+        Poll clients as they come due until stop() is called or the process is interrupted.
+        """
+        responder.init_comment_db()
+        metrics_server = metrics.serve_metrics(self.metrics_port) if self.metrics_port else None
+        if metrics_server is not None:
+            print(f"Serving metrics on port {metrics_server.server_port} at /metrics.")
+        if self.shard is not None:
+            self.shard.start()
+            print(f"Responder daemon started as shard worker {self.shard.worker_id}.")
+        else:
+            print("Responder daemon started.")
+        try:
+            while not self.stop_event.is_set():
+                now = time.time()
+                configs = self.sync_clients(now)
+                for brand_name in self.pop_due(now):
+                    client_config = configs.get(brand_name)
+                    if client_config is not None:
+                        self.dispatch(client_config, now)
+                with self.lock:
+                    next_due = self.queue[0][0] if self.queue else now + IDLE_RECHECK_INTERVAL
+                # Wake up for the next due brand, a finished poll, or a periodic registry check.
+                timeout = min(max(next_due - time.time(), 0), get_registry().reload_interval or IDLE_RECHECK_INTERVAL)
+                self.wake.wait(timeout)
+                self.wake.clear()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.stop()
+            self.executor.shutdown(wait=True)
+            if self.shard is not None:
+                self.shard.stop()
+            if metrics_server is not None:
+                metrics_server.shutdown()
+                metrics_server.server_close()
+            responder.print_triage_summary()
+
+    def stop(self):
+        self.stop_event.set()
+        self.wake.set()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Poll clients continuously with adaptive per-client intervals.")
+    parser.add_argument("--dry-run", action="store_true", help="Preview replies without posting them.")
+    parser.add_argument("--verbose", action="store_true", help="Print scheduling decisions and per-client details.")
+    parser.add_argument("--max-workers", type=int, default=responder.MAX_WORKERS,
+                        help="Number of clients polled at the same time.")
+    parser.add_argument("--sharded", action="store_true",
+                        help="Share the brands with other daemons using the same comments.db.")
+    parser.add_argument("--metrics-port", type=int, default=metrics.METRICS_PORT,
+                        help="Port for the Prometheus /metrics endpoint (0 disables it).")
+    args = parser.parse_args()
+    shard = ShardCoordinator() if args.sharded else None
+    Daemon(dry_run=args.dry_run, verbose=args.verbose, max_workers=args.max_workers, shard=shard,
+           metrics_port=args.metrics_port).run()
@@ -0,0 +1,138 @@
+"""
+Durable cache of should_respond decisions, stored in the decision_cache table of comments.db.
+
+Entries are keyed by brand, normalized comment text and a version hash of everything
+that can change the answer (the brand's filters, prompt, reply style and the triage
+prompt version), so editing a config or the prompt naturally invalidates old entries.
+Entries expire after DECISION_CACHE_TTL seconds and the table is trimmed to the
+DECISION_CACHE_MAX_ROWS most recently used rows.
+"""
+
+import os
+import re
+import json
+import time
+import hashlib
+import threading
+import unicodedata
+from auto_responder.comment_store import get_store
+
+DECISION_CACHE_TTL = int(os.getenv("DECISION_CACHE_TTL", str(7 * 24 * 3600)))
+DECISION_CACHE_MAX_ROWS = int(os.getenv("DECISION_CACHE_MAX_ROWS", "50000"))
+EVICT_EVERY = 100  # puts between eviction passes
+DECISION_PROMPT_VERSION = "1"  # bump whenever the should_respond prompt or model changes
+
+_whitespace = re.compile(r"\s+")
+
+
+def normalize_text(text):
+    """
+    Normalize comment text for cache lookups: Unicode NFKC, case folding and collapsed whitespace.
+    """
+    return _whitespace.sub(" ", unicodedata.normalize("NFKC", text).casefold()).strip()
+
+
+def config_version(client_config):
+    """
+    Short hash of the config fields and prompt version that affect a triage decision.
+    """
+    relevant = {
+        "filters": client_config.get("filters", {}),
+        "reply_style": client_config.get("reply_style"),
+        "response_prompt": client_config.get("response_prompt"),
+        "prompt_version": DECISION_PROMPT_VERSION,
+    }
+    return hashlib.sha256(json.dumps(relevant, sort_keys=True).encode()).hexdigest()[:16]
+
+
+class DecisionCache:
+    """
+    TTL- and size-bounded decision cache on top of the shared CommentStore.
+    """
+
+    def __init__(self, store=None, ttl=DECISION_CACHE_TTL, max_rows=DECISION_CACHE_MAX_ROWS):
+        self.store = store or get_store()
+        self.ttl = ttl
+        self.max_rows = max_rows
+        self.lock = threading.Lock()
+        self.puts = 0
+        self.stats = {"hits": 0, "misses": 0, "expired": 0, "evicted": 0}
+
+    def key(self, comment_text, client_config):
+        raw = "\x1f".join((client_config.brand_name, client_config.version, normalize_text(comment_text)))
+        return hashlib.sha256(raw.encode()).hexdigest()
+
+    def get(self, comment_text, client_config):
+        """
+        Return the cached decision (True/False), or None on a miss.
+        """
+        key = self.key(comment_text, client_config)
+        now = int(time.time())
+        rows = self.store.query("SELECT decision, created_ts FROM decision_cache WHERE cache_key = ?", (key,))
+        if not rows:
+            self._count("misses")
+            return None
+        decision, created_ts = rows[0]
+        if now - created_ts > self.ttl:
+            self.store.execute("DELETE FROM decision_cache WHERE cache_key = ?", (key,))
+            self._count("expired")
+            self._count("misses")
+            return None
+        self.store.execute(
+            "UPDATE decision_cache SET last_used_ts = ?, hits = hits + 1 WHERE cache_key = ?", (now, key)
+        )
+        self._count("hits")
+        return bool(decision)
+
+    def put(self, comment_text, client_config, decision):
+        key = self.key(comment_text, client_config)
+        now = int(time.time())
+        self.store.execute("""
+            INSERT OR REPLACE INTO decision_cache (cache_key, brand_name, decision, created_ts, last_used_ts, hits)
+            VALUES (?, ?, ?, ?, ?, 0)
+        """, (key, client_config.brand_name, int(bool(decision)), now, now))
+        with self.lock:
+            self.puts += 1
+            evict = self.puts % EVICT_EVERY == 0
+        if evict:
+            self.evict()
+
+    def evict(self):
+        """
+        Drop expired entries, then everything beyond the max_rows most recently used.
+        """
+        cutoff = int(time.time()) - self.ttl
+        with self.store.transaction():
+            expired = self.store.execute("DELETE FROM decision_cache WHERE created_ts < ?", (cutoff,)).rowcount
+            overflow = self.store.execute("""
+                DELETE FROM decision_cache WHERE cache_key IN (
+                    SELECT cache_key FROM decision_cache ORDER BY last_used_ts DESC LIMIT -1 OFFSET ?
+                )
+            """, (self.max_rows,)).rowcount
+        with self.lock:
+            self.stats["expired"] += expired
+            self.stats["evicted"] += overflow
+
+    def _count(self, key):
+        with self.lock:
+            self.stats[key] += 1
+
+    def hit_rate(self):
+        lookups = self.stats["hits"] + self.stats["misses"]
+        return self.stats["hits"] / lookups if lookups else 0.0
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_decision_cache():
+    """
+    Return the process-wide DecisionCache, creating it on first use.
+    """
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = DecisionCache()
+    return _cache
@@ -0,0 +1,179 @@
+"""
+Buffered JSON Lines event log.
+
+log_event() only appends the event to an in-memory buffer; a background thread writes
+the buffer to logs/responder_events.jsonl every EVENT_LOG_FLUSH_INTERVAL seconds (sooner
+once EVENT_LOG_BUFFER_EVENTS are waiting) with one write per flush, so the hot path does
+no file I/O. Each line is one JSON object with at least "ts" (epoch seconds) and "event".
+
+The file is rotated when it grows past EVENT_LOG_MAX_BYTES or when a new
+EVENT_LOG_ROTATE_INTERVAL period (daily by default, UTC) begins. Rotated files are
+gzip-compressed to responder_events.jsonl.<YYYYmmdd-HHMMSS>.gz and only the newest
+EVENT_LOG_BACKUPS are kept. Pending events are flushed at interpreter exit.
+
+Read a log with e.g.:
+    zcat -f logs/responder_events.jsonl* | jq 'select(.event == "reply")'
+"""
+
+import os
+import json
+import time
+import gzip
+import glob
+import atexit
+import shutil
+import threading
+from datetime import datetime, timezone
+
+EVENT_LOG_FILE = os.getenv("EVENT_LOG_FILE", os.path.join("logs", "responder_events.jsonl"))
+FLUSH_INTERVAL = float(os.getenv("EVENT_LOG_FLUSH_INTERVAL", "1"))  # seconds
+BUFFER_EVENTS = int(os.getenv("EVENT_LOG_BUFFER_EVENTS", "1000"))  # flush early once this many are waiting
+MAX_BYTES = int(os.getenv("EVENT_LOG_MAX_BYTES", str(50 * 1024 * 1024)))
+ROTATE_INTERVAL = int(os.getenv("EVENT_LOG_ROTATE_INTERVAL", "86400"))  # seconds; 0 rotates on size only
+BACKUPS = int(os.getenv("EVENT_LOG_BACKUPS", "14"))  # compressed files kept
+
+
+class EventLogger:
+    """
+    JSONL writer with an in-memory buffer, a flush thread and size/time rotation.
+    """
+
+    def __init__(self, path=EVENT_LOG_FILE, flush_interval=FLUSH_INTERVAL, buffer_events=BUFFER_EVENTS,
+                 max_bytes=MAX_BYTES, rotate_interval=ROTATE_INTERVAL, backups=BACKUPS):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.buffer_events = buffer_events
+        self.max_bytes = max_bytes
+        self.rotate_interval = rotate_interval
+        self.backups = backups
+        self.buffer = []
+        self.lock = threading.Lock()  # guards the buffer
+        self.write_lock = threading.Lock()  # one flush at a time
+        self.wake = threading.Event()
+        self.closed = False
+        self.file = None
+        self.size = 0
+        self.period = None  # rotation period of the first event in the current file
+        self.thread = threading.Thread(target=self._run, name="event-log", daemon=True)
+        self.thread.start()
+
+    def log(self, event, **fields):
+        """
+        Queue one event; fields must be JSON-serializable (anything else is logged with str()).
+        """
+        record = {"ts": round(time.time(), 3), "event": event}
+        record.update(fields)
+        with self.lock:
+            self.buffer.append(record)
+            full = len(self.buffer) >= self.buffer_events
+        if full:
+            self.wake.set()
+
+    def _run(self):
+        while not self.closed:
+            self.wake.wait(self.flush_interval)
+            self.wake.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"❌ Event log flush failed: {e}")
+
+    def flush(self):
+        """
+        Write every buffered event to the log file.
+        """
+        with self.lock:
+            records, self.buffer = self.buffer, []
+        if not records:
+            return
+        with self.write_lock:
+            lines = [json.dumps(record, ensure_ascii=False, default=str) + "\n" for record in records]
+            self._maybe_rotate(records[0]["ts"])
+            data = "".join(lines).encode()
+            if self.file is None:
+                self._open()
+            if self.period is None:
+                self.period = self._period(records[0]["ts"])
+            self.file.write(data)
+            self.file.flush()
+            self.size += len(data)
+
+    def _period(self, ts):
+        return int(ts // self.rotate_interval) if self.rotate_interval else 0
+
+    def _open(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        self.file = open(self.path, "ab")
+        self.size = self.file.tell()
+        self.period = None
+        if self.size:
+            # Resume the period of an existing file from its first event.
+            try:
+                with open(self.path, "rb") as f:
+                    self.period = self._period(json.loads(f.readline())["ts"])
+            except (ValueError, KeyError, TypeError):
+                self.period = self._period(os.path.getmtime(self.path))
+
+    def _maybe_rotate(self, ts):
+        if self.file is None:
+            if not os.path.exists(self.path):
+                return
+            self._open()
+        if not self.size:
+            return
+        if self.size < self.max_bytes and (self.period is None or self.period == self._period(ts)):
+            return
+        self.file.close()
+        self.file = None
+        stamp = datetime.now(timezone.utc).strftime("%Y%m%d-%H%M%S")
+        rotated = f"{self.path}.{stamp}"
+        suffix = 1
+        while os.path.exists(rotated) or os.path.exists(rotated + ".gz"):
+            rotated = f"{self.path}.{stamp}-{suffix}"
+            suffix += 1
+        os.replace(self.path, rotated)
+        with open(rotated, "rb") as src, gzip.open(rotated + ".gz", "wb") as dst:
+            shutil.copyfileobj(src, dst)
+        os.remove(rotated)
+        compressed = sorted(glob.glob(f"{glob.escape(self.path)}.*.gz"), key=os.path.getmtime)
+        for old in compressed[:-self.backups or None]:
+            os.remove(old)
+
+    def close(self):
+        """
+        Stop the flush thread and write out anything still buffered.
+        """
+        if self.closed:
+            return
+        self.closed = True
+        self.wake.set()
+        self.thread.join()
+        self.flush()
+        with self.write_lock:
+            if self.file is not None:
+                self.file.close()
+                self.file = None
+
+
+_logger = None
+_logger_lock = threading.Lock()
+
+
+def get_event_logger():
+    """
+    Return the process-wide EventLogger, creating it on first use.
+    """
+    global _logger
+    if _logger is None:
+        with _logger_lock:
+            if _logger is None:
+                _logger = EventLogger()
+                atexit.register(_logger.close)
+    return _logger
+
+
+def log_event(event, **fields):
+    """
+    Queue an event on the process-wide log; see EventLogger.log.
+    """
+    get_event_logger().log(event, **fields)
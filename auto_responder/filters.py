@@ -0,0 +1,128 @@
+"""
+Local pre-filters applied to comments before any OpenAI call.
+
+Each client's `filters` block is compiled once into a CompiledFilters object:
+- all `ignored_keywords` become a single regex alternation matched against the
+  NFKC-normalized, case-folded comment (plain keywords match anywhere, as substrings; entries
+  prefixed with "word:" only match whole words and entries prefixed with "re:" are used as
+  regular expressions),
+- `require_question` keeps only comments ending in "?",
+- cheap heuristics reject emoji-only, tag-only (@mentions / #hashtags) and
+  link-spam comments. They are on by default and can be switched off with
+  `skip_emoji_only`, `skip_tag_only` and `max_links` (0 disables) in the config.
+
+Every rejection is counted per rule in CompiledFilters.hits.
+"""
+
+import re
+import threading
+import unicodedata
+from collections import Counter
+
+DEFAULT_MAX_LINKS = 2  # comments with at least this many links are treated as spam
+
+_mention_or_hashtag = re.compile(r"[@#][\w.]+")
+_link = re.compile(r"(?:https?://|www\.)\S+", re.IGNORECASE)
+# Unicode categories that carry no words: symbols (emoji), punctuation, separators,
+# format characters (zero-width joiners) and combining marks (variation selectors).
+_NON_WORD_CATEGORIES = ("S", "P", "Z", "Cf", "Mn")
+
+
+def _keyword_pattern(keyword):
+    if keyword.startswith("re:"):
+        return keyword[3:]
+    if not keyword.startswith("word:"):
+        return re.escape(unicodedata.normalize("NFKC", keyword).casefold())
+    keyword = keyword[5:]
+    escaped = re.escape(unicodedata.normalize("NFKC", keyword).casefold())
+    # Only anchor on word boundaries where the keyword itself starts/ends with a word character.
+    prefix = r"(?<!\w)" if re.match(r"\w", keyword) else ""
+    suffix = r"(?!\w)" if re.search(r"\w$", keyword) else ""
+    return f"{prefix}{escaped}{suffix}"
+
+
+def is_emoji_only(text):
+    """
+    True if the text has visible characters but none of them are letters or digits.
+    """
+    stripped = "".join(text.split())
+    return bool(stripped) and all(unicodedata.category(ch).startswith(_NON_WORD_CATEGORIES) for ch in stripped)
+
+
+class CompiledFilters:
+    """
+    A client's filters compiled for fast repeated matching, with per-rule hit counters.
+    """
+
+    def __init__(self, filters):
+        self.source = filters
+        self.keywords = [kw for kw in filters.get("ignored_keywords", []) if kw]
+        self.keyword_regex = None
+        if self.keywords:
+            alternation = "|".join(f"(?P<k{i}>{_keyword_pattern(kw)})" for i, kw in enumerate(self.keywords))
+            self.keyword_regex = re.compile(alternation, re.IGNORECASE)
+        self.require_question = filters.get("require_question", False)
+        self.skip_emoji_only = filters.get("skip_emoji_only", True)
+        self.skip_tag_only = filters.get("skip_tag_only", True)
+        self.max_links = filters.get("max_links", DEFAULT_MAX_LINKS)
+        self.hits = Counter()
+        self.lock = threading.Lock()
+
+    def check(self, comment_text):
+        """
+        Return the name of the first rule that rejects the comment, or None if it passes.
+        """
+        rule = self._match(comment_text)
+        if rule:
+            with self.lock:
+                self.hits[rule] += 1
+        return rule
+
+    def passes(self, comment_text):
+        """
+        True if no rule rejects the comment; unlike check(), nothing is counted.
+        """
+        return self._match(comment_text) is None
+
+    def _match(self, comment_text):
+        text = comment_text.strip()
+        if not text:
+            return "empty"
+        if self.keyword_regex:
+            match = self.keyword_regex.search(unicodedata.normalize("NFKC", text).casefold())
+            if match:
+                return f"keyword:{self.keywords[int(match.lastgroup[1:])]}"
+        if self.skip_emoji_only and is_emoji_only(text):
+            return "emoji_only"
+        if self.skip_tag_only and _mention_or_hashtag.search(text) and not _mention_or_hashtag.sub("", text).strip():
+            return "tag_only"
+        if self.max_links:
+            links = _link.findall(text)
+            if len(links) >= self.max_links or (links and not _link.sub("", text).strip()):
+                return "link_spam"
+        if self.require_question and not text.endswith("?"):
+            return "require_question"
+        return None
+
+
+_compiled = {}
+_compiled_lock = threading.Lock()
+
+
+def compile_client_filters(client_config):
+    """
+    Compile and register a client's filters; called once per config at load time.
+    """
+    compiled = CompiledFilters(client_config.setdefault("filters", {}))
+    with _compiled_lock:
+        _compiled[client_config["brand_name"]] = compiled
+    return compiled
+
+
+def filter_hit_counts():
+    """
+    Return {brand_name: {rule: hits}} for every client with at least one rejection.
+    """
+    with _compiled_lock:
+        items = list(_compiled.items())
+    return {brand: dict(compiled.hits) for brand, compiled in items if compiled.hits}
@@ -0,0 +1,298 @@
+"""
+Shared HTTP client for the Facebook Graph API.
+
+All outbound HTTP calls (Graph API reads and writes, Slack webhooks, the token
+tools) go through one pooled requests.Session so TCP/TLS connections are kept
+alive between calls. Every call gets a timeout, and transient failures
+(connection errors, 5xx, 429 and Graph rate-limit error codes) are retried
+with jittered exponential backoff that honors Retry-After.
+
+Every Graph response's usage headers (X-App-Usage, X-Page-Usage,
+X-Business-Use-Case-Usage) feed the usage tracker in graph_usage.py, which
+spaces out requests as the app or a page nears its quota and holds them
+while Meta reports the page as blocked.
+
+Requests can also be packed into Graph API batch calls (up to BATCH_LIMIT
+sub-requests per HTTP round trip) with batch_request().
+"""
+
+import os
+import json
+import random
+import threading
+import time
+from urllib.parse import urlencode, urlparse, parse_qs
+import requests
+from requests.adapters import HTTPAdapter
+from auto_responder.graph_usage import usage_tracker, token_scope
+
+BASE_FB_URL = os.getenv("GRAPH_API_BASE_URL", "https://graph.facebook.com/v22.0")  # override to point at a stand-in
+
+CONNECT_TIMEOUT = float(os.getenv("GRAPH_CONNECT_TIMEOUT", "5"))
+READ_TIMEOUT = float(os.getenv("GRAPH_READ_TIMEOUT", "30"))
+MAX_RETRIES = int(os.getenv("GRAPH_MAX_RETRIES", "4"))
+BACKOFF_BASE = 1.0  # seconds
+BACKOFF_MAX = 60.0  # seconds
+POOL_SIZE = int(os.getenv("GRAPH_POOL_SIZE", "20"))
+BATCH_LIMIT = 50  # Graph API maximum sub-requests per batch call
+
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+# Graph API error codes that mean "throttled, try again later"
+RATE_LIMIT_ERROR_CODES = {4, 17, 32, 613, 80001, 80002, 80004, 80005, 80006, 80008}
+IDEMPOTENT_METHODS = {"GET", "HEAD", "OPTIONS", "DELETE"}
+
+_session = None
+_session_lock = threading.Lock()
+_stats_lock = threading.Lock()
+_stats = {"requests": 0, "retries": 0, "failures": 0}
+
+
+def get_session():
+    """
+    Return the process-wide pooled session, creating it on first use.
+    """
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=POOL_SIZE, pool_maxsize=POOL_SIZE, max_retries=0)
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                _session = session
+    return _session
+
+
+def graph_url(path):
+    """
+    Build a Graph API URL from a relative path. Absolute URLs (e.g. paging.next) are returned unchanged.
+    """
+    if path.startswith("http://") or path.startswith("https://"):
+        return path
+    return f"{BASE_FB_URL}/{path.lstrip('/')}"
+
+
+def _graph_error_code(resp):
+    try:
+        return resp.json().get("error", {}).get("code")
+    except (ValueError, AttributeError):
+        return None
+
+
+def is_rate_limited(resp):
+    """
+    Return True if the response is a throttling response (HTTP 429 or a Graph rate-limit error code).
+    """
+    return resp.status_code == 429 or _graph_error_code(resp) in RATE_LIMIT_ERROR_CODES
+
+
+def _should_retry(resp, idempotent):
+    if is_rate_limited(resp):
+        return True
+    # A 5xx on a write may already have been applied, so only retry reads.
+    return idempotent and resp.status_code in RETRY_STATUS_CODES
+
+
+def _backoff_delay(attempt, resp=None):
+    """
+    Full-jitter exponential backoff, never shorter than the server's Retry-After.
+    """
+    delay = random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * (2 ** attempt)))
+    if resp is not None:
+        retry_after = resp.headers.get("Retry-After")
+        if retry_after:
+            try:
+                delay = max(delay, float(retry_after))
+            except ValueError:
+                pass
+    return delay
+
+
+def _count(key):
+    with _stats_lock:
+        _stats[key] += 1
+
+
+def _usage_scope(url, params, data):
+    """
+    Usage scope of a Graph call (its access token's page), or False for non-Graph URLs.
+
+    The token is taken from params, the form body or the URL's own query string (paging.next URLs).
+    """
+    if not url.startswith(BASE_FB_URL):
+        return False
+    access_token = (params or {}).get("access_token") or (data if isinstance(data, dict) else {}).get("access_token")
+    if not access_token:
+        access_token = (parse_qs(urlparse(url).query).get("access_token") or [None])[0]
+    return token_scope(access_token) if access_token else None
+
+
+def request(method, url, params=None, data=None, json=None, timeout=None, max_retries=MAX_RETRIES, idempotent=None):
+    """
+    Send an HTTP request over the shared session with timeout and retry/backoff.
+
+    Parameters:
+        method (str): HTTP method.
+        url (str): Absolute URL.
+        params (dict): Query string parameters.
+        data (dict): Form body.
+        json (dict): JSON body.
+        timeout (float or tuple): Per-call timeout; defaults to (CONNECT_TIMEOUT, READ_TIMEOUT).
+        max_retries (int): Maximum number of retries after the first attempt.
+        idempotent (bool): Override whether the call is safe to repeat; defaults to True for GET-like methods.
+
+    Returns:
+        requests.Response: The final response, which may still be an error response.
+
+    Raises:
+        requests.RequestException: If the request could not be completed after all retries,
+            or graph_usage.GraphThrottled if Meta reports the page as blocked for a while.
+    """
+    method = method.upper()
+    if idempotent is None:
+        idempotent = method in IDEMPOTENT_METHODS
+    timeout = timeout or (CONNECT_TIMEOUT, READ_TIMEOUT)
+    session = get_session()
+    scope = _usage_scope(url, params, data)
+    attempt = 0
+    while True:
+        if scope is not False:
+            usage_tracker.before_request(scope)
+        _count("requests")
+        try:
+            resp = session.request(method, url, params=params, data=data, json=json, timeout=timeout)
+        except requests.RequestException as e:
+            # Connect failures never reached the server, so they are always safe to retry.
+            retryable = idempotent or isinstance(e, requests.ConnectTimeout)
+            if not retryable or attempt >= max_retries:
+                _count("failures")
+                raise
+            delay = _backoff_delay(attempt)
+        else:
+            if scope is not False:
+                usage_tracker.record(resp.headers, scope)
+            if not _should_retry(resp, idempotent) or attempt >= max_retries:
+                if resp.status_code >= 400:
+                    _count("failures")
+                return resp
+            delay = _backoff_delay(attempt, resp)
+        attempt += 1
+        _count("retries")
+        time.sleep(delay)
+
+
+def graph_get(path, access_token=None, params=None, **kwargs):
+    """
+    GET a Graph API path (or absolute paging URL) with the given access token.
+    """
+    params = dict(params or {})
+    if access_token:
+        params["access_token"] = access_token
+    return request("GET", graph_url(path), params=params, **kwargs)
+
+
+def graph_post(path, access_token=None, data=None, **kwargs):
+    """
+    POST form data to a Graph API path with the given access token.
+    """
+    data = dict(data or {})
+    if access_token:
+        data["access_token"] = access_token
+    return request("POST", graph_url(path), data=data, **kwargs)
+
+
+def batch_request(sub_requests, access_token):
+    """
+    Send Graph API sub-requests in as few batch calls as possible.
+
+    Each sub-request is a dict with "method", "relative_url" and optionally "body" (a dict of
+    form fields). Sub-requests are packed BATCH_LIMIT at a time into one POST to the Graph root.
+    GET sub-requests that come back without a response (Meta returns null when a sub-request
+    timed out) are retried once in a following batch; writes are never repeated.
+
+    Parameters:
+        sub_requests (list): Sub-request dicts.
+        access_token (str): Access token applied to every sub-request.
+
+    Returns:
+        list: One result dict per sub-request, in input order, with keys
+              "ok" (bool), "status" (int or None), "body" (parsed JSON or raw text) and "error" (str or None).
+    """
+    results = [None] * len(sub_requests)
+    pending = list(range(len(sub_requests)))
+    retried = set()
+    while pending:
+        chunk, pending = pending[:BATCH_LIMIT], pending[BATCH_LIMIT:]
+        responses = _send_batch([sub_requests[i] for i in chunk], access_token)
+        for index, response in zip(chunk, responses):
+            is_get = sub_requests[index].get("method", "GET").upper() == "GET"
+            if response is None and is_get and index not in retried:
+                retried.add(index)
+                pending.append(index)
+                continue
+            results[index] = _batch_result(response)
+    return results
+
+
+def _send_batch(chunk, access_token):
+    batch = []
+    for sub in chunk:
+        entry = {"method": sub.get("method", "GET").upper(), "relative_url": sub["relative_url"]}
+        if sub.get("body"):
+            entry["body"] = urlencode(sub["body"])
+        batch.append(entry)
+    only_reads = all(entry["method"] == "GET" for entry in batch)
+    try:
+        resp = graph_post("", access_token, data={"batch": json.dumps(batch), "include_headers": "false"},
+                          idempotent=only_reads)
+        responses = resp.json() if resp.status_code == 200 else None
+    except (requests.RequestException, ValueError) as e:
+        return [{"code": None, "body": f"Batch request failed: {e}"}] * len(chunk)
+    if not isinstance(responses, list) or len(responses) != len(chunk):
+        return [{"code": resp.status_code, "body": resp.text}] * len(chunk)
+    return responses
+
+
+def _batch_result(response):
+    if response is None:
+        return {"ok": False, "status": None, "body": None, "error": "No response for sub-request"}
+    status = response.get("code")
+    body = response.get("body")
+    try:
+        body = json.loads(body) if isinstance(body, str) else body
+    except ValueError:
+        pass
+    ok = status is not None and 200 <= status < 300
+    error = None
+    if not ok:
+        error = body.get("error", {}).get("message") if isinstance(body, dict) else str(body)
+    return {"ok": ok, "status": status, "body": body, "error": error}
+
+
+def connection_stats():
+    """
+    Return request/retry counters and how many requests reused a pooled connection.
+
+    Returns:
+        dict: requests, retries, failures, new_connections, reused_connections, the usage
+              tracker's throttled/throttle_seconds/blocked counters and "usage" (scope -> percent).
+    """
+    new_connections = 0
+    pooled_requests = 0
+    if _session is not None:
+        for adapter in set(_session.adapters.values()):
+            pools = adapter.poolmanager.pools
+            for key in list(pools.keys()):
+                pool = pools.get(key)
+                if pool is None:
+                    continue
+                new_connections += pool.num_connections
+                pooled_requests += pool.num_requests
+    with _stats_lock:
+        stats = dict(_stats)
+    stats["new_connections"] = new_connections
+    stats["reused_connections"] = max(0, pooled_requests - new_connections)
+    with usage_tracker.lock:
+        stats.update(usage_tracker.stats)
+    stats["usage"] = usage_tracker.snapshot()
+    return stats
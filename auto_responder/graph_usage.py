@@ -0,0 +1,202 @@
+"""
+Client-side throttling from the Graph API's rate-limit usage headers.
+
+Every Graph response reports how much of the rate-limit budget has been used, as a
+percentage of call count, total time and CPU time:
+- X-App-Usage: usage of the whole app,
+- X-Page-Usage and X-Business-Use-Case-Usage: usage of the page behind the access token,
+  with estimated_time_to_regain_access (minutes) once it is blocked.
+
+UsageTracker keeps the latest figures for the app and for each page token. While usage
+stays under SLOWDOWN_START percent requests go out unhindered; above that, requests in
+the same scope are spaced out on a curve that reaches MAX_REQUEST_INTERVAL at 100%. A
+scope reported as blocked is paused until its estimated regain time. Readings older than
+USAGE_STALE_SECONDS are ignored, since Meta's usage windows roll over.
+"""
+
+import os
+import json
+import time
+import hashlib
+import threading
+import requests
+
+SLOWDOWN_START = float(os.getenv("GRAPH_USAGE_SLOWDOWN_START", "75"))  # percent of quota where spacing starts
+MAX_REQUEST_INTERVAL = float(os.getenv("GRAPH_USAGE_MAX_INTERVAL", "10"))  # seconds between requests at 100%
+USAGE_STALE_SECONDS = 300
+MAX_THROTTLE_WAIT = float(os.getenv("GRAPH_USAGE_MAX_WAIT", "60"))  # longer pauses fail the call instead
+APP_SCOPE = "app"
+
+
+class GraphThrottled(requests.RequestException):
+    """
+    Raised when a scope is blocked for longer than MAX_THROTTLE_WAIT. It is a RequestException,
+    so callers treat it like any other failed Graph call and pick the comments up again later.
+    """
+
+    def __init__(self, scope, retry_in):
+        super().__init__(f"Graph API usage limit reached; access expected back in {retry_in:.0f}s")
+        self.scope = scope
+        self.retry_in = retry_in
+
+
+def _number(value):
+    # Header fields are whatever Meta (or a proxy) sent; anything non-numeric reads as 0.
+    try:
+        return float(value or 0)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def usage_percent(usage):
+    """
+    The highest of the call count, total time and CPU time percentages in a usage dict.
+    """
+    return max(_number(usage.get(key)) for key in ("call_count", "total_time", "total_cputime"))
+
+
+def _parse_header(value):
+    try:
+        return json.loads(value) if value else None
+    except ValueError:
+        return None
+
+
+def token_scope(access_token):
+    """
+    Scope key for a page access token (tokens aren't kept in the tracker).
+    """
+    return "token:" + hashlib.sha256(access_token.encode()).hexdigest()[:16]
+
+
+class ScopeState:
+    def __init__(self):
+        self.percent = 0.0
+        self.updated = 0.0
+        self.blocked_until = 0.0
+        self.next_slot = 0.0
+        self.label = None
+
+
+class UsageTracker:
+    """
+    Latest Graph usage per scope (the app and each page token) and the pacing derived from it.
+    """
+
+    def __init__(self):
+        self.scopes = {}
+        self.lock = threading.Lock()
+        self.stats = {"throttled": 0, "throttle_seconds": 0.0, "blocked": 0}
+
+    def _state(self, scope):
+        state = self.scopes.get(scope)
+        if state is None:
+            state = self.scopes[scope] = ScopeState()
+        return state
+
+    def record(self, headers, scope=None):
+        """
+        Update usage from a response's headers; `scope` is the page token's scope, if any.
+
+        Never raises: the response has already been received, so malformed headers are
+        ignored rather than failing (and possibly repeating) the call.
+        """
+        try:
+            self._record(headers, scope)
+        except Exception as e:
+            print(f"⚠️ Ignoring malformed Graph usage headers: {e}")
+
+    def _record(self, headers, scope):
+        now = time.time()
+        app_usage = _parse_header(headers.get("X-App-Usage"))
+        page_usage = _parse_header(headers.get("X-Page-Usage"))
+        buc_usage = _parse_header(headers.get("X-Business-Use-Case-Usage"))
+        with self.lock:
+            if isinstance(app_usage, dict):
+                self._update(self._state(APP_SCOPE), usage_percent(app_usage), 0, now)
+            if scope is None:
+                return
+            readings = []
+            if isinstance(page_usage, dict):
+                readings.append((None, page_usage))
+            if isinstance(buc_usage, dict):
+                for object_id, entries in buc_usage.items():
+                    for entry in entries if isinstance(entries, list) else [entries]:
+                        if isinstance(entry, dict):
+                            readings.append((object_id, entry))
+            if not readings:
+                return
+            state = self._state(scope)
+            percent = max(usage_percent(usage) for _, usage in readings)
+            regain_minutes = max(_number(usage.get("estimated_time_to_regain_access")) for _, usage in readings)
+            state.label = next((object_id for object_id, _ in readings if object_id), state.label)
+            self._update(state, percent, regain_minutes, now)
+
+    def _update(self, state, percent, regain_minutes, now):
+        state.percent = percent
+        state.updated = now
+        if regain_minutes > 0:
+            if state.blocked_until <= now:
+                self.stats["blocked"] += 1
+            state.blocked_until = max(state.blocked_until, now + regain_minutes * 60)
+
+    def _live(self, state, now):
+        # An active block outlives the staleness window; the usage percentages do not.
+        return state is not None and (now - state.updated <= USAGE_STALE_SECONDS or state.blocked_until > now)
+
+    def interval(self, percent):
+        """
+        Minimum seconds between requests at the given usage: 0 below SLOWDOWN_START, rising to MAX_REQUEST_INTERVAL at 100%.
+        """
+        if percent <= SLOWDOWN_START:
+            return 0.0
+        fraction = min(1.0, (percent - SLOWDOWN_START) / (100.0 - SLOWDOWN_START))
+        return MAX_REQUEST_INTERVAL * fraction * fraction
+
+    def before_request(self, scope=None):
+        """
+        Block until a request in the app scope (and the page scope, if given) may go out.
+
+        Raises:
+            GraphThrottled: If that would take longer than MAX_THROTTLE_WAIT.
+        """
+        now = time.time()
+        with self.lock:
+            states = [(APP_SCOPE, self.scopes.get(APP_SCOPE))]
+            if scope is not None:
+                states.append((scope, self.scopes.get(scope)))
+            start = now
+            for _, state in states:
+                if not self._live(state, now):
+                    continue
+                if state.blocked_until > now:
+                    start = max(start, state.blocked_until)
+                start = max(start, state.next_slot)
+            wait = start - now
+            if wait > MAX_THROTTLE_WAIT:
+                blocked = max(states, key=lambda item: item[1].blocked_until if item[1] else 0)[0]
+                raise GraphThrottled(blocked, wait)
+            # Reserve this slot so concurrent callers queue up behind it.
+            for _, state in states:
+                if self._live(state, now):
+                    state.next_slot = start + self.interval(state.percent)
+            if wait > 0:
+                self.stats["throttled"] += 1
+                self.stats["throttle_seconds"] += wait
+        if wait > 0:
+            time.sleep(wait)
+
+    def snapshot(self):
+        """
+        Return {scope label: usage percent} for every reading that isn't stale.
+        """
+        now = time.time()
+        with self.lock:
+            return {
+                (state.label or scope): state.percent
+                for scope, state in self.scopes.items()
+                if now - state.updated <= USAGE_STALE_SECONDS
+            }
+
+
+usage_tracker = UsageTracker()
@@ -0,0 +1,214 @@
+"""
+Central dispatch layer for OpenAI chat completions.
+
+Every LLM call in the project goes through chat_completion(), which:
+- caps the number of requests in flight with a semaphore,
+- paces requests with requests-per-minute and tokens-per-minute token buckets,
+  reserving an estimate before the call and settling it against the actual
+  usage reported in the response,
+- retries rate-limit (429), timeout and 5xx errors with jittered exponential
+  backoff that honors Retry-After.
+
+Limits are read from OPENAI_MAX_CONCURRENCY, OPENAI_RPM_LIMIT and OPENAI_TPM_LIMIT.
+"""
+
+import os
+import random
+import threading
+import time
+from contextlib import contextmanager
+from dotenv import load_dotenv
+from openai import OpenAI, RateLimitError, APIConnectionError, APITimeoutError, InternalServerError
+from auto_responder import metrics
+
+load_dotenv()
+OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
+
+MAX_CONCURRENCY = int(os.getenv("OPENAI_MAX_CONCURRENCY", "4"))
+RPM_LIMIT = int(os.getenv("OPENAI_RPM_LIMIT", "500"))
+TPM_LIMIT = int(os.getenv("OPENAI_TPM_LIMIT", "200000"))
+MAX_RETRIES = int(os.getenv("OPENAI_MAX_RETRIES", "5"))
+BACKOFF_BASE = 1.0  # seconds
+BACKOFF_MAX = 60.0  # seconds
+DEFAULT_COMPLETION_TOKENS = 256  # reserved for the reply when max_tokens isn't given
+RETRYABLE_ERRORS = (RateLimitError, APIConnectionError, APITimeoutError, InternalServerError)
+
+
+def estimate_tokens(messages):
+    """
+    Rough prompt token estimate (~4 characters per token plus per-message overhead).
+    """
+    return sum(4 + len(message.get("content") or "") // 4 for message in messages) + 3
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket holding up to `capacity` tokens, refilled evenly over a minute.
+
+    The level may go negative when a call used more tokens than were reserved; later
+    callers then wait until the debt is paid back by the refill.
+    """
+
+    def __init__(self, capacity_per_minute):
+        self.capacity = float(capacity_per_minute)
+        self.rate = self.capacity / 60.0
+        self.level = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def acquire(self, amount):
+        """
+        Block until `amount` tokens (capped at capacity) are available, then take them.
+        """
+        amount = min(float(amount), self.capacity)
+        while True:
+            with self.lock:
+                self._refill()
+                if self.level >= amount:
+                    self.level -= amount
+                    return
+                wait = (amount - self.level) / self.rate
+            time.sleep(wait)
+
+    def adjust(self, amount):
+        """
+        Give back (positive) or charge extra (negative) tokens after the fact.
+        """
+        with self.lock:
+            self._refill()
+            self.level = min(self.capacity, self.level + amount)
+
+
+class LLMScheduler:
+    """
+    Bounded-concurrency, rate-limited executor for chat completion requests.
+    """
+
+    def __init__(self, client=None, max_concurrency=MAX_CONCURRENCY, rpm_limit=RPM_LIMIT,
+                 tpm_limit=TPM_LIMIT, max_retries=MAX_RETRIES):
+        # The SDK's own retries are disabled so that every attempt is paced by the buckets.
+        self.client = client or OpenAI(api_key=OPENAI_API_KEY, max_retries=0)
+        self.semaphore = threading.BoundedSemaphore(max_concurrency)
+        self.request_bucket = TokenBucket(rpm_limit)
+        self.token_bucket = TokenBucket(tpm_limit)
+        self.max_retries = max_retries
+        self.stats_lock = threading.Lock()
+        self.stats = {"requests": 0, "retries": 0, "failures": 0, "prompt_tokens": 0, "completion_tokens": 0}
+
+    def _count(self, **increments):
+        with self.stats_lock:
+            for key, value in increments.items():
+                self.stats[key] += value
+
+    def chat_completion(self, **kwargs):
+        """
+        Run client.chat.completions.create(**kwargs) under the concurrency and rate limits.
+
+        Returns:
+            The ChatCompletion response.
+
+        Raises:
+            openai.OpenAIError: If the call still fails after all retries, or fails with a non-retryable error.
+        """
+        reserved = estimate_tokens(kwargs.get("messages", [])) + kwargs.get("max_tokens", DEFAULT_COMPLETION_TOKENS)
+        attempt = 0
+        while True:
+            self.request_bucket.acquire(1)
+            self.token_bucket.acquire(reserved)
+            try:
+                with self.semaphore:
+                    self._count(requests=1)
+                    response = self.client.chat.completions.create(**kwargs)
+            except RETRYABLE_ERRORS as e:
+                # A rejected request consumed no tokens, so return the reservation.
+                self.token_bucket.adjust(reserved)
+                if attempt >= self.max_retries:
+                    self._count(failures=1)
+                    raise
+                attempt += 1
+                self._count(retries=1)
+                time.sleep(_backoff_delay(attempt, e))
+                continue
+            except Exception:
+                self.token_bucket.adjust(reserved)
+                self._count(failures=1)
+                raise
+
+            usage = getattr(response, "usage", None)
+            if usage is not None:
+                self.token_bucket.adjust(reserved - usage.total_tokens)
+                self._count(prompt_tokens=usage.prompt_tokens, completion_tokens=usage.completion_tokens)
+                metrics.record_tokens(kwargs.get("model"), usage.prompt_tokens, usage.completion_tokens)
+            _add_to_tallies(usage)
+            return response
+
+
+def _backoff_delay(attempt, error):
+    delay = random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * (2 ** attempt)))
+    response = getattr(error, "response", None)
+    retry_after = response.headers.get("retry-after") if response is not None else None
+    if retry_after:
+        try:
+            delay = max(delay, float(retry_after))
+        except ValueError:
+            pass
+    return delay
+
+
+_local = threading.local()
+
+
+@contextmanager
+def track_usage():
+    """
+    Tally the calls and token usage of every chat completion made by this thread inside the block.
+
+    Yields:
+        dict: calls, prompt_tokens and completion_tokens, filled in as calls complete.
+    """
+    tally = {"calls": 0, "prompt_tokens": 0, "completion_tokens": 0}
+    tallies = getattr(_local, "tallies", None)
+    if tallies is None:
+        tallies = _local.tallies = []
+    tallies.append(tally)
+    try:
+        yield tally
+    finally:
+        tallies.pop()
+
+
+def _add_to_tallies(usage):
+    for tally in getattr(_local, "tallies", ()):
+        tally["calls"] += 1
+        if usage is not None:
+            tally["prompt_tokens"] += usage.prompt_tokens
+            tally["completion_tokens"] += usage.completion_tokens
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def get_scheduler():
+    """
+    Return the process-wide LLMScheduler, creating it on first use.
+    """
+    global _scheduler
+    if _scheduler is None:
+        with _scheduler_lock:
+            if _scheduler is None:
+                _scheduler = LLMScheduler()
+    return _scheduler
+
+
+def chat_completion(**kwargs):
+    """
+    Send a chat completion through the shared scheduler; takes the same arguments as
+    client.chat.completions.create.
+    """
+    return get_scheduler().chat_completion(**kwargs)
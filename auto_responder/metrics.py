@@ -0,0 +1,238 @@
+"""
+In-process metrics: per-stage latency histograms, per-brand comment counters and OpenAI token totals.
+
+Stages timed with `timed()`:
+    graph_fetch   one incremental sync of a page's feed and comments
+    triage        deciding whether to respond (single, combined or batch calls)
+    generate      writing a reply
+    post          posting replies to the Graph API
+    db_write      a comments.db write or transaction
+
+Counters per brand: comments seen, filtered (by local filter rules), skipped (not
+answered, filtered ones included), replied and failed (reply could not be posted). Token usage is read from every chat completion response.
+
+The daemon serves the metrics in Prometheus text format (serve_metrics); one-shot runs
+write them as JSON with dump_json.
+"""
+
+import os
+import json
+import time
+import bisect
+import tempfile
+import threading
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+METRICS_PORT = int(os.getenv("METRICS_PORT", "9108"))  # 0 disables the daemon's /metrics endpoint
+METRICS_FILE = os.getenv("METRICS_FILE", os.path.join("logs", "metrics.json"))
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)  # seconds
+PREFIX = "auto_responder"
+
+
+class Histogram:
+    """
+    Cumulative-bucket latency histogram, Prometheus style.
+    """
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # last slot is +Inf
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def quantile(self, q):
+        """
+        Estimate the q-quantile by linear interpolation inside its bucket (None if empty).
+        """
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for index, count in enumerate(self.counts):
+            if seen + count >= rank and count:
+                lower = self.buckets[index - 1] if index > 0 else 0.0
+                if index >= len(self.buckets):
+                    return lower  # beyond the last bucket all we know is the lower bound
+                return lower + (self.buckets[index] - lower) * (rank - seen) / count
+            seen += count
+        return self.buckets[-1]
+
+
+class Metrics:
+    """
+    Thread-safe registry of stage histograms, comment counters and token totals.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.started = time.time()
+        self.stages = {}  # stage -> Histogram
+        self.comments = {}  # (brand, event) -> count
+        self.tokens = {}  # (model, kind) -> count
+        self.llm_calls = {}  # model -> count
+
+    def observe(self, stage, seconds):
+        with self.lock:
+            histogram = self.stages.get(stage)
+            if histogram is None:
+                histogram = self.stages[stage] = Histogram()
+            histogram.observe(seconds)
+
+    @contextmanager
+    def timed(self, stage):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - started)
+
+    def count(self, brand, event, amount=1):
+        if not amount:
+            return
+        with self.lock:
+            self.comments[(brand, event)] = self.comments.get((brand, event), 0) + amount
+
+    def record_tokens(self, model, prompt_tokens, completion_tokens):
+        with self.lock:
+            self.llm_calls[model] = self.llm_calls.get(model, 0) + 1
+            for kind, amount in (("prompt", prompt_tokens), ("completion", completion_tokens)):
+                self.tokens[(model, kind)] = self.tokens.get((model, kind), 0) + amount
+
+    def reset(self):
+        with self.lock:
+            self.started = time.time()
+            self.stages.clear()
+            self.comments.clear()
+            self.tokens.clear()
+            self.llm_calls.clear()
+
+    def snapshot(self):
+        """
+        Return everything recorded so far as plain JSON-serializable data.
+        """
+        with self.lock:
+            stages = {
+                stage: {
+                    "count": histogram.count,
+                    "sum": round(histogram.sum, 6),
+                    "p50": histogram.quantile(0.5),
+                    "p95": histogram.quantile(0.95),
+                    "p99": histogram.quantile(0.99),
+                    "buckets": dict(zip([str(b) for b in histogram.buckets] + ["+Inf"], histogram.counts)),
+                }
+                for stage, histogram in sorted(self.stages.items())
+            }
+            comments = {}
+            for (brand, event), value in sorted(self.comments.items()):
+                comments.setdefault(brand, {})[event] = value
+            tokens = {}
+            for (model, kind), value in sorted(self.tokens.items()):
+                tokens.setdefault(model, {"calls": self.llm_calls.get(model, 0)})[f"{kind}_tokens"] = value
+            return {
+                "started": self.started,
+                "elapsed_seconds": round(time.time() - self.started, 3),
+                "stages": stages,
+                "comments": comments,
+                "llm": tokens,
+            }
+
+    def prometheus(self):
+        """
+        Render the metrics in the Prometheus text exposition format.
+        """
+        lines = [
+            f"# HELP {PREFIX}_stage_seconds Latency of each processing stage.",
+            f"# TYPE {PREFIX}_stage_seconds histogram",
+        ]
+        with self.lock:
+            for stage, histogram in sorted(self.stages.items()):
+                cumulative = 0
+                for bound, count in zip([str(b) for b in histogram.buckets] + ["+Inf"], histogram.counts):
+                    cumulative += count
+                    lines.append(f'{PREFIX}_stage_seconds_bucket{{stage="{stage}",le="{bound}"}} {cumulative}')
+                lines.append(f'{PREFIX}_stage_seconds_sum{{stage="{stage}"}} {histogram.sum:.6f}')
+                lines.append(f'{PREFIX}_stage_seconds_count{{stage="{stage}"}} {histogram.count}')
+            lines += [
+                f"# HELP {PREFIX}_comments_total Comments by brand and outcome.",
+                f"# TYPE {PREFIX}_comments_total counter",
+            ]
+            for (brand, event), value in sorted(self.comments.items()):
+                lines.append(f'{PREFIX}_comments_total{{brand="{_escape(brand)}",event="{event}"}} {value}')
+            lines += [
+                f"# HELP {PREFIX}_llm_requests_total Completed OpenAI chat completions.",
+                f"# TYPE {PREFIX}_llm_requests_total counter",
+            ]
+            for model, value in sorted(self.llm_calls.items()):
+                lines.append(f'{PREFIX}_llm_requests_total{{model="{_escape(model)}"}} {value}')
+            lines += [
+                f"# HELP {PREFIX}_llm_tokens_total OpenAI tokens used, from response usage.",
+                f"# TYPE {PREFIX}_llm_tokens_total counter",
+            ]
+            for (model, kind), value in sorted(self.tokens.items()):
+                lines.append(f'{PREFIX}_llm_tokens_total{{model="{_escape(model)}",kind="{kind}"}} {value}')
+        return "\n".join(lines) + "\n"
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+_metrics = Metrics()
+observe = _metrics.observe
+timed = _metrics.timed
+count = _metrics.count
+record_tokens = _metrics.record_tokens
+snapshot = _metrics.snapshot
+prometheus = _metrics.prometheus
+reset = _metrics.reset
+
+
+def dump_json(path=METRICS_FILE):
+    """
+    Write the current metrics snapshot to `path` atomically.
+    """
+    directory = os.path.dirname(path) or "."
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w") as f:
+            json.dump(snapshot(), f, indent=2)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+    return path
+
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        data = prometheus().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve_metrics(port=METRICS_PORT):
+    """
+    Serve /metrics on `port` from a background thread.
+
+    Returns:
+        ThreadingHTTPServer: The running server (call shutdown() to stop it).
+    """
+    server = ThreadingHTTPServer(("", port), MetricsHandler)
+    threading.Thread(target=server.serve_forever, name="metrics", daemon=True).start()
+    return server
@@ -0,0 +1,179 @@
+"""
+Near-duplicate lookup of past answered comments, so repeated questions reuse an earlier reply.
+
+Each brand gets an in-memory ReplyIndex built from the comments it has already answered
+(comments.db stores the posted reply_text). Comments are normalized, split into character
+shingles and reduced to a MinHash signature; signatures are split into LSH bands so a
+lookup only compares against comments that share at least one band. A candidate is reused
+when its estimated Jaccard similarity reaches the brand's `reply_reuse_threshold` and both
+comments have the same content words (everything but STOPWORDS), since character shingles
+can't tell "ship to the UK?" from "ship to the US?". Reuse skips triage, so it is opt-in:
+REPLY_REUSE_THRESHOLD defaults to 0 (off) and a brand turns it on with e.g. 0.85.
+
+Each index keeps at most REPLY_INDEX_MAX_ENTRIES comments, dropping the oldest first.
+"""
+
+import os
+import re
+import zlib
+import random
+import threading
+from collections import OrderedDict
+from auto_responder.comment_store import get_store
+from auto_responder.decision_cache import normalize_text
+
+REPLY_REUSE_THRESHOLD = float(os.getenv("REPLY_REUSE_THRESHOLD", "0"))  # 0 disables reuse unless a brand sets one
+REPLY_INDEX_MAX_ENTRIES = int(os.getenv("REPLY_INDEX_MAX_ENTRIES", "2000"))  # per brand
+SHINGLE_SIZE = 3  # characters
+NUM_PERMUTATIONS = 64
+NUM_BANDS = 16  # 4 rows per band: pairs above ~0.5 similarity almost always share a band
+MIN_REUSE_CHARS = 10  # shorter comments ("price?") carry too little context to reuse a reply
+
+_MERSENNE_PRIME = (1 << 61) - 1
+_rng = random.Random(0x5EED)  # fixed seed keeps signatures comparable across runs
+_PERMUTATIONS = [(_rng.randrange(1, _MERSENNE_PRIME), _rng.randrange(0, _MERSENNE_PRIME)) for _ in range(NUM_PERMUTATIONS)]
+_ROWS_PER_BAND = NUM_PERMUTATIONS // NUM_BANDS
+_punctuation = re.compile(r"[^\w\s]")
+STOPWORDS = frozenset((
+    "a", "an", "the", "and", "or", "but", "so", "of", "to", "in", "on", "at", "for", "with", "from", "by",
+    "is", "are", "was", "were", "be", "been", "am", "do", "does", "did", "can", "could", "will", "would",
+    "i", "me", "my", "you", "your", "we", "our", "it", "its", "this", "that", "these", "those",
+    "there", "here", "just", "please", "hi", "hello", "hey",
+))
+
+
+def shingles(text):
+    """
+    Character shingles of the normalized text, with punctuation removed.
+    """
+    text = " ".join(_punctuation.sub(" ", normalize_text(text)).split())
+    if len(text) <= SHINGLE_SIZE:
+        return {text} if text else set()
+    return {text[i:i + SHINGLE_SIZE] for i in range(len(text) - SHINGLE_SIZE + 1)}
+
+
+def content_words(text):
+    """
+    The normalized words of the text that are not STOPWORDS; two comments must share all of them to reuse a reply.
+    """
+    return frozenset(word for word in _punctuation.sub(" ", normalize_text(text)).split() if word not in STOPWORDS)
+
+
+def minhash(text):
+    """
+    MinHash signature (tuple of NUM_PERMUTATIONS ints) of the text's shingles, or None for empty text.
+    """
+    hashes = [zlib.crc32(shingle.encode()) for shingle in shingles(text)]
+    if not hashes:
+        return None
+    return tuple(min((a * h + b) % _MERSENNE_PRIME for h in hashes) for a, b in _PERMUTATIONS)
+
+
+def similarity(sig_a, sig_b):
+    """
+    Estimated Jaccard similarity of two signatures.
+    """
+    return sum(a == b for a, b in zip(sig_a, sig_b)) / NUM_PERMUTATIONS
+
+
+def _bands(signature):
+    return [(i, signature[i * _ROWS_PER_BAND:(i + 1) * _ROWS_PER_BAND]) for i in range(NUM_BANDS)]
+
+
+class ReplyIndex:
+    """
+    Bounded MinHash/LSH index of one brand's answered comments and their replies.
+    """
+
+    def __init__(self, max_entries=REPLY_INDEX_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()  # comment_id -> (signature, content words, reply_text), oldest first
+        self.buckets = {}  # (band, band values) -> set of comment_ids
+        self.lock = threading.Lock()
+
+    def add(self, comment_id, comment_text, reply_text):
+        signature = minhash(comment_text)
+        if signature is None or not reply_text:
+            return
+        with self.lock:
+            if comment_id in self.entries:
+                self._remove(comment_id)
+            self.entries[comment_id] = (signature, content_words(comment_text), reply_text)
+            for band in _bands(signature):
+                self.buckets.setdefault(band, set()).add(comment_id)
+            while len(self.entries) > self.max_entries:
+                self._remove(next(iter(self.entries)))
+
+    def _remove(self, comment_id):
+        signature, _, _ = self.entries.pop(comment_id)
+        for band in _bands(signature):
+            bucket = self.buckets.get(band)
+            if bucket is not None:
+                bucket.discard(comment_id)
+                if not bucket:
+                    del self.buckets[band]
+
+    def find(self, comment_text, threshold):
+        """
+        Return (reply_text, similarity) of the most similar indexed comment at or above threshold, or None.
+        """
+        signature = minhash(comment_text)
+        if signature is None:
+            return None
+        words = content_words(comment_text)
+        best = None
+        with self.lock:
+            candidates = set()
+            for band in _bands(signature):
+                candidates |= self.buckets.get(band, set())
+            for comment_id in candidates:
+                candidate_signature, candidate_words, reply_text = self.entries[comment_id]
+                score = similarity(signature, candidate_signature)
+                if score >= threshold and candidate_words == words and (best is None or score > best[1]):
+                    best = (reply_text, score)
+        return best
+
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def get_reply_index(client_config):
+    """
+    Return the brand's ReplyIndex, loading its most recent answered comments from the store on first use.
+    """
+    brand_name = client_config.brand_name
+    with _indexes_lock:
+        index = _indexes.get(brand_name)
+        if index is None:
+            index = _indexes[brand_name] = ReplyIndex()
+            if client_config.facebook_page_id:
+                # Oldest first, so the newest replies are the last to be evicted.
+                answered = get_store().get_answered_replies(client_config.facebook_page_id, index.max_entries)
+                for comment_id, message, reply_text in reversed(answered):
+                    index.add(comment_id, message, reply_text)
+    return index
+
+
+def reuse_threshold(client_config):
+    if client_config.reply_reuse_threshold is None:
+        return REPLY_REUSE_THRESHOLD
+    return float(client_config.reply_reuse_threshold)
+
+
+def find_similar_reply(comment_text, client_config):
+    """
+    Return (reply_text, similarity) from a near-duplicate answered comment, or None if reuse is off or nothing matches.
+    """
+    threshold = reuse_threshold(client_config)
+    if threshold <= 0 or len(normalize_text(comment_text)) < MIN_REUSE_CHARS:
+        return None
+    return get_reply_index(client_config).find(comment_text, threshold)
+
+
+def remember_reply(comment_id, comment_text, reply_text, client_config):
+    """
+    Add a posted reply to the brand's index so later near-duplicates can reuse it.
+    """
+    if reuse_threshold(client_config) > 0:
+        get_reply_index(client_config).add(comment_id, comment_text, reply_text)
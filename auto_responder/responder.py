@@ -1,69 +1,233 @@
 import os
-import requests
 import datetime
 import json
-import pytz
 import argparse
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from dotenv import load_dotenv
-from openai import OpenAI
-from functools import lru_cache
+from auto_responder.llm import chat_completion, get_scheduler, track_usage, MAX_CONCURRENCY as LLM_MAX_CONCURRENCY
+from auto_responder.graph_client import request, graph_get, graph_post, batch_request, connection_stats
 from auto_responder.comment_store import (
-    init_comment_db, log_post, log_comment,
-    mark_comment_as_responded, get_recent_post_comments
+    init_comment_db, get_store, mark_comment_as_responded,
+    get_recent_post_comments, get_sync_watermark, to_epoch,
+    claim_comments, release_comments, mark_comment_as_skipped
 )
+from auto_responder.decision_cache import get_decision_cache
+from auto_responder.filters import filter_hit_counts
+from auto_responder.config_registry import get_registry
+from auto_responder.reply_index import find_similar_reply, remember_reply
+from auto_responder import metrics
+from auto_responder.event_log import log_event
 
 load_dotenv()
-OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
-client = OpenAI(api_key=OPENAI_API_KEY)
 
-BASE_FB_URL = "https://graph.facebook.com/v22.0"
-CONFIG_FOLDER = "configs"
-LOG_FOLDER = "logs"
-LOG_FILE = os.path.join(LOG_FOLDER, "responder_comments.log")
+COMMENT_FIELDS = "id,message,from,created_time,parent"
+INITIAL_LOOKBACK_SECONDS = 5 * 60  # how far back the very first sync of a page reaches
+SYNC_OVERLAP_SECONDS = 60  # re-read this much before the watermark to catch late-indexed comments
+POST_LOOKBACK_DAYS = int(os.getenv("POST_LOOKBACK_DAYS", "7"))  # only posts this recent are scanned for comments
+PENDING_RETRY_SECONDS = int(os.getenv("PENDING_RETRY_SECONDS", str(24 * 3600)))  # unanswered comments this recent are offered again
+MAX_REPLY_ATTEMPTS = int(os.getenv("MAX_REPLY_ATTEMPTS", "5"))  # failed tries before a comment is parked in 'failed'
+RETRY_DELAY_SECONDS = 60  # wait before the first retry of a failed comment, doubling with every attempt
+FEED_MIN_POSTS = int(os.getenv("FEED_MIN_POSTS", "25"))  # newest posts always scanned, however old they are
+SYNC_MAX_LAG_SECONDS = int(os.getenv("SYNC_MAX_LAG_SECONDS", "3600"))  # failed comment pages hold the watermark back at most this long
+MAX_WORKERS = int(os.getenv("RESPONDER_MAX_WORKERS", "4"))
+TRIAGE_MODES = ("two_call", "combined", "batch")  # per-client "triage_mode"; two_call is the default
+TRIAGE_BATCH_SIZE = 20  # default comments per batch triage request ("triage_batch_size")
 
+triage_stats = {}  # mode -> comments, seconds, calls and token totals for the run summary
+triage_stats_lock = threading.Lock()
 
-def load_all_client_configs():
-    configs = []
-    for filename in os.listdir(CONFIG_FOLDER):
-        if filename.endswith("_config.json"):
-            with open(os.path.join(CONFIG_FOLDER, filename), "r") as f:
-                config = json.load(f)
-                configs.append(config)
-    return configs
 
-all_client_configs = load_all_client_configs()
+def get_recent_comments(page_id, page_access_token, brand_name, verbose=False):
+    """
+    Incrementally sync comments for a page and return the ones that still need handling.
+
+    The fetch resumes from the page's watermark in comment_store: the newest FEED_MIN_POSTS
+    posts and every post from the last POST_LOOKBACK_DAYS are scanned, and each post's comments
+    are read newest-first until they fall behind the watermark. Comments are ingested with
+    INSERT OR IGNORE. The result is the newly ingested comments plus stored comments from the
+    last PENDING_RETRY_SECONDS whose earlier try failed and whose retry is due (see
+    record_reply_failures); claim_comments drops any another thread is already handling.
+    If a comment page fails to load, the watermark is held back so the next poll reads it
+    again, but never more than SYNC_MAX_LAG_SECONDS behind the present.
+    """
+    now = int(datetime.datetime.now(datetime.timezone.utc).timestamp())
+    watermark = get_sync_watermark(page_id) or now - INITIAL_LOOKBACK_SECONDS
+    comments_since = watermark - SYNC_OVERLAP_SECONDS
+
+    posts = fetch_feed(page_id, page_access_token, since=watermark - POST_LOOKBACK_DAYS * 86400, min_posts=FEED_MIN_POSTS)
+    if posts is None:
+        return []
+    complete = fetch_remaining_comments(posts, page_access_token, stop_before=comments_since)
+
+    items = []
+    newest = watermark
+    for post in posts:
+        for comment in post.get("comments", {}).get("data", []):
+            created_ts = to_epoch(comment["created_time"])
+            if created_ts < comments_since:
+                continue
+            newest = max(newest, created_ts)
+            items.append((post["id"], comment))
+
+    # One transaction (one fsync) for the whole fetch batch
+    store = get_store()
+    with store.transaction():
+        store.log_posts([
+            (post["id"], page_id, brand_name, post.get("created_time", datetime.datetime.utcnow().isoformat()))
+            for post in posts
+        ])
+        recent_comments = ingest_comments(items, page_id, brand_name)
+        if complete:
+            store.set_sync_watermark(page_id, newest)
+        else:
+            store.set_sync_watermark(page_id, min(newest, now - SYNC_MAX_LAG_SECONDS))
+    new_ids = {comment["id"] for comment in recent_comments}
+    retries = [
+        comment for comment in store.get_retry_comments(page_id, now - PENDING_RETRY_SECONDS, now)
+        if comment["id"] not in new_ids
+    ]
+    if verbose:
+        print(f"Retrieved {len(recent_comments)} new comments for Page ID: {page_id}"
+              + (f" ({len(retries)} pending from earlier runs)" if retries else ""))
+        if not complete:
+            print(f"⚠️ Some comment pages failed to load; the watermark for Page ID {page_id} was held back")
+    return retries + recent_comments
 
 
-@lru_cache(maxsize=None)  # Cache to avoid reloading configs
-def within_working_hours(client_config_json):
-    client_config = json.loads(client_config_json)
-    tz = pytz.timezone(client_config["timezone"])
-    now = datetime.datetime.now(tz)
-    start = client_config["working_hours"]["start"]
-    end = client_config["working_hours"]["end"]
-    return start <= now.hour < end
+def ingest_comments(items, page_id, brand_name):
+    """
+    Store raw Graph API comments in one transaction and return the new ones in responder form.
 
+    This is the single ingestion point shared by polling and webhooks. Comments written by
+    the page itself (our own replies) are never returned.
 
-def get_recent_comments(page_id, page_access_token, brand_name, verbose=False):
-    url = f"{BASE_FB_URL}/{page_id}/feed?fields=comments{{id,message,from,created_time,parent}}&access_token={page_access_token}"
-    resp = requests.get(url)
-    data = resp.json()
-    recent_comments = []
-    cutoff = (datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(minutes=5)).isoformat()
-    for post in data.get("data", []):
-        log_post(post["id"], page_id, brand_name, post.get("created_time", datetime.datetime.utcnow().isoformat()))
-        for comment in post.get("comments", {}).get("data", []):
-            if comment["created_time"] > cutoff:
-                recent_comments.append({
-                    "id": comment["id"],
-                    "message": comment.get("message", ""),
-                    "from": comment.get("from", {}).get("id"),
-                    "created_time": comment["created_time"],
-                    "post_id": post["id"]
-                })
-    if verbose:
-        print(f"Retrieved {len(recent_comments)} recent comments for Page ID: {page_id}")
-    return recent_comments
+    Parameters:
+        items (list): (post_id, comment) tuples; comment has id, message, from and created_time.
+        page_id (str): Facebook Page ID.
+        brand_name (str): Name of the brand.
+
+    Returns:
+        list: Normalized comments that had not been ingested before, in input order.
+    """
+    normalized = []
+    for post_id, comment in items:
+        user_id = comment.get("from", {}).get("id")
+        if user_id == page_id:
+            continue
+        normalized.append({
+            "id": comment["id"],
+            "message": comment.get("message", ""),
+            "from": user_id,
+            "created_time": comment["created_time"],
+            "post_id": post_id
+        })
+    new_ids = get_store().log_comments([
+        (c["id"], c["from"], page_id, c["post_id"], brand_name, c["message"], c["created_time"])
+        for c in normalized
+    ])
+    metrics.count(brand_name, "seen", len(new_ids))
+    return [c for c in normalized if c["id"] in new_ids]
+
+
+def ingest_comment(comment, post_id, page_id, brand_name):
+    """
+    Store a single raw Graph API comment (e.g. from a webhook); see ingest_comments.
+
+    Returns:
+        dict or None: The normalized comment, or None if it was already ingested or is the page's own.
+    """
+    new_comments = ingest_comments([(post_id, comment)], page_id, brand_name)
+    return new_comments[0] if new_comments else None
+
+
+def fetch_feed(page_id, page_access_token, since, min_posts=FEED_MIN_POSTS):
+    """
+    Fetch a Page's recent posts, following `paging.next`.
+
+    The feed is newest first. Paging stops once at least `min_posts` posts were read and the
+    last page reached posts created before `since`. Posts are not filtered by age on the
+    request, because a new comment can arrive on an old post.
+
+    Parameters:
+        page_id (str): Facebook Page ID.
+        page_access_token (str): Access token for the page.
+        since (int): Epoch seconds; posts older than this are only read to make up `min_posts`.
+        min_posts (int): Number of newest posts always returned, however old.
+
+    Returns:
+        list or None: All post dicts, or None if any feed page failed to load.
+    """
+    params = {
+        "fields": f"id,created_time,comments.order(reverse_chronological).limit(100){{{COMMENT_FIELDS}}}",
+        "limit": 100,
+    }
+    resp = graph_get(f"{page_id}/feed", page_access_token, params=params)
+    posts = []
+    while True:
+        data = resp.json()
+        if "error" in data:
+            print(f"Error fetching feed for Page ID {page_id}: {data['error'].get('message')}")
+            return None
+        page = data.get("data", [])
+        posts.extend(page)
+        next_url = data.get("paging", {}).get("next")
+        if not next_url or not page:
+            return posts
+        if len(posts) >= min_posts and to_epoch(page[-1]["created_time"]) < since:
+            return posts
+        resp = graph_get(next_url)  # paging URLs already carry the token and cursor
+
+
+def fetch_remaining_comments(posts, page_access_token, stop_before=None):
+    """
+    Follow the comment cursors of every post whose embedded comments were truncated.
+
+    The next page for all such posts is requested in one Graph API batch call per round,
+    and the results are appended to each post's "comments.data" in place. Comments are
+    read newest-first, so a post stops paginating once its page reaches `stop_before`.
+
+    Parameters:
+        posts (list): Post dicts from the /feed response.
+        page_access_token (str): Access token for the page.
+        stop_before (int): Epoch seconds; stop paginating past comments older than this.
+
+    Returns:
+        bool: True if every comment page loaded, False if any sub-request failed.
+    """
+    def has_more(listing):
+        comments = listing.get("data", [])
+        if not listing.get("paging", {}).get("next") or not comments:
+            return False
+        return stop_before is None or to_epoch(comments[-1]["created_time"]) >= stop_before
+
+    cursors = {}
+    for post in posts:
+        comments = post.get("comments", {})
+        if has_more(comments):
+            cursors[post["id"]] = comments["paging"]["cursors"]["after"]
+
+    posts_by_id = {post["id"]: post for post in posts}
+    complete = True
+    while cursors:
+        post_ids = list(cursors)
+        sub_requests = [
+            {"method": "GET", "relative_url": f"{post_id}/comments?fields={COMMENT_FIELDS}&order=reverse_chronological"
+                                              f"&limit=100&after={cursors[post_id]}"}
+            for post_id in post_ids
+        ]
+        cursors = {}
+        for post_id, result in zip(post_ids, batch_request(sub_requests, page_access_token)):
+            if not result["ok"]:
+                print(f"Error fetching comments for post {post_id}: {result['error']}")
+                complete = False
+                continue
+            body = result["body"]
+            posts_by_id[post_id].setdefault("comments", {}).setdefault("data", []).extend(body.get("data", []))
+            if has_more(body):
+                cursors[post_id] = body["paging"]["cursors"]["after"]
+    return complete
 
 
 def kick_to_slack(message):
@@ -76,82 +240,353 @@ def kick_to_slack(message):
         "text": message
     }
 
-    response = requests.post(webhook_url, json=payload)
+    response = request("POST", webhook_url, json=payload)
     if response.status_code != 200:
         print(f"Error sending message to Slack: {response.status_code} {response.text}")
 
 
-@lru_cache(maxsize=1000)
-def should_respond(comment_text, client_config_json):
-    client_config = json.loads(client_config_json)
-    comment_text_lower = comment_text.lower()
-    filters = client_config.get("filters", {})
-    if any(bad in comment_text_lower for bad in filters.get("ignored_keywords", [])):
-        print(f"❌ Ignoring comment due to keyword filter: {comment_text}")
-        return False
-    if filters.get("require_question", False) and not comment_text.strip().endswith("?"):
-        print(f"❌ Skipping non-question comment: {comment_text}")
+def cached_decision(comment_text, client_config):
+    """
+    Return a triage decision that needs no OpenAI call (local filters or the decision cache), or None.
+    """
+    rule = client_config.filters.check(comment_text)
+    if rule:
+        print(f"❌ Ignoring comment due to filter rule '{rule}': {comment_text}")
+        metrics.count(client_config.brand_name, "filtered")
         return False
+    return get_decision_cache().get(comment_text, client_config)
+
+
+def should_respond(comment_text, client_config):
+    """
+    Ask the model whether the brand should answer a comment (after filters and the decision cache).
+
+    OpenAI errors are raised, not turned into a "no": the comment stays pending and nothing is
+    written to the decision cache.
+    """
+    cached = cached_decision(comment_text, client_config)
+    if cached is not None:
+        return cached
 
     prompt = f"Should the brand respond to this comment? Only answer yes or no:\n\n\"{comment_text}\""
     try:
-        response = client.chat.completions.create(
-            model="gpt-3.5-turbo",
-            messages=[
-                {"role": "system", "content": "You are a helpful assistant that decides whether to respond to public comments on social media posts."},
-                {"role": "user", "content": prompt}
-            ]
-        )
+        with metrics.timed("triage"):
+            response = chat_completion(
+                model="gpt-3.5-turbo",
+                messages=[
+                    {"role": "system", "content": "You are a helpful assistant that decides whether to respond to public comments on social media posts."},
+                    {"role": "user", "content": prompt}
+                ]
+            )
         reply = response.choices[0].message.content.strip()
         print(f"🧐 Comment: {comment_text}\n🤖 Model reply: {reply}\n")
-        return "yes" in reply.lower()
     except Exception as e:
         print(f"OpenAI error: {e}")
-        return False
+        raise
+    decision = "yes" in reply.lower()
+    get_decision_cache().put(comment_text, client_config, decision)
+    return decision
 
 
-def generate_comment_reply(comment_text, client_config):
-    prompt = f"Respond to the following comment in a {client_config['reply_style']} tone:\n\n{comment_text}"
-    response = client.chat.completions.create(
-        model="gpt-3.5-turbo",
-        messages=[
-            {"role": "system", "content": client_config.get("response_prompt", "You are a helpful social media assistant.")},
+def classify_and_generate(comment_text, client_config):
+    """
+    Decide whether to respond and write the reply in a single chat completion.
+
+    The model returns {"respond": bool, "reason": str, "reply": str} as a JSON object. If the
+    output doesn't validate, the comment falls back to the two-call path.
+
+    Returns:
+        tuple: (respond, reply) where reply is None when respond is False.
+
+    Raises:
+        Exception: If an OpenAI call fails, as in should_respond; nothing is cached and the
+        comment stays pending.
+    """
+    cached = cached_decision(comment_text, client_config)
+    if cached is False:
+        return False, None
+    if cached is True:
+        return True, generate_comment_reply(comment_text, client_config)
+
+    try:
+        with metrics.timed("triage"):
+            response = chat_completion(**combined_request(comment_text, client_config))
+    except Exception as e:
+        print(f"OpenAI error: {e}")
+        raise
+    try:
+        result = parse_triage_result(response.choices[0].message.content)
+    except ValueError as e:
+        print(f"⚠️ Invalid combined triage output ({e}); falling back to two calls.")
+        if not should_respond(comment_text, client_config):
+            return False, None
+        return True, generate_comment_reply(comment_text, client_config)
+
+    print(f"🧐 Comment: {comment_text}\n🤖 Decision: {'respond' if result['respond'] else 'skip'} ({result['reason']})\n")
+    get_decision_cache().put(comment_text, client_config, result["respond"])
+    return result["respond"], result["reply"] if result["respond"] else None
+
+
+def combined_request(comment_text, client_config):
+    """
+    Build the chat completion arguments for a combined classify-and-generate call.
+    """
+    prompt = (
+        "Decide whether the brand should respond to the following public comment on its social media post, "
+        f"and if so write the reply in a {client_config.reply_style} tone.\n"
+        'Answer only with a JSON object: {"respond": true or false, "reason": "<short reason>", '
+        '"reply": "<reply text, or empty if not responding>"}\n\n'
+        f"Comment: \"{comment_text}\""
+    )
+    return {
+        "model": "gpt-3.5-turbo",
+        "response_format": {"type": "json_object"},
+        "messages": [
+            {"role": "system", "content": client_config.response_prompt},
             {"role": "user", "content": prompt}
         ]
+    }
+
+
+def parse_triage_result(content):
+    """
+    Parse and validate a combined triage response.
+
+    Returns:
+        dict: {"respond": bool, "reason": str, "reply": str}
+
+    Raises:
+        ValueError: If the content is not a JSON object of the expected shape.
+    """
+    result = json.loads(content)  # json.JSONDecodeError is a ValueError
+    if not isinstance(result, dict) or not isinstance(result.get("respond"), bool):
+        raise ValueError("missing boolean 'respond'")
+    reason = result.get("reason", "")
+    reply = result.get("reply") or ""
+    if not isinstance(reason, str) or not isinstance(reply, str):
+        raise ValueError("'reason' and 'reply' must be strings")
+    if result["respond"] and not reply.strip():
+        raise ValueError("'respond' is true but 'reply' is empty")
+    return {"respond": result["respond"], "reason": reason, "reply": reply.strip()}
+
+
+def triage_comments_batch(comments, client_config, batch_size=None):
+    """
+    Decide whether to respond to many comments with one chat completion per chunk.
+
+    Comments decided locally (filters, decision cache) are not sent. The rest go out
+    `triage_batch_size` at a time; the model returns a JSON array with one decision per
+    comment. Entries that are missing, duplicated or malformed fall back to should_respond.
+    Comments whose request failed are left out of the result and triaged again by the caller.
+
+    Parameters:
+        comments (list): Comments to triage.
+        client_config (ClientConfig): Configuration for the client.
+        batch_size (int): Comments per request; defaults to the client's triage_batch_size.
+
+    Returns:
+        dict: comment_id -> bool
+    """
+    batch_size = batch_size or client_config.triage_batch_size or TRIAGE_BATCH_SIZE
+    started = time.monotonic()
+    decisions = {}
+    undecided = []
+    with track_usage() as usage:
+        for comment in comments:
+            cached = cached_decision(comment["message"], client_config)
+            if cached is None:
+                undecided.append(comment)
+            else:
+                decisions[comment["id"]] = cached
+        for start in range(0, len(undecided), batch_size):
+            decisions.update(triage_chunk(undecided[start:start + batch_size], client_config))
+    record_triage_stats("batch", time.monotonic() - started, usage, comments=len(comments))
+    return decisions
+
+
+def triage_chunk(chunk, client_config):
+    items = [{"id": index, "comment": comment["message"]} for index, comment in enumerate(chunk)]
+    prompt = (
+        "For each public comment on the brand's social media post below, decide whether the brand should respond.\n"
+        'Answer only with a JSON object: {"decisions": [{"id": <id>, "respond": true or false}, ...]} '
+        "containing exactly one entry for every comment id.\n\n"
+        f"{json.dumps(items, ensure_ascii=False)}"
     )
+    parsed = {}
+    try:
+        with metrics.timed("triage"):
+            response = chat_completion(
+                model="gpt-3.5-turbo",
+                response_format={"type": "json_object"},
+                messages=[
+                    {"role": "system", "content": "You are a helpful assistant that decides whether to respond to public comments on social media posts."},
+                    {"role": "user", "content": prompt}
+                ]
+            )
+        parsed = parse_batch_decisions(response.choices[0].message.content, len(chunk))
+    except ValueError as e:
+        print(f"⚠️ Invalid batch triage output ({e}); falling back to per-comment calls.")
+    except Exception as e:
+        print(f"OpenAI error during batch triage: {e}")
+        return {}
+
+    if len(parsed) < len(chunk):
+        print(f"⚠️ Batch triage decided {len(parsed)}/{len(chunk)} comments; triaging the rest one by one.")
+    decisions = {}
+    for index, comment in enumerate(chunk):
+        if index in parsed:
+            decisions[comment["id"]] = parsed[index]
+            get_decision_cache().put(comment["message"], client_config, parsed[index])
+        else:
+            try:
+                decisions[comment["id"]] = should_respond(comment["message"], client_config)
+            except Exception:
+                pass  # undecided; prepare_reply triages it on its own
+    return decisions
+
+
+def parse_batch_decisions(content, expected):
+    """
+    Parse a batch triage response into {index: respond} for the entries that validate.
+
+    Entries with an unknown or repeated id, or a non-boolean "respond", are dropped so the
+    caller can retry them individually.
+
+    Raises:
+        ValueError: If the content is not a JSON object with a "decisions" list.
+    """
+    result = json.loads(content)
+    entries = result.get("decisions") if isinstance(result, dict) else None
+    if not isinstance(entries, list):
+        raise ValueError("missing 'decisions' list")
+    parsed = {}
+    seen = set()
+    for entry in entries:
+        if not isinstance(entry, dict):
+            continue
+        index, respond = entry.get("id"), entry.get("respond")
+        if not isinstance(index, int) or isinstance(index, bool) or not 0 <= index < expected or not isinstance(respond, bool):
+            continue
+        if index in seen:
+            parsed.pop(index, None)  # contradictory duplicates can't be trusted
+            continue
+        seen.add(index)
+        parsed[index] = respond
+    return parsed
+
+
+def generate_comment_reply(comment_text, client_config):
+    prompt = client_config.reply_prompt_prefix + comment_text
+    with metrics.timed("generate"):
+        response = chat_completion(
+            model="gpt-3.5-turbo",
+            messages=[
+                {"role": "system", "content": client_config.response_prompt},
+                {"role": "user", "content": prompt}
+            ]
+        )
     return response.choices[0].message.content.strip()
 
 
 def post_comment_reply(comment_id, reply_text, page_access_token):
-    url = f"{BASE_FB_URL}/{comment_id}/comments"
-    payload = {"message": reply_text, "access_token": page_access_token}
-    resp = requests.post(url, data=payload)
+    with metrics.timed("post"):
+        resp = graph_post(f"{comment_id}/comments", page_access_token, data={"message": reply_text})
     print(f"Post comment reply response: {resp.status_code} {resp.text}")
     return resp
 
 
-def log_comment(brand, incoming_text, reply_text):
-    os.makedirs(LOG_FOLDER, exist_ok=True)
-    timestamp = datetime.datetime.now().strftime("[%Y-%m-%d %H:%M:%S]")
-    with open(LOG_FILE, "a") as f:
-        f.write(f"{timestamp} [{brand}]\n")
-        f.write(f"> {incoming_text}\n")
-        f.write(f"→ {reply_text}\n\n")
+def post_comment_replies(replies, page_access_token):
+    """
+    Post several comment replies using Graph API batch calls.
+
+    Parameters:
+        replies (list): (comment_id, reply_text) tuples.
+        page_access_token (str): Access token for the page.
+
+    Returns:
+        list: One batch result dict per reply, in input order (see graph_client.batch_request).
+    """
+    sub_requests = [
+        {"method": "POST", "relative_url": f"{comment_id}/comments", "body": {"message": reply_text}}
+        for comment_id, reply_text in replies
+    ]
+    with metrics.timed("post"):
+        return batch_request(sub_requests, page_access_token)
 
 
 # Main function to poll comments and respond
-def main(dry_run=False, verbose=False):
+def main(dry_run=False, verbose=False, max_workers=MAX_WORKERS):
     """
     Main function to poll recent comments and respond using OpenAI.
 
+    Clients are processed concurrently on a bounded worker pool so that one
+    slow or failing brand does not hold up the rest of the poll cycle.
+
     Parameters:
         dry_run (bool): If True, preview replies without posting them.
         verbose (bool): If True, print detailed information about the process.
+        max_workers (int): Maximum number of clients processed at the same time.
     """
     init_comment_db()  # Ensure the database is initialized
+    all_client_configs = get_registry().configs()  # picks up added or edited config files
+    with triage_stats_lock:
+        triage_stats.clear()
+
+    if max_workers <= 1:
+        results = [run_client(client_config, dry_run, verbose) for client_config in all_client_configs]
+    else:
+        with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="client") as executor:
+            futures = [
+                executor.submit(run_client, client_config, dry_run, verbose)
+                for client_config in all_client_configs
+            ]
+            results = [future.result() for future in as_completed(futures)]
 
-    for client_config in all_client_configs:
+    failed = [brand for brand, ok, _ in results if not ok]
+    print_triage_summary()
+    if verbose:
+        for brand, ok, elapsed in sorted(results, key=lambda r: r[2], reverse=True):
+            print(f"[{brand}] {'done' if ok else 'failed'} in {elapsed:.2f}s")
+        stats = connection_stats()
+        print(f"HTTP: {stats['requests']} requests, {stats['retries']} retries, "
+              f"{stats['new_connections']} new / {stats['reused_connections']} reused connections")
+        if stats["usage"] or stats["throttled"]:
+            usage = ", ".join(f"{scope}={percent:.0f}%" for scope, percent in sorted(stats["usage"].items()))
+            print(f"Graph usage: {usage or 'no recent readings'}; throttled {stats['throttled']} time(s) "
+                  f"for {stats['throttle_seconds']:.1f}s, {stats['blocked']} block(s) reported")
+        llm_stats = get_scheduler().stats
+        print(f"OpenAI: {llm_stats['requests']} requests, {llm_stats['retries']} retries, "
+              f"{llm_stats['prompt_tokens']} prompt / {llm_stats['completion_tokens']} completion tokens")
+        decision_cache = get_decision_cache()
+        print(f"Decision cache: {decision_cache.stats['hits']} hits / {decision_cache.stats['misses']} misses "
+              f"({decision_cache.hit_rate():.0%} hit rate)")
+        for brand, hits in filter_hit_counts().items():
+            print(f"[{brand}] Filter hits: {', '.join(f'{rule}={count}' for rule, count in sorted(hits.items()))}")
+    if failed:
+        print(f"⚠️ {len(failed)} client(s) failed this cycle: {', '.join(failed)}")
+
+
+def run_client(client_config, dry_run, verbose):
+    """
+    Run process_client for one client, isolating any failure from the others.
+
+    Parameters:
+        client_config (ClientConfig): Configuration for the client.
+        dry_run (bool): If True, preview replies without posting them.
+        verbose (bool): If True, print detailed information about the process.
+
+    Returns:
+        tuple: (brand_name, succeeded, elapsed_seconds)
+    """
+    brand_name = client_config.brand_name
+    started = time.monotonic()
+    try:
         process_client(client_config, dry_run, verbose)
+        ok = True
+    except Exception as e:
+        print(f"[{brand_name}] ❌ Error while processing client: {e}")
+        ok = False
+    return brand_name, ok, time.monotonic() - started
 
 
 def process_client(client_config, dry_run, verbose):
@@ -159,27 +594,37 @@ def process_client(client_config, dry_run, verbose):
     Process a single client configuration to fetch comments and respond.
 
     Parameters:
-            print(f"[SKIP] Skipping {client_config['brand_name']} — auto-reply disabled.")
+        client_config (ClientConfig): Configuration for the client.
         dry_run (bool): If True, preview replies without posting them.
         verbose (bool): If True, print detailed information about the process.
+
+    Returns:
+        int or None: Number of new comments found, or None if the client was skipped.
     """
-    if not client_config.get("auto_reply_enabled", False):
-        print(f"Skipping {client_config['brand_name']} — auto-reply disabled.")
-        return
+    reason = skip_reason(client_config)
+    if reason:
+        print(f"Skipping {client_config.brand_name} — {reason}.")
+        return None
 
-    if not within_working_hours(json.dumps(client_config)):
-        print(f"Skipping {client_config['brand_name']} — outside working hours.")
-        return
+    page_id = client_config.facebook_page_id
+    page_access_token = client_config.page_access_token
 
-    page_id = client_config["page_ids"].get("facebook")
-    page_access_token = client_config.get("page_access_token")
+    comments = fetch_comments(page_id, page_access_token, client_config.brand_name, verbose)
+    handle_comments(comments, client_config, dry_run, page_access_token)
+    return len(comments)
 
-    if not page_id or not page_access_token:
-        print(f"Skipping {client_config['brand_name']} — missing Page ID or Access Token.")
-        return
 
-    comments = fetch_comments(page_id, page_access_token, client_config['brand_name'], verbose)
-    handle_comments(comments, client_config, dry_run, page_access_token)
+def skip_reason(client_config):
+    """
+    Return why a client should not be handled right now, or None if it should.
+    """
+    if not client_config.auto_reply_enabled:
+        return "auto-reply disabled"
+    if not client_config.within_working_hours():
+        return "outside working hours"
+    if not client_config.facebook_page_id or not client_config.page_access_token:
+        return "missing Page ID or Access Token"
+    return None
 
 
 def fetch_comments(page_id, page_access_token, brand_name, verbose):
@@ -195,21 +640,188 @@ def fetch_comments(page_id, page_access_token, brand_name, verbose):
     Returns:
         list: List of recent comments.
     """
-    return get_recent_comments(page_id, page_access_token, brand_name, verbose)
+    with metrics.timed("graph_fetch"):
+        return get_recent_comments(page_id, page_access_token, brand_name, verbose)
 
 
 def handle_comments(comments, client_config, dry_run, page_access_token):
     """
-    Handle comments by generating and posting replies.
+    Handle comments by generating replies and posting them in one batch.
+
+    A comment that comes back with a stored draft (its post failed earlier) is posted again
+    without another OpenAI call. Failures are recorded with record_reply_failures.
 
     Parameters:
         comments (list): List of comments to process.
-        client_config (dict): Configuration for the client.
+        client_config (ClientConfig): Configuration for the client.
         dry_run (bool): If True, preview replies without posting them.
         page_access_token (str): Access token for the page.
     """
-    for comment in comments:
-        process_comment(comment, client_config, dry_run, page_access_token)
+    brand_name = client_config.brand_name
+    claimed = claim_comments(comments)
+    if len(claimed) < len(comments):
+        print(f"[{brand_name}] Skipping {len(comments) - len(claimed)} already-handled comment(s).")
+
+    responded = []
+    try:
+        decisions = {}
+        if client_config.triage_mode == "batch":
+            decisions = triage_comments_batch([c for c in claimed if not c.get("reply_text")], client_config)
+
+        failed = []  # (comment, error, reply or None)
+
+        def prepare(comment):
+            # One failing comment must not discard the replies already generated for the others.
+            if comment.get("reply_text"):
+                return comment["reply_text"]
+            try:
+                return prepare_reply(comment, client_config, dry_run, decisions.get(comment["id"]))
+            except Exception as e:
+                print(f"[{brand_name}] ❌ Failed to prepare a reply for comment {comment['id']}: {e}")
+                failed.append((comment, e, None))
+                return None
+
+        # Generation is the slow part; run it in parallel and let the LLM scheduler pace the calls.
+        with ThreadPoolExecutor(max_workers=LLM_MAX_CONCURRENCY, thread_name_prefix="generate") as executor:
+            replies = list(executor.map(prepare, claimed))
+
+        pending = []
+        for comment, reply in zip(claimed, replies):
+            if reply is None:
+                continue
+            if dry_run:
+                print(f"[DRY RUN] Reply for comment ID {comment['id']}: {reply}")
+            else:
+                pending.append((comment, reply))
+
+        results = post_comment_replies(
+            [(comment["id"], reply) for comment, reply in pending], page_access_token
+        ) if pending else []
+        for (comment, reply), result in zip(pending, results):
+            if result["ok"]:
+                responded.append(comment["id"])
+                remember_reply(comment["id"], comment["message"], reply, client_config)
+                log_event("reply", brand=brand_name, comment_id=comment["id"], message=comment["message"], reply=reply)
+                print(f"[{brand_name}] Replied to comment: {comment['message']}")
+            else:
+                print(f"[{brand_name}] ❌ Failed to reply to comment {comment['id']}: {result['error']}")
+                failed.append((comment, result["error"], reply))
+        if pending:
+            metrics.count(brand_name, "replied", len(responded))
+            metrics.count(brand_name, "failed", len(pending) - len(responded))
+            get_store().mark_comments_as_responded(responded, {comment["id"]: reply for comment, reply in pending})
+        if failed and not dry_run:
+            record_reply_failures(failed)
+    finally:
+        release_comments(responded, handled=True)
+        answered = set(responded)
+        release_comments([c["id"] for c in claimed if c["id"] not in answered])
+
+
+def record_reply_failures(failed):
+    """
+    Record failed tries so a comment is retried with backoff, not regenerated on every poll.
+
+    A reply that was generated but could not be posted is saved as a draft, so the retry only
+    posts it again. Every failure counts an attempt; the next try waits RETRY_DELAY_SECONDS,
+    doubling per attempt, and after MAX_REPLY_ATTEMPTS the comment is parked in the 'failed'
+    stage and no longer offered.
+
+    Parameters:
+        failed (list): (comment, error, reply) tuples; reply is None if none was generated.
+    """
+    store = get_store()
+    now = int(time.time())
+    with store.transaction():
+        store.save_draft_replies([
+            (reply, comment["id"]) for comment, _, reply in failed if reply is not None and not comment.get("reply_text")
+        ])
+        store.record_stage_failures([
+            (str(error)[:500], now + RETRY_DELAY_SECONDS * 2 ** comment.get("attempts", 0), comment["id"])
+            for comment, error, _ in failed
+        ], MAX_REPLY_ATTEMPTS)
+
+
+def prepare_reply(comment, client_config, dry_run=False, decision=None):
+    """
+    Log an incoming comment, decide whether to answer it and generate the reply text.
+
+    A near-duplicate of a comment the brand already answered reuses that reply without any OpenAI call.
+
+    Parameters:
+        comment (dict): Comment data.
+        client_config (ClientConfig): Configuration for the client.
+        dry_run (bool): If True, don't record skip decisions in the store.
+        decision (bool): Triage decision already made (e.g. by batch triage); None to triage here.
+
+    Returns:
+        str or None: The reply to post, or None if the comment should be skipped.
+
+    Raises:
+        Exception: If an OpenAI call fails or the reply is empty. Only a real "no" or a filter
+        hit marks a comment skipped; on an error it stays pending for a retry.
+    """
+    comment_text = comment["message"]
+    brand_name = client_config.brand_name
+
+    log_event("comment", brand=brand_name, comment_id=comment["id"], message=comment_text)
+
+    mode = client_config.triage_mode
+    if mode not in TRIAGE_MODES or (mode == "batch" and decision is None):
+        mode = "two_call"
+    started = time.monotonic()
+    with track_usage() as usage:
+        reused = None
+        if decision is not False and client_config.filters.passes(comment_text):
+            reused = find_similar_reply(comment_text, client_config)
+        if reused is not None:
+            mode = "reuse"
+            respond, reply = True, reused[0]
+            print(f"♻️ Reusing reply from a similar comment ({reused[1]:.0%} match): {comment_text}")
+        elif decision is not None:
+            respond = decision
+            reply = generate_comment_reply(comment_text, client_config) if respond else None
+        elif mode == "combined":
+            respond, reply = classify_and_generate(comment_text, client_config)
+        else:
+            respond = should_respond(comment_text, client_config)
+            reply = generate_comment_reply(comment_text, client_config) if respond else None
+    # Comments triaged in a batch were already counted by triage_comments_batch.
+    record_triage_stats(mode, time.monotonic() - started, usage, comments=0 if decision is not None else 1)
+
+    if not respond:
+        metrics.count(brand_name, "skipped")
+        log_event("skipped", brand=brand_name, comment_id=comment["id"], mode=mode)
+        if not dry_run:
+            mark_comment_as_skipped(comment["id"])
+        return None
+    if not reply.strip():
+        raise ValueError("empty reply")  # a failed try like any other; retried with backoff
+    return reply
+
+
+def record_triage_stats(mode, elapsed, usage, comments=1):
+    with triage_stats_lock:
+        stats = triage_stats.setdefault(mode, {"comments": 0, "seconds": 0.0, "calls": 0, "prompt_tokens": 0, "completion_tokens": 0})
+        stats["comments"] += comments
+        stats["seconds"] += elapsed
+        for key in ("calls", "prompt_tokens", "completion_tokens"):
+            stats[key] += usage[key]
+
+
+def print_triage_summary():
+    """
+    Print average latency, OpenAI calls and tokens per comment for each triage mode used this run.
+    """
+    with triage_stats_lock:
+        items = sorted(triage_stats.items())
+    for mode, stats in items:
+        n = stats["comments"]
+        if not n:
+            continue
+        print(f"Triage [{mode}]: {n} comments, {stats['seconds'] / n:.2f}s avg, "
+              f"{stats['calls'] / n:.2f} calls, {stats['prompt_tokens'] / n:.0f} prompt + "
+              f"{stats['completion_tokens'] / n:.0f} completion tokens per comment")
 
 
 def process_comment(comment, client_config, dry_run, page_access_token):
@@ -218,33 +830,46 @@ def process_comment(comment, client_config, dry_run, page_access_token):
 
     Parameters:
         comment (dict): Comment data.
-        client_config (dict): Configuration for the client.
+        client_config (ClientConfig): Configuration for the client.
         dry_run (bool): If True, preview replies without posting them.
         page_access_token (str): Access token for the page.
     """
     comment_id = comment["id"]
-    comment_text = comment["message"]
-    brand_name = client_config['brand_name']
-
-    log_comment(brand_name, comment_text, "")  # Log incoming comment without reply
+    brand_name = client_config.brand_name
 
-    reply = generate_comment_reply(comment_text, client_config)
-    if not reply.strip():
-        print(f"[{brand_name}] Skipping reply due to empty or invalid response.")
+    if not claim_comments([comment]):
+        print(f"[{brand_name}] Skipping already-handled comment {comment_id}.")
         return
 
-    if dry_run:
-        print(f"[DRY RUN] Reply for comment ID {comment_id}: {reply}")
-    else:
-        response = post_comment_reply(comment_id, reply, page_access_token)
-        if response.status_code == 200:
-            mark_comment_as_responded(comment_id)
-        print(f"[{brand_name}] Replied to comment: {comment_text}")
+    responded = False
+    try:
+        reply = prepare_reply(comment, client_config, dry_run)
+        if reply is None:
+            return
+
+        if dry_run:
+            print(f"[DRY RUN] Reply for comment ID {comment_id}: {reply}")
+        else:
+            response = post_comment_reply(comment_id, reply, page_access_token)
+            if response.status_code == 200:
+                mark_comment_as_responded(comment_id, reply)
+                remember_reply(comment_id, comment["message"], reply, client_config)
+                log_event("reply", brand=brand_name, comment_id=comment_id, message=comment["message"], reply=reply)
+                responded = True
+            metrics.count(brand_name, "replied" if responded else "failed")
+            print(f"[{brand_name}] Replied to comment: {comment['message']}")
+    finally:
+        release_comments([comment_id], handled=responded)
 
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Poll recent comments and respond using OpenAI.")
     parser.add_argument("--dry-run", action="store_true", help="Preview replies without posting them.")
     parser.add_argument("--verbose", action="store_true", help="Print number of comments found per client.")
+    parser.add_argument("--max-workers", type=int, default=MAX_WORKERS,
+                        help="Number of clients to process concurrently (1 = sequential).")
+    parser.add_argument("--metrics-file", default=metrics.METRICS_FILE,
+                        help="Where to write the run's metrics as JSON.")
     args = parser.parse_args()
-    main(dry_run=args.dry_run, verbose=args.verbose)
+    main(dry_run=args.dry_run, verbose=args.verbose, max_workers=args.max_workers)
+    print(f"📈 Metrics written to {metrics.dump_json(args.metrics_file)}")
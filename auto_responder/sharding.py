@@ -0,0 +1,151 @@
+"""
+Split clients across several responder workers that share one comments.db.
+
+Workers announce themselves with heartbeat rows in the `workers` table. Every worker
+builds the same consistent-hash ring from the live workers and only polls the pages
+that hash to it, so adding or losing a worker moves only that worker's share of pages.
+
+The ring decides who should own a page; a lease row in `client_leases` guarantees it.
+A worker must hold an unexpired lease before polling a page and renews its leases on
+every heartbeat; leases on pages the ring has moved away are released on the next
+heartbeat, or when the poll running at that moment finishes. If a worker dies, its heartbeat goes stale, the others drop it from
+their rings, and its leases expire after LEASE_TTL so the new owners can take over.
+While the ring is changing, a page whose lease is still held elsewhere is simply
+skipped until the lease is released or expires.
+"""
+
+import os
+import time
+import uuid
+import bisect
+import socket
+import hashlib
+import threading
+from auto_responder.comment_store import get_store
+
+HEARTBEAT_INTERVAL = int(os.getenv("SHARD_HEARTBEAT_INTERVAL", "15"))  # seconds
+WORKER_TTL = 3 * HEARTBEAT_INTERVAL  # a worker without a heartbeat for this long is considered dead
+LEASE_TTL = 4 * HEARTBEAT_INTERVAL  # leases are renewed every heartbeat, so only a dead worker's expire
+FORGET_WORKER_AFTER = 24 * 3600  # stale worker rows are deleted after this long
+VIRTUAL_NODES = 64  # points per worker on the hash ring; more points give a more even split
+
+
+def _hash(key):
+    return int.from_bytes(hashlib.md5(key.encode()).digest()[:8], "big")
+
+
+class HashRing:
+    """
+    Consistent-hash ring mapping keys (page IDs) to worker IDs.
+    """
+
+    def __init__(self, worker_ids, virtual_nodes=VIRTUAL_NODES):
+        self.worker_ids = sorted(worker_ids)
+        points = sorted((_hash(f"{worker_id}#{i}"), worker_id) for worker_id in self.worker_ids for i in range(virtual_nodes))
+        self.hashes = [point for point, _ in points]
+        self.owners = [worker_id for _, worker_id in points]
+
+    def owner(self, key):
+        if not self.owners:
+            return None
+        index = bisect.bisect(self.hashes, _hash(key)) % len(self.hashes)
+        return self.owners[index]
+
+
+class ShardCoordinator:
+    """
+    This worker's membership in the shard ring and the page leases it holds.
+    """
+
+    def __init__(self, store=None, worker_id=None):
+        self.store = store or get_store()
+        self.worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+        self.ring = HashRing([self.worker_id])
+        self.held = set()  # page IDs leased by this worker
+        self.polling = set()  # page IDs claimed for a poll that hasn't finished yet
+        self.lock = threading.Lock()
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    def start(self):
+        self.heartbeat()
+        self.thread = threading.Thread(target=self._heartbeat_loop, name="shard-heartbeat", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        """
+        Stop heartbeating and release every lease so other workers can take over immediately.
+        """
+        self.stop_event.set()
+        if self.thread is not None:
+            self.thread.join()
+        self.store.remove_worker(self.worker_id)
+        with self.lock:
+            self.held.clear()
+
+    def _heartbeat_loop(self):
+        while not self.stop_event.wait(HEARTBEAT_INTERVAL):
+            try:
+                self.heartbeat()
+            except Exception as e:
+                print(f"❌ Shard heartbeat failed: {e}")
+
+    def heartbeat(self):
+        """
+        Refresh this worker's heartbeat, rebuild the ring from live workers and renew held leases.
+        """
+        now = int(time.time())
+        self.store.heartbeat_worker(self.worker_id, now, now - FORGET_WORKER_AFTER)
+        workers = self.store.get_live_workers(now - WORKER_TTL)
+        ring = HashRing(workers)
+        if ring.worker_ids != self.ring.worker_ids:
+            print(f"Shard ring changed: {len(ring.worker_ids)} live worker(s).")
+        with self.lock:
+            self.ring = ring
+            held = list(self.held)
+            polling = set(self.polling)
+        for page_id in held:
+            if self.owns(page_id) or page_id in polling:
+                self._lease(page_id, now)  # a moved page stays leased until its poll in flight ends
+            else:
+                self.release(page_id)
+
+    def owns(self, page_id):
+        return self.ring.owner(page_id) == self.worker_id
+
+    def claim(self, page_id):
+        """
+        Return True if this worker should poll the page now, taking or renewing its lease.
+        """
+        if not self.owns(page_id):
+            if page_id in self.held:
+                self.release(page_id)
+            return False
+        acquired = self._lease(page_id, int(time.time()))
+        if acquired:
+            with self.lock:
+                self.polling.add(page_id)
+        return acquired
+
+    def finished(self, page_id):
+        """
+        Mark the poll of a claimed page as done; its lease is given up if the page has moved.
+        """
+        with self.lock:
+            self.polling.discard(page_id)
+        if page_id in self.held and not self.owns(page_id):
+            self.release(page_id)
+
+    def _lease(self, page_id, now):
+        acquired = self.store.acquire_lease(page_id, self.worker_id, now, now + LEASE_TTL)
+        with self.lock:
+            if acquired:
+                self.held.add(page_id)
+            else:
+                self.held.discard(page_id)
+        return acquired
+
+    def release(self, page_id):
+        self.store.release_lease(page_id, self.worker_id)
+        with self.lock:
+            self.held.discard(page_id)
@@ -0,0 +1,222 @@
+"""
+Webhook receiver for Facebook Page `feed` change events.
+
+Instead of polling /feed for every brand, Meta pushes new comments to this
+endpoint. Each signed event is ingested through the same comment_store path as
+polling and then handed to process_comment, so a comment is answered exactly
+once whichever route delivers it first. Polling still runs periodically as a
+reconciliation pass to pick up anything a webhook delivery missed.
+
+Run from the repository root:
+    python -m auto_responder.webhook --port 8080 --reconcile-interval 900
+
+Use tools/send_test_webhook.py to post a signed fake event to a local receiver.
+"""
+
+import os
+import hmac
+import json
+import hashlib
+import argparse
+import datetime
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+from auto_responder import responder
+from auto_responder.config_registry import get_registry
+
+APP_SECRET = os.getenv("APP_SECRET")
+VERIFY_TOKEN = os.getenv("WEBHOOK_VERIFY_TOKEN")
+DEFAULT_PORT = int(os.getenv("WEBHOOK_PORT", "8080"))
+DEFAULT_RECONCILE_INTERVAL = 15 * 60  # seconds between fallback polling passes
+
+
+def verify_signature(body, signature_header, app_secret=None):
+    """
+    Check the X-Hub-Signature-256 header against an HMAC-SHA256 of the raw body.
+
+    Parameters:
+        body (bytes): Raw request body.
+        signature_header (str): Header value, e.g. "sha256=<hex digest>".
+        app_secret (str): Meta App Secret; defaults to APP_SECRET.
+
+    Returns:
+        bool: True if the signature is present and valid.
+    """
+    app_secret = app_secret or APP_SECRET
+    if not app_secret or not signature_header or not signature_header.startswith("sha256="):
+        return False
+    expected = hmac.new(app_secret.encode(), body, hashlib.sha256).hexdigest()
+    return hmac.compare_digest(expected, signature_header[len("sha256="):])
+
+
+def extract_comment_events(payload):
+    """
+    Pull newly added comments out of a Page webhook payload.
+
+    Parameters:
+        payload (dict): Parsed webhook body.
+
+    Returns:
+        list: (page_id, post_id, comment) tuples, where comment has the same shape as a Graph API comment.
+    """
+    events = []
+    if payload.get("object") != "page":
+        return events
+    for entry in payload.get("entry", []):
+        page_id = str(entry.get("id"))
+        for change in entry.get("changes", []):
+            value = change.get("value", {})
+            if change.get("field") != "feed" or value.get("item") != "comment" or value.get("verb") != "add":
+                continue
+            created_time = value.get("created_time")
+            if isinstance(created_time, (int, float)):
+                created_time = datetime.datetime.fromtimestamp(created_time, datetime.timezone.utc).strftime("%Y-%m-%dT%H:%M:%S+0000")
+            events.append((page_id, value.get("post_id"), {
+                "id": value.get("comment_id"),
+                "message": value.get("message", ""),
+                "from": value.get("from", {}),
+                "created_time": created_time or datetime.datetime.now(datetime.timezone.utc).strftime("%Y-%m-%dT%H:%M:%S+0000"),
+            }))
+    return events
+
+
+class WebhookReceiver:
+    """
+    Dispatches verified webhook events onto a worker pool running the normal reply path.
+    """
+
+    def __init__(self, dry_run=False, verbose=False, max_workers=responder.MAX_WORKERS):
+        self.dry_run = dry_run
+        self.verbose = verbose
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="webhook")
+
+    def dispatch(self, payload):
+        """
+        Queue every comment event in the payload and return how many were queued.
+        """
+        registry = get_registry()
+        queued = 0
+        for page_id, post_id, comment in extract_comment_events(payload):
+            client_config = registry.get_by_page_id(page_id)
+            if client_config is None:
+                print(f"⚠️ Webhook event for unknown Page ID {page_id}; ignoring.")
+                continue
+            self.executor.submit(self.handle_comment, client_config, page_id, post_id, comment)
+            queued += 1
+        return queued
+
+    def handle_comment(self, client_config, page_id, post_id, comment):
+        brand_name = client_config.brand_name
+        try:
+            reason = responder.skip_reason(client_config)
+            if reason:
+                # Leave the comment un-ingested so the reconciliation pass can pick it up later.
+                if self.verbose:
+                    print(f"[{brand_name}] Webhook comment {comment['id']} deferred — {reason}.")
+                return
+            new_comment = responder.ingest_comment(comment, post_id, page_id, brand_name)
+            if new_comment is None:
+                return
+            responder.process_comment(new_comment, client_config, self.dry_run, client_config.page_access_token)
+        except Exception as e:
+            print(f"[{brand_name}] ❌ Error handling webhook comment {comment.get('id')}: {e}")
+
+    def shutdown(self):
+        self.executor.shutdown(wait=True)
+
+
+def make_handler(receiver, verify_token=None, app_secret=None):
+    verify_token = verify_token or VERIFY_TOKEN
+
+    class WebhookHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            # Subscription handshake: echo hub.challenge if the verify token matches.
+            query = parse_qs(urlparse(self.path).query)
+            mode = query.get("hub.mode", [None])[0]
+            token = query.get("hub.verify_token", [None])[0]
+            challenge = query.get("hub.challenge", [""])[0]
+            if mode == "subscribe" and verify_token and hmac.compare_digest(token or "", verify_token):
+                self._respond(200, challenge)
+            else:
+                self._respond(403, "Verification failed")
+
+        def do_POST(self):
+            body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            if not verify_signature(body, self.headers.get("X-Hub-Signature-256"), app_secret):
+                self._respond(401, "Invalid signature")
+                return
+            try:
+                payload = json.loads(body)
+            except ValueError:
+                self._respond(400, "Invalid JSON")
+                return
+            # Acknowledge right away; Meta retries deliveries that take too long.
+            queued = receiver.dispatch(payload)
+            self._respond(200, f"queued {queued}")
+
+        def _respond(self, status, text):
+            data = text.encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "text/plain")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, format, *args):
+            if receiver.verbose:
+                super().log_message(format, *args)
+
+    return WebhookHandler
+
+
+def run_reconciliation(stop_event, interval, dry_run, verbose):
+    """
+    Run a polling pass every `interval` seconds until stop_event is set.
+    """
+    while not stop_event.wait(interval):
+        try:
+            responder.main(dry_run=dry_run, verbose=verbose)
+        except Exception as e:
+            print(f"❌ Reconciliation pass failed: {e}")
+
+
+def serve(port=DEFAULT_PORT, dry_run=False, verbose=False, reconcile_interval=DEFAULT_RECONCILE_INTERVAL):
+    """
+    Start the webhook receiver and the fallback reconciliation loop, blocking until interrupted.
+
+    Parameters:
+        port (int): Port to listen on.
+        dry_run (bool): If True, preview replies without posting them.
+        verbose (bool): If True, print detailed information about the process.
+        reconcile_interval (int): Seconds between polling passes; 0 disables them.
+    """
+    responder.init_comment_db()
+    receiver = WebhookReceiver(dry_run=dry_run, verbose=verbose)
+    server = ThreadingHTTPServer(("", port), make_handler(receiver))
+    stop_event = threading.Event()
+    if reconcile_interval > 0:
+        threading.Thread(
+            target=run_reconciliation, args=(stop_event, reconcile_interval, dry_run, verbose), daemon=True
+        ).start()
+    print(f"Listening for webhook events on port {port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        stop_event.set()
+        server.server_close()
+        receiver.shutdown()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Receive Page feed webhooks and respond using OpenAI.")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help="Port to listen on.")
+    parser.add_argument("--dry-run", action="store_true", help="Preview replies without posting them.")
+    parser.add_argument("--verbose", action="store_true", help="Print each request and deferred event.")
+    parser.add_argument("--reconcile-interval", type=int, default=DEFAULT_RECONCILE_INTERVAL,
+                        help="Seconds between fallback polling passes (0 disables polling).")
+    args = parser.parse_args()
+    serve(port=args.port, dry_run=args.dry_run, verbose=args.verbose, reconcile_interval=args.reconcile_interval)
@@ -0,0 +1,336 @@
+"""
+Durable staged work queue: fetch -> triage -> generate -> post.
+
+Every comment in comments.db carries the stage it is waiting for (comments.stage):
+
+    triage    ingested, not yet decided
+    generate  should be answered, reply not written yet
+    post      reply written (or reused), not yet posted
+    done / skipped / failed
+
+Each stage runs on its own thread pool with its own batch size and retry policy
+(STAGE_SETTINGS). A stage only moves a comment forward after its work succeeded, so
+after a crash or restart processing resumes from the last completed stage and
+expensive steps that already succeeded are not repeated. Failures are retried with
+exponential backoff; comments that use up max_attempts end in 'failed' for a human to
+look at.
+
+Posting is idempotent: the attempt is recorded before the reply is sent, and a comment
+that was already attempted is checked on the Graph API for an existing page reply
+before posting again.
+
+The queue is an alternative runner to responder.main, the daemon and the webhook server
+(it is not wired into them); point only one of them at a given comments.db.
+
+Run from the repository root:
+    python -m auto_responder.work_queue            # run continuously
+    python -m auto_responder.work_queue --once     # fetch once and drain the queue (for cron)
+    python -m auto_responder.work_queue --status   # print queue depth per stage
+"""
+
+import os
+import time
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from auto_responder import responder, metrics
+from auto_responder.comment_store import get_store, init_comment_db, claim_comments, release_comments, QUEUED_STAGES
+from auto_responder.config_registry import get_registry
+from auto_responder.event_log import log_event
+from auto_responder.graph_client import graph_get
+from auto_responder.reply_index import find_similar_reply, remember_reply
+
+STAGE_SETTINGS = {
+    # workers: threads for the stage; batch_size: comments per task (grouped by page);
+    # max_attempts / retry_delay: retries with exponential backoff starting at retry_delay seconds.
+    "triage": {"workers": 4, "batch_size": responder.TRIAGE_BATCH_SIZE, "max_attempts": 3, "retry_delay": 60},
+    "generate": {"workers": 4, "batch_size": 10, "max_attempts": 3, "retry_delay": 60},
+    "post": {"workers": 2, "batch_size": 50, "max_attempts": 5, "retry_delay": 120},
+}
+FETCH_INTERVAL = int(os.getenv("QUEUE_FETCH_INTERVAL", "60"))  # seconds between fetch passes
+IDLE_WAIT = 5  # seconds a stage sleeps when it finds nothing to do
+DEFER_DELAY = 300  # seconds before rechecking comments of a brand that is closed or disabled
+
+
+def retry_at(settings, attempts, now):
+    return now + settings["retry_delay"] * (2 ** max(attempts - 1, 0))
+
+
+class WorkQueue:
+    """
+    Stage handlers and the per-stage pools that run them.
+    """
+
+    def __init__(self, dry_run=False, verbose=False, store=None):
+        self.dry_run = dry_run
+        self.verbose = verbose
+        self.store = store or get_store()
+        self.pools = {
+            stage: ThreadPoolExecutor(max_workers=settings["workers"], thread_name_prefix=stage)
+            for stage, settings in STAGE_SETTINGS.items()
+        }
+        self.fetch_pool = ThreadPoolExecutor(max_workers=responder.MAX_WORKERS, thread_name_prefix="fetch")
+        self.handlers = {"triage": self.triage, "generate": self.generate, "post": self.post}
+        self.stop_event = threading.Event()
+
+    def fetch(self):
+        """
+        Ingest new comments for every brand that is open; they enter the queue at 'triage'.
+        """
+        configs = [config for config in get_registry().configs() if responder.skip_reason(config) is None]
+
+        def fetch_client(client_config):
+            try:
+                return len(responder.fetch_comments(
+                    client_config.facebook_page_id, client_config.page_access_token, client_config.brand_name, self.verbose
+                ))
+            except Exception as e:
+                print(f"[{client_config.brand_name}] ❌ Fetch failed: {e}")
+                return 0
+
+        return sum(self.fetch_pool.map(fetch_client, configs))
+
+    def run_stage_once(self, stage):
+        """
+        Take one round of due comments for a stage and process them on the stage's pool.
+
+        Returns:
+            int: Number of comments taken.
+        """
+        settings = STAGE_SETTINGS[stage]
+        now = int(time.time())
+        rows = self.store.get_stage_batch(stage, now, limit=settings["batch_size"] * settings["workers"])
+        if not rows:
+            return 0
+
+        by_page = {}
+        for row in rows:
+            by_page.setdefault(row["page_id"], []).append(row)
+        tasks = []
+        registry = get_registry()
+        for page_id, page_rows in by_page.items():
+            client_config = registry.get_by_page_id(page_id)
+            if client_config is None or responder.skip_reason(client_config):
+                self.store.defer_comments([row["id"] for row in page_rows], now + DEFER_DELAY)
+                continue
+            for i in range(0, len(page_rows), settings["batch_size"]):
+                tasks.append((client_config, page_rows[i:i + settings["batch_size"]]))
+
+        def run_task(task):
+            client_config, batch = task
+            try:
+                self.handlers[stage](client_config, batch)
+            except Exception as e:
+                # Anything the handler didn't sort out itself fails the whole batch.
+                print(f"[{client_config.brand_name}] ❌ {stage} failed for {len(batch)} comment(s): {e}")
+                self.fail(stage, batch, e)
+
+        list(self.pools[stage].map(run_task, tasks))
+        return len(rows)
+
+    def fail(self, stage, rows, error, count_attempt=True):
+        settings = STAGE_SETTINGS[stage]
+        now = int(time.time())
+        self.store.record_stage_failures(
+            [(str(error)[:500], retry_at(settings, row["attempts"] + 1, now), row["id"]) for row in rows],
+            settings["max_attempts"], count_attempt
+        )
+
+    def triage(self, client_config, rows):
+        decisions = {}
+        if client_config.triage_mode == "batch":
+            decisions = responder.triage_comments_batch(rows, client_config)
+
+        to_generate, to_post, skipped, failed = [], [], [], []
+        for row in rows:
+            comment_text = row["message"]
+            try:
+                reused = find_similar_reply(comment_text, client_config) if client_config.filters.passes(comment_text) else None
+                if reused is not None:
+                    to_post.append((reused[0], row["id"]))
+                    continue
+                if client_config.triage_mode == "batch" and row["id"] in decisions:
+                    respond = decisions[row["id"]]
+                elif client_config.triage_mode == "combined":
+                    respond, reply = responder.classify_and_generate(comment_text, client_config)
+                    if respond and reply and reply.strip():
+                        to_post.append((reply, row["id"]))
+                        continue
+                else:
+                    respond = responder.should_respond(comment_text, client_config)  # raises on OpenAI errors
+            except Exception as e:
+                failed.append((row, e))
+                continue
+            (to_generate if respond else skipped).append(row["id"])
+
+        if self.dry_run:
+            # Nothing is recorded: a skip would be final and a draft would be posted by a later real run.
+            for comment_id in skipped:
+                print(f"[DRY RUN] Would skip comment ID {comment_id}")
+            for reply, comment_id in to_post:
+                print(f"[DRY RUN] Reply for comment ID {comment_id}: {reply}")
+            for row, error in failed:
+                print(f"[DRY RUN] Triage failed for comment ID {row['id']}: {error}")
+            generate = set(to_generate)
+            self.generate(client_config, [row for row in rows if row["id"] in generate])
+            self.store.defer_comments([row["id"] for row in rows if row["id"] not in generate], int(time.time()) + DEFER_DELAY)
+            return
+
+        with self.store.transaction():
+            self.store.queue_for_generation(to_generate)
+            self.store.save_draft_replies(to_post)
+            self.store.mark_comments_as_skipped(skipped)
+        metrics.count(client_config.brand_name, "skipped", len(skipped))
+        for row, error in failed:
+            self.fail("triage", [row], error)
+
+    def generate(self, client_config, rows):
+        drafts = []
+        for row in rows:
+            try:
+                reply = responder.generate_comment_reply(row["message"], client_config)
+                if not reply.strip():
+                    raise ValueError("empty reply")
+            except Exception as e:
+                if self.dry_run:
+                    print(f"[DRY RUN] Generation failed for comment ID {row['id']}: {e}")
+                else:
+                    self.fail("generate", [row], e)
+                continue
+            drafts.append((reply, row["id"]))
+        if self.dry_run:
+            for reply, comment_id in drafts:
+                print(f"[DRY RUN] Reply for comment ID {comment_id}: {reply}")
+            self.store.defer_comments([row["id"] for row in rows], int(time.time()) + DEFER_DELAY)
+            return
+        self.store.save_draft_replies(drafts)
+
+    def post(self, client_config, rows):
+        brand_name = client_config.brand_name
+        if self.dry_run:
+            for row in rows:
+                print(f"[DRY RUN] Reply for comment ID {row['id']}: {row['reply_text']}")
+            self.store.defer_comments([row["id"] for row in rows], int(time.time()) + DEFER_DELAY)
+            return
+
+        claimed = claim_comments(rows)
+        responded = []
+        try:
+            # A comment attempted before may have been answered just before a crash; check first.
+            already, to_post, failed = [], [], []  # failed: (row, error, attempt already counted)
+            for row in claimed:
+                if not row["attempts"]:
+                    to_post.append(row)
+                    continue
+                try:
+                    (already if self.has_page_reply(row["id"], client_config) else to_post).append(row)
+                except Exception as e:
+                    failed.append((row, e, False))
+            self.store.count_attempts([row["id"] for row in to_post])
+            results = responder.post_comment_replies(
+                [(row["id"], row["reply_text"]) for row in to_post], client_config.page_access_token
+            ) if to_post else []
+
+            for row, result in zip(to_post, results):
+                if result["ok"]:
+                    responded.append(row)
+                    log_event("reply", brand=brand_name, comment_id=row["id"], message=row["message"], reply=row["reply_text"])
+                else:
+                    print(f"[{brand_name}] ❌ Failed to reply to comment {row['id']}: {result['error']}")
+                    failed.append((row, result["error"], True))
+            responded.extend(already)
+            self.store.mark_comments_as_responded(
+                [row["id"] for row in responded], {row["id"]: row["reply_text"] for row in responded}
+            )
+            for row in responded:
+                remember_reply(row["id"], row["message"], row["reply_text"], client_config)
+            metrics.count(brand_name, "replied", len(responded))
+            metrics.count(brand_name, "failed", len(failed))
+            for row, error, counted in failed:
+                self.fail("post", [row], error, count_attempt=not counted)
+            if responded:
+                print(f"[{brand_name}] Posted {len(responded)} queued repl{'y' if len(responded) == 1 else 'ies'}.")
+        finally:
+            answered = {row["id"] for row in responded}
+            release_comments(answered, handled=True)
+            release_comments([row["id"] for row in claimed if row["id"] not in answered])
+
+    def has_page_reply(self, comment_id, client_config):
+        """
+        True if the page has already replied to the comment.
+        """
+        resp = graph_get(f"{comment_id}/comments", client_config.page_access_token, params={"fields": "from", "limit": 100})
+        resp.raise_for_status()
+        return any(c.get("from", {}).get("id") == client_config.facebook_page_id for c in resp.json().get("data", []))
+
+    def print_status(self):
+        counts = self.store.stage_counts()
+        print("Queue depth: " + ", ".join(f"{stage}={counts.get(stage, 0)}" for stage in QUEUED_STAGES)
+              + f" (failed={counts.get('failed', 0)}, done={counts.get('done', 0)}, skipped={counts.get('skipped', 0)})")
+
+    def drain(self):
+        """
+        Run every stage until none of them has due work left.
+        """
+        while not self.stop_event.is_set():
+            if not sum(self.run_stage_once(stage) for stage in QUEUED_STAGES):
+                return
+
+    def run_forever(self):
+        """
+        Fetch on a timer and run each stage in its own loop until interrupted.
+        """
+        threads = [threading.Thread(target=self._stage_loop, args=(stage,), name=f"{stage}-loop", daemon=True)
+                   for stage in QUEUED_STAGES]
+        for thread in threads:
+            thread.start()
+        try:
+            while not self.stop_event.is_set():
+                self.fetch()
+                if self.verbose:
+                    self.print_status()
+                self.stop_event.wait(FETCH_INTERVAL)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.stop_event.set()
+            for thread in threads:
+                thread.join()
+            self.shutdown()
+
+    def _stage_loop(self, stage):
+        while not self.stop_event.is_set():
+            try:
+                taken = self.run_stage_once(stage)
+            except Exception as e:
+                print(f"❌ {stage} stage error: {e}")
+                taken = 0
+            if not taken:
+                self.stop_event.wait(IDLE_WAIT)
+
+    def shutdown(self):
+        for pool in self.pools.values():
+            pool.shutdown(wait=True)
+        self.fetch_pool.shutdown(wait=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Respond to comments through the staged work queue.")
+    parser.add_argument("--once", action="store_true", help="Fetch once, drain the queue and exit.")
+    parser.add_argument("--status", action="store_true", help="Print queue depth per stage and exit.")
+    parser.add_argument("--dry-run", action="store_true", help="Preview replies instead of posting them.")
+    parser.add_argument("--verbose", action="store_true", help="Print fetch details and queue depth.")
+    args = parser.parse_args()
+
+    init_comment_db()
+    queue = WorkQueue(dry_run=args.dry_run, verbose=args.verbose)
+    if args.status:
+        queue.print_status()
+    elif args.once:
+        queue.fetch()
+        queue.drain()
+        queue.print_status()
+        queue.shutdown()
+        print(f"📈 Metrics written to {metrics.dump_json()}")
+    else:
+        queue.run_forever()
@@ -0,0 +1,224 @@
+"""
+Local stand-in for the parts of the Facebook Graph API the responder uses.
+
+Serves synthetic tenants (brands × posts × comments) generated from a seed:
+- GET  /{page_id}/feed          posts with their newest comments embedded
+- GET  /{post_id}/comments      older comments, newest first, cursor-paginated
+- GET  /{comment_id}/comments   the page's replies to a comment
+- POST /{comment_id}/comments   post a reply
+- POST /                        batch calls (batch=[...])
+- GET  /_bench/stats            when each comment was first served and answered
+
+A leading version segment (/v22.0) is ignored. Latency, 500s and rate limits are injected
+per HTTP request with a FaultProfile; rate limits are answered the way Meta does it, with
+a Graph error code 32 ("Page request limit reached") and a usage header.
+
+Run it on its own with:
+    python -m benchmarks.fake_graph --port 8701 --brands 10 --posts 5 --comments 40
+"""
+
+import re
+import json
+import time
+import random
+import argparse
+import threading
+from datetime import datetime, timezone
+from urllib.parse import urlparse, parse_qsl
+from http.server import ThreadingHTTPServer
+from benchmarks.faults import FaultProfile, JSONHandler
+
+PAGE_ID_BASE = 900000000000
+EMBEDDED_COMMENTS = 25  # default size of the comment page embedded in a feed post
+WORDS = (
+    "do you ship to canada", "what sizes do you have", "love this", "is this vegan", "how much is the bundle",
+    "when will it be back in stock", "my order never arrived", "great service", "does it come in blue",
+    "can I return it", "is there a discount code", "looks amazing", "what are the ingredients",
+    "how long does delivery take", "where is your store", "best purchase this year", "not impressed",
+)
+VERSION_PREFIX = re.compile(r"^/v\d+(\.\d+)?")
+
+
+def page_id(index):
+    """
+    Page ID of the index-th synthetic brand (shared with the benchmark runner).
+    """
+    return str(PAGE_ID_BASE + index)
+
+
+def iso(ts):
+    return datetime.fromtimestamp(ts, timezone.utc).strftime("%Y-%m-%dT%H:%M:%S+0000")
+
+
+class Tenants:
+    """
+    Synthetic pages, posts and comments, plus the bookkeeping the benchmark reports on.
+
+    Args:
+        brands (int): Number of pages.
+        posts (int): Posts per page.
+        comments (int): Comments per post.
+        seed (int): Random seed for the comment texts and timestamps.
+        max_age (int): Comments are spread over the last `max_age` seconds.
+    """
+
+    def __init__(self, brands, posts, comments, seed=0, max_age=200):
+        rng = random.Random(seed)
+        now = time.time()
+        self.posts = {}  # post_id -> {"page_id", "created_ts", "comments": [newest first]}
+        self.by_page = {}
+        for b in range(brands):
+            page = page_id(b)
+            self.by_page[page] = []
+            for p in range(posts):
+                post_id = f"{page}_{p}"
+                post_comments = []
+                for c in range(comments):
+                    # Unique texts, so the decision cache and reply reuse don't short-circuit the run.
+                    text = f"{rng.choice(WORDS)}? #{b}-{p}-{c}" if rng.random() < 0.7 else f"{rng.choice(WORDS)} {rng.randint(1, 10 ** 6)}"
+                    post_comments.append({
+                        "id": f"{post_id}_{c}",
+                        "message": text,
+                        "from": {"id": str(10 ** 9 + rng.randint(0, 10 ** 8)), "name": "Bench User"},
+                        "created_time": iso(now - rng.uniform(5, max_age)),
+                    })
+                post_comments.sort(key=lambda comment: comment["created_time"], reverse=True)
+                self.posts[post_id] = {"page_id": page, "created_ts": now - 3600, "comments": post_comments}
+                self.by_page[page].append(post_id)
+        self.lock = threading.Lock()
+        self.served = {}  # comment_id -> first time it was returned
+        self.replies = {}  # comment_id -> (time, reply text)
+
+    def mark_served(self, comments):
+        now = time.time()
+        with self.lock:
+            for comment in comments:
+                self.served.setdefault(comment["id"], now)
+
+    def comment_page(self, post_id, after, limit, base_url):
+        comments = self.posts[post_id]["comments"]
+        start = int(after or 0)
+        chunk = comments[start:start + limit]
+        self.mark_served(chunk)
+        listing = {"data": chunk}
+        if start + limit < len(comments):
+            listing["paging"] = {
+                "cursors": {"after": str(start + limit)},
+                "next": f"{base_url}/{post_id}/comments?limit={limit}&after={start + limit}",
+            }
+        return listing
+
+    def handle(self, method, path, params, base_url):
+        """
+        Answer one (sub-)request.
+
+        Returns:
+            tuple: (status, JSON payload)
+        """
+        parts = path.strip("/").split("/")
+        if len(parts) == 2 and parts[1] == "feed" and method == "GET" and parts[0] in self.by_page:
+            since = float(params.get("since") or 0)
+            embedded = re.search(r"comments[^{]*\.limit\((\d+)\)", params.get("fields", ""))
+            limit = int(embedded.group(1)) if embedded else EMBEDDED_COMMENTS
+            posts = [
+                {"id": post_id, "created_time": iso(self.posts[post_id]["created_ts"]),
+                 "comments": self.comment_page(post_id, None, limit, base_url)}
+                for post_id in self.by_page[parts[0]] if self.posts[post_id]["created_ts"] >= since
+            ]
+            return 200, {"data": posts}
+        if len(parts) == 2 and parts[1] == "comments":
+            target = parts[0]
+            if method == "GET" and target in self.posts:
+                return 200, self.comment_page(target, params.get("after"), int(params.get("limit", EMBEDDED_COMMENTS)), base_url)
+            post_id = target.rsplit("_", 1)[0]
+            if post_id in self.posts:
+                if method == "POST":
+                    with self.lock:
+                        self.replies.setdefault(target, (time.time(), params.get("message")))
+                    return 200, {"id": f"{target}_reply"}
+                page = self.posts[post_id]["page_id"]
+                answered = [{"id": f"{target}_reply", "from": {"id": page}}] if target in self.replies else []
+                return 200, {"data": answered}
+        return 404, {"error": {"message": f"Unknown path {path}", "type": "GraphMethodException", "code": 100}}
+
+    def stats(self):
+        with self.lock:
+            return {
+                "comments": sum(len(post["comments"]) for post in self.posts.values()),
+                "served": dict(self.served),
+                "replies": {comment_id: ts for comment_id, (ts, _) in self.replies.items()},
+            }
+
+
+def make_handler(tenants, faults):
+    class GraphHandler(JSONHandler):
+        def do_GET(self):
+            url = urlparse(self.path)
+            if url.path == "/_bench/stats":
+                self.send_json(200, dict(tenants.stats(), injected=dict(faults.injected)))
+                return
+            self.dispatch("GET", url.path, dict(parse_qsl(url.query)))
+
+        def do_POST(self):
+            url = urlparse(self.path)
+            params = dict(parse_qsl(url.query))
+            params.update(parse_qsl(self.read_body().decode()))
+            self.dispatch("POST", url.path, params)
+
+        def dispatch(self, method, path, params):
+            outcome = faults.apply()
+            if outcome == "error":
+                self.send_json(500, {"error": {"message": "An unexpected error has occurred.", "code": 2, "is_transient": True}})
+                return
+            if outcome == "rate_limited":
+                headers = {"X-Page-Usage": json.dumps({"call_count": 100, "total_time": 40, "total_cputime": 40})}
+                if faults.retry_after:
+                    headers["Retry-After"] = str(faults.retry_after)
+                self.send_json(403, {"error": {"message": "Page request limit reached", "code": 32}}, headers)
+                return
+            path = VERSION_PREFIX.sub("", path)
+            base_url = f"http://{self.headers.get('Host')}"
+            if method == "POST" and path.strip("/") == "" and "batch" in params:
+                self.send_json(200, [self.sub_request(sub, base_url) for sub in json.loads(params["batch"])])
+                return
+            self.send_json(*tenants.handle(method, path, params, base_url))
+
+        def sub_request(self, sub, base_url):
+            url = urlparse(sub["relative_url"])
+            params = dict(parse_qsl(url.query))
+            params.update(parse_qsl(sub.get("body", "")))
+            status, payload = tenants.handle(sub["method"], "/" + VERSION_PREFIX.sub("", url.path).lstrip("/"), params, base_url)
+            return {"code": status, "body": json.dumps(payload)}
+
+    return GraphHandler
+
+
+def serve(port, tenants, faults):
+    """
+    Start the fake Graph API in a background thread.
+
+    Returns:
+        ThreadingHTTPServer: The running server.
+    """
+    server = ThreadingHTTPServer(("127.0.0.1", port), make_handler(tenants, faults))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="fake-graph", daemon=True).start()
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve a fake Graph API with synthetic tenants.")
+    parser.add_argument("--port", type=int, default=8701)
+    parser.add_argument("--brands", type=int, default=10)
+    parser.add_argument("--posts", type=int, default=5)
+    parser.add_argument("--comments", type=int, default=40, help="Comments per post.")
+    parser.add_argument("--seed", type=int, default=0)
+    FaultProfile.add_arguments(parser)
+    args = parser.parse_args()
+
+    server = serve(args.port, Tenants(args.brands, args.posts, args.comments, args.seed), FaultProfile.from_args(args, seed=args.seed))
+    print(f"Fake Graph API on http://127.0.0.1:{server.server_port}", flush=True)
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
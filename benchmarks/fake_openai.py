@@ -0,0 +1,127 @@
+"""
+Local stand-in for the OpenAI chat completions endpoint.
+
+POST /v1/chat/completions answers every prompt shape the responder sends:
+- "yes or no" triage questions with yes/no,
+- combined triage (JSON object with respond/reason/reply),
+- batch triage (JSON object with one decision per comment id),
+- anything else with a short reply.
+A `respond_rate` fraction of comments is answered; usage is estimated at ~4 characters
+per token. Latency, 500s and 429s come from a FaultProfile.
+
+Run it on its own with:
+    python -m benchmarks.fake_openai --port 8702 --latency-ms 400 --rate-limit-rate 0.02
+"""
+
+import json
+import time
+import uuid
+import random
+import argparse
+import threading
+from http.server import ThreadingHTTPServer
+from benchmarks.faults import FaultProfile, JSONHandler
+
+REPLY_TEXT = "Thanks for reaching out! Our team is happy to help - send us a message with your order details."
+
+
+def estimate_tokens(text):
+    return max(1, len(text) // 4)
+
+
+class ChatModel:
+    """
+    Deterministic fake model: decides and replies according to respond_rate.
+    """
+
+    def __init__(self, respond_rate=0.8, seed=0):
+        self.respond_rate = respond_rate
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.requests = 0
+
+    def decide(self):
+        with self.lock:
+            return self.random.random() < self.respond_rate
+
+    def complete(self, body):
+        with self.lock:
+            self.requests += 1
+        messages = body.get("messages", [])
+        prompt = messages[-1]["content"] if messages else ""
+        if '"decisions"' in prompt:
+            items = json.loads(prompt[prompt.rindex("\n\n") + 2:])
+            content = json.dumps({"decisions": [{"id": item["id"], "respond": self.decide()} for item in items]})
+        elif body.get("response_format", {}).get("type") == "json_object":
+            respond = self.decide()
+            content = json.dumps({"respond": respond, "reason": "benchmark", "reply": REPLY_TEXT if respond else ""})
+        elif "yes or no" in prompt.lower():
+            content = "yes" if self.decide() else "no"
+        else:
+            content = REPLY_TEXT
+        prompt_tokens = sum(estimate_tokens(message.get("content") or "") for message in messages)
+        completion_tokens = estimate_tokens(content)
+        return {
+            "id": f"chatcmpl-{uuid.uuid4().hex[:12]}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", "gpt-3.5-turbo"),
+            "choices": [{"index": 0, "finish_reason": "stop", "message": {"role": "assistant", "content": content}}],
+            "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                      "total_tokens": prompt_tokens + completion_tokens},
+        }
+
+
+def make_handler(model, faults):
+    class OpenAIHandler(JSONHandler):
+        def do_GET(self):
+            if self.path == "/_bench/stats":
+                self.send_json(200, {"requests": model.requests, "injected": dict(faults.injected)})
+            else:
+                self.send_json(404, {"error": {"message": "Not found", "type": "invalid_request_error"}})
+
+        def do_POST(self):
+            body = json.loads(self.read_body() or b"{}")
+            if not self.path.rstrip("/").endswith("/chat/completions"):
+                self.send_json(404, {"error": {"message": "Not found", "type": "invalid_request_error"}})
+                return
+            outcome = faults.apply()
+            if outcome == "error":
+                self.send_json(500, {"error": {"message": "The server had an error.", "type": "server_error"}})
+            elif outcome == "rate_limited":
+                headers = {"retry-after": str(faults.retry_after)} if faults.retry_after else {}
+                self.send_json(429, {"error": {"message": "Rate limit reached.", "type": "requests",
+                                               "code": "rate_limit_exceeded"}}, headers)
+            else:
+                self.send_json(200, model.complete(body))
+
+    return OpenAIHandler
+
+
+def serve(port, model, faults):
+    """
+    Start the fake OpenAI API in a background thread.
+
+    Returns:
+        ThreadingHTTPServer: The running server.
+    """
+    server = ThreadingHTTPServer(("127.0.0.1", port), make_handler(model, faults))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="fake-openai", daemon=True).start()
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve a fake OpenAI chat completions API.")
+    parser.add_argument("--port", type=int, default=8702)
+    parser.add_argument("--respond-rate", type=float, default=0.8, help="Fraction of comments the model answers.")
+    parser.add_argument("--seed", type=int, default=0)
+    FaultProfile.add_arguments(parser)
+    args = parser.parse_args()
+
+    server = serve(args.port, ChatModel(args.respond_rate, args.seed), FaultProfile.from_args(args, seed=args.seed))
+    print(f"Fake OpenAI API on http://127.0.0.1:{server.server_port}/v1", flush=True)
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
@@ -0,0 +1,121 @@
+"""
+Latency and failure injection shared by the fake Graph API and OpenAI servers.
+"""
+
+import json
+import time
+import random
+import threading
+from http.server import BaseHTTPRequestHandler
+
+
+class FaultProfile:
+    """
+    How a fake server misbehaves: added latency, random 5xx errors and random 429s.
+
+    Args:
+        latency_ms (float): Mean added latency per request.
+        jitter_ms (float): Latency is drawn uniformly from latency_ms ± jitter_ms.
+        error_rate (float): Fraction of requests answered with a 500.
+        rate_limit_rate (float): Fraction of requests answered with a 429.
+        retry_after (float): Retry-After seconds sent with 429s (0 sends none).
+        seed (int): Random seed, so runs inject the same faults.
+    """
+
+    def __init__(self, latency_ms=0.0, jitter_ms=0.0, error_rate=0.0, rate_limit_rate=0.0, retry_after=0.0, seed=None):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.retry_after = retry_after
+        self.seed = seed
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.injected = {"requests": 0, "errors": 0, "rate_limited": 0}
+
+    @classmethod
+    def add_arguments(cls, parser, prefix=""):
+        """
+        Add --latency-ms, --jitter-ms, --error-rate, --rate-limit-rate, --retry-after and
+        --fault-seed (with an optional prefix).
+        """
+        parser.add_argument(f"--{prefix}latency-ms", type=float, default=0.0, help="Mean added latency per request.")
+        parser.add_argument(f"--{prefix}jitter-ms", type=float, default=0.0, help="Uniform jitter around the latency.")
+        parser.add_argument(f"--{prefix}error-rate", type=float, default=0.0, help="Fraction of requests failing with 500.")
+        parser.add_argument(f"--{prefix}rate-limit-rate", type=float, default=0.0, help="Fraction of requests answered with 429.")
+        parser.add_argument(f"--{prefix}retry-after", type=float, default=0.0, help="Retry-After seconds sent with 429s.")
+        parser.add_argument(f"--{prefix}fault-seed", type=int, default=None, help="Random seed for the injected faults.")
+
+    @classmethod
+    def from_args(cls, args, prefix="", seed=None):
+        """
+        Build a profile from parsed arguments; an explicit --fault-seed wins over `seed`.
+        """
+        prefix = prefix.replace("-", "_")
+        fault_seed = getattr(args, f"{prefix}fault_seed")
+        return cls(
+            latency_ms=getattr(args, f"{prefix}latency_ms"),
+            jitter_ms=getattr(args, f"{prefix}jitter_ms"),
+            error_rate=getattr(args, f"{prefix}error_rate"),
+            rate_limit_rate=getattr(args, f"{prefix}rate_limit_rate"),
+            retry_after=getattr(args, f"{prefix}retry_after"),
+            seed=seed if fault_seed is None else fault_seed,
+        )
+
+    def to_argv(self, prefix=""):
+        argv = [
+            f"--{prefix}latency-ms", str(self.latency_ms), f"--{prefix}jitter-ms", str(self.jitter_ms),
+            f"--{prefix}error-rate", str(self.error_rate), f"--{prefix}rate-limit-rate", str(self.rate_limit_rate),
+            f"--{prefix}retry-after", str(self.retry_after),
+        ]
+        if self.seed is not None:
+            argv += [f"--{prefix}fault-seed", str(self.seed)]
+        return argv
+
+    def apply(self):
+        """
+        Sleep for the request's latency and decide its fate.
+
+        Returns:
+            str or None: "error", "rate_limited", or None for a normal response.
+        """
+        with self.lock:
+            delay = max(0.0, self.latency_ms + self.random.uniform(-self.jitter_ms, self.jitter_ms)) / 1000
+            roll = self.random.random()
+            self.injected["requests"] += 1
+            outcome = None
+            if roll < self.error_rate:
+                outcome = "error"
+            elif roll < self.error_rate + self.rate_limit_rate:
+                outcome = "rate_limited"
+            if outcome == "error":
+                self.injected["errors"] += 1
+            elif outcome == "rate_limited":
+                self.injected["rate_limited"] += 1
+        if delay:
+            time.sleep(delay)
+        return outcome
+
+
+class JSONHandler(BaseHTTPRequestHandler):
+    """
+    Base request handler with keep-alive and JSON helpers.
+    """
+
+    protocol_version = "HTTP/1.1"  # keep-alive, like the real APIs
+
+    def read_body(self):
+        return self.rfile.read(int(self.headers.get("Content-Length", 0)))
+
+    def send_json(self, status, payload, headers=None):
+        data = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
@@ -0,0 +1,223 @@
+"""
+End-to-end throughput benchmark against local Graph API and OpenAI stand-ins.
+
+Starts benchmarks.fake_graph and benchmarks.fake_openai as subprocesses, writes one
+config per synthetic brand into a scratch directory, points the responder at the fakes
+(GRAPH_API_BASE_URL, OPENAI_BASE_URL) and runs one full cycle. It then reports:
+- comments/sec processed and replies/sec posted,
+- p50/p95/p99 per-comment latency, from the moment the fake Graph API first served a
+  comment to the moment its reply was posted,
+- per-stage latencies and total DB write time from auto_responder.metrics,
+- the faults the fakes injected.
+
+Run from the repository root, for example:
+    python -m benchmarks.run_benchmark --brands 20 --posts 5 --comments 40 \\
+        --graph-latency-ms 80 --openai-latency-ms 400 --openai-rate-limit-rate 0.02
+"""
+
+import os
+import sys
+import json
+import math
+import time
+import shutil
+import argparse
+import tempfile
+import contextlib
+import subprocess
+import urllib.request
+from benchmarks.faults import FaultProfile
+from benchmarks.fake_graph import page_id
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def percentile(values, q):
+    """
+    Nearest-rank percentile of a list of numbers (None if empty).
+    """
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered), max(1, math.ceil(q / 100 * len(ordered)))) - 1]
+
+
+def start_fake(module, args):
+    """
+    Start a fake server module on a free port and wait for its address.
+
+    Returns:
+        tuple: (subprocess.Popen, base URL)
+    """
+    process = subprocess.Popen(
+        [sys.executable, "-m", module, "--port", "0"] + args,
+        cwd=REPO_ROOT, stdout=subprocess.PIPE, text=True,
+    )
+    line = process.stdout.readline()
+    if not line:
+        process.kill()
+        raise RuntimeError(f"{module} did not start")
+    return process, line.strip().rsplit(" ", 1)[-1]
+
+
+def fetch_stats(base_url):
+    root = base_url.split("/v1")[0].split("/v22.0")[0]
+    with urllib.request.urlopen(f"{root}/_bench/stats") as resp:
+        return json.load(resp)
+
+
+def write_configs(config_dir, brands, triage_mode):
+    os.makedirs(config_dir, exist_ok=True)
+    for index in range(brands):
+        config = {
+            "brand_name": f"Bench Brand {index}",
+            "page_ids": {"facebook": page_id(index)},
+            "page_access_token": f"bench-token-{index}",
+            "auto_reply_enabled": True,
+            "timezone": "UTC",
+            "working_hours": {"start": 0, "end": 24},
+            "reply_style": "friendly",
+            "response_prompt": "You are a helpful social media assistant.",
+            "triage_mode": triage_mode,
+        }
+        with open(os.path.join(config_dir, f"bench_{index}_config.json"), "w") as f:
+            json.dump(config, f)
+
+
+def run_cycle(runner, max_workers, verbose):
+    """
+    Run one responder cycle in the current directory.
+
+    Returns:
+        float: Wall-clock seconds.
+    """
+    from auto_responder import responder
+    output = contextlib.nullcontext() if verbose else contextlib.redirect_stdout(open(os.devnull, "w"))
+    started = time.perf_counter()
+    with output:
+        if runner == "work_queue":
+            from auto_responder.work_queue import WorkQueue
+            responder.init_comment_db()
+            queue = WorkQueue()
+            queue.fetch()
+            queue.drain()
+            queue.shutdown()
+        else:
+            responder.main(max_workers=max_workers)
+    return time.perf_counter() - started
+
+
+def build_report(args, wall, graph_stats, openai_stats, snapshot):
+    served, replies = graph_stats["served"], graph_stats["replies"]
+    latencies = [replies[comment_id] - served[comment_id] for comment_id in replies if comment_id in served]
+    seen = sum(counts.get("seen", 0) for counts in snapshot["comments"].values())
+    db_write = snapshot["stages"].get("db_write", {})
+    return {
+        "tenants": {"brands": args.brands, "posts": args.posts, "comments_per_post": args.comments,
+                    "total_comments": graph_stats["comments"]},
+        "runner": args.runner,
+        "triage_mode": args.triage_mode,
+        "wall_seconds": round(wall, 3),
+        "comments_processed": seen,
+        "comments_per_second": round(seen / wall, 2) if wall else None,
+        "replies_posted": len(replies),
+        "replies_per_second": round(len(replies) / wall, 2) if wall else None,
+        "comment_latency_seconds": {
+            f"p{q}": round(percentile(latencies, q), 3) if latencies else None for q in (50, 95, 99)
+        },
+        "db_write": {"count": db_write.get("count", 0), "total_seconds": db_write.get("sum", 0.0),
+                     "p95_seconds": db_write.get("p95")},
+        "stages": {stage: {key: values[key] for key in ("count", "sum", "p50", "p95", "p99")}
+                   for stage, values in snapshot["stages"].items()},
+        "llm": snapshot["llm"],
+        "injected": {"graph": graph_stats["injected"], "openai": openai_stats["injected"]},
+    }
+
+
+def fmt(seconds):
+    return "-" if seconds is None else f"{seconds:.3f}s"
+
+
+def print_report(report):
+    latency = report["comment_latency_seconds"]
+    tenants = report["tenants"]
+    print(f"📊 {tenants['brands']} brands × {tenants['posts']} posts × {tenants['comments_per_post']} comments "
+          f"({report['runner']}, {report['triage_mode']}) in {report['wall_seconds']:.2f}s")
+    print(f"   {report['comments_per_second']} comments/sec, {report['replies_per_second']} replies/sec "
+          f"({report['replies_posted']} replies)")
+    print(f"   Per-comment latency: p50 {fmt(latency['p50'])}, p95 {fmt(latency['p95'])}, p99 {fmt(latency['p99'])}")
+    print(f"   DB writes: {report['db_write']['count']} in {report['db_write']['total_seconds']:.3f}s "
+          f"(p95 {fmt(report['db_write']['p95_seconds'])})")
+    for stage, values in sorted(report["stages"].items()):
+        print(f"   {stage}: {values['count']} × p50 {fmt(values['p50'])} / p95 {fmt(values['p95'])}")
+    injected = report["injected"]
+    print(f"   Injected: Graph {injected['graph']['errors']} errors / {injected['graph']['rate_limited']} rate limits "
+          f"of {injected['graph']['requests']}; OpenAI {injected['openai']['errors']} errors / "
+          f"{injected['openai']['rate_limited']} rate limits of {injected['openai']['requests']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the responder against local Graph API and OpenAI fakes.")
+    parser.add_argument("--brands", type=int, default=10)
+    parser.add_argument("--posts", type=int, default=5, help="Posts per brand.")
+    parser.add_argument("--comments", type=int, default=40, help="Comments per post.")
+    parser.add_argument("--triage-mode", choices=("two_call", "combined", "batch"), default="two_call")
+    parser.add_argument("--runner", choices=("responder", "work_queue"), default="responder")
+    parser.add_argument("--max-workers", type=int, default=4, help="Clients processed concurrently.")
+    parser.add_argument("--respond-rate", type=float, default=0.8, help="Fraction of comments the fake model answers.")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", dest="json_path", help="Also write the report to this file.")
+    parser.add_argument("--keep", action="store_true", help="Keep the scratch directory (configs, comments.db).")
+    parser.add_argument("--verbose", action="store_true", help="Show the responder's own output.")
+    FaultProfile.add_arguments(parser, "graph-")
+    FaultProfile.add_arguments(parser, "openai-")
+    args = parser.parse_args()
+
+    # Each fake gets its own fault seed derived from --seed, so the two don't fail in lockstep.
+    graph_faults = FaultProfile.from_args(args, "graph-", seed=args.seed).to_argv()
+    openai_faults = FaultProfile.from_args(args, "openai-", seed=args.seed + 1).to_argv()
+    graph, graph_url = start_fake("benchmarks.fake_graph", [
+        "--brands", str(args.brands), "--posts", str(args.posts), "--comments", str(args.comments),
+        "--seed", str(args.seed)] + graph_faults)
+    openai, openai_url = start_fake("benchmarks.fake_openai", [
+        "--respond-rate", str(args.respond_rate), "--seed", str(args.seed)] + openai_faults)
+    openai_url = openai_url.rstrip("/")
+    if not openai_url.endswith("/v1"):
+        openai_url += "/v1"
+
+    scratch = tempfile.mkdtemp(prefix="auto_responder_bench_")
+    json_path = os.path.abspath(args.json_path) if args.json_path else None
+    try:
+        write_configs(os.path.join(scratch, "configs"), args.brands, args.triage_mode)
+        # Configure the responder before it is imported: these are read at import time.
+        os.environ["GRAPH_API_BASE_URL"] = f"{graph_url}/v22.0"
+        os.environ["OPENAI_BASE_URL"] = openai_url
+        os.environ["OPENAI_API_KEY"] = "benchmark"
+        os.environ["EVENT_LOG_FILE"] = os.path.join(scratch, "logs", "responder_events.jsonl")
+        sys.path.insert(0, REPO_ROOT)
+        os.chdir(scratch)
+
+        wall = run_cycle(args.runner, args.max_workers, args.verbose)
+        from auto_responder import metrics
+        report = build_report(args, wall, fetch_stats(graph_url), fetch_stats(openai_url), metrics.snapshot())
+    finally:
+        if "auto_responder.event_log" in sys.modules:
+            # Flush buffered events into the scratch directory now, not into the repo at exit.
+            sys.modules["auto_responder.event_log"].get_event_logger().close()
+        os.chdir(REPO_ROOT)
+        graph.terminate()
+        openai.terminate()
+        if args.keep:
+            print(f"Scratch directory kept at {scratch}")
+        else:
+            shutil.rmtree(scratch, ignore_errors=True)
+
+    print_report(report)
+    if json_path:
+        with open(json_path, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Report written to {json_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -8,6 +8,7 @@ from collections import defaultdict
 from dotenv import load_dotenv
 from openai import OpenAI
 from deprecrated.conversation_store import init_db, log_message, get_recent_user_messages, mark_as_responded
+from auto_responder.event_log import log_event
 
 # Load .env variables
 load_dotenv()
@@ -16,8 +17,6 @@ client = OpenAI(api_key=OPENAI_API_KEY)
 
 BASE_FB_URL = "https://graph.facebook.com/v22.0"
 CONFIG_FOLDER = "configs"
-LOG_FOLDER = "logs"
-LOG_FILE = os.path.join(LOG_FOLDER, "responder_dryrun.log")
 
 # Load all client configs
 def load_all_client_configs():
@@ -122,15 +121,6 @@ def send_dm_reply(user_id, reply_text, page_access_token, page_id):
     return resp
 
 
-def log_dryrun(brand, incoming_text, reply_text):
-    os.makedirs(LOG_FOLDER, exist_ok=True)
-    timestamp = datetime.datetime.now().strftime("[%Y-%m-%d %H:%M:%S]")
-    with open(LOG_FILE, "a") as f:
-        f.write(f"{timestamp} [{brand}]\n")
-        f.write(f"> {incoming_text}\n")
-        f.write(f"→ {reply_text}\n\n")
-
-
 def main(dry_run=False, verbose=False):
     init_db()
     for client_config in all_client_configs:
@@ -162,7 +152,7 @@ def main(dry_run=False, verbose=False):
                 reply = generate_response(context, client_config)
                 if dry_run:
                     print(f"[DRY RUN][{client_config['brand_name']}] Would reply to DM:\n> {' | '.join(context)}\n→ {reply}\n")
-                    log_dryrun(client_config['brand_name'], ' | '.join(context), reply)
+                    log_event("dm_dry_run", brand=client_config['brand_name'], user_id=user_id, context=context, reply=reply)
                 else:
                     send_dm_reply(user_id, reply, page_access_token, page_id)
                     print(f"[{client_config['brand_name']}] Replied to DM thread with {len(context)} messages")
@@ -2,13 +2,14 @@
 This script generates configuration files for the autoresponder system based on data from a Google Sheet.
 It connects to the Google Sheets API, retrieves the data, and formats it into JSON files for each business.
 It also formats the brand context using OpenAI's API to ensure the data is structured correctly.
+Run from the repository root: python -m tools.config_generator
 """
 
 import gspread
 from google.oauth2.service_account import Credentials
-import json
 import os
-from format_brand_context import format_brand_context
+from tools.format_brand_context import format_brand_context
+from auto_responder.config_registry import write_config_atomic
 
 # Load credentials and connect to the Sheet
 creds = Credentials.from_service_account_file("service_account.json", scopes=[
@@ -60,7 +61,6 @@ for record in records:
     }
 
     filepath = f"configs/{name}_config.json"
-    with open(filepath, "w") as f:
-        json.dump(config, f, indent=2)
+    write_config_atomic(filepath, config)
 
     print(f"✅ Saved config: {filepath}")
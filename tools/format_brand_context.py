@@ -3,15 +3,10 @@
 - It uses the OpenAI API to generate a structured prompt that includes context about the brand, guidelines for tone and style, and any specific instructions.
 - It is designed to be used in a Google Sheets or CSV context, where the output can be safely stored with literal newline characters.
 - This is useful for onboarding new brands or updating existing ones in a structured way.
+- Requests go through the shared auto_responder.llm scheduler; run from the repository root: python -m tools.format_brand_context
 """
 
-import os
-from openai import OpenAI
-from dotenv import load_dotenv
-
-load_dotenv()
-OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
-client = OpenAI(api_key=OPENAI_API_KEY)
+from auto_responder.llm import chat_completion
 
 
 def format_brand_context(raw_input: str) -> str:
@@ -34,7 +29,7 @@ def format_brand_context(raw_input: str) -> str:
         "Format the result using literal \\n characters for newlines so it can be stored safely in CSV or Google Sheets."
     )
 
-    response = client.chat.completions.create(
+    response = chat_completion(
         model="gpt-4o",
         messages=[
             {"role": "system", "content": system_prompt},
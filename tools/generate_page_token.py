@@ -1,22 +1,29 @@
 # This script fetches the pages associated with a user's access token and exchanges the short-lived page access tokens for long-lived ones.
 # This is useful for applications that need to maintain access to Facebook pages over a longer period without requiring the user to re-authenticate frequently.
 # It uses the Facebook Graph API to fetch the pages and their access tokens, and then exchanges the short-lived tokens for long-lived ones.
+# Exchanges run in parallel; all new tokens are collected first and then written to the configs in one pass.
+# Each config records when its token expires, so later runs skip tokens that are still fresh (use --force to renew anyway).
+# Run from the repository root: python -m tools.generate_page_token
 
 import os
+import time
 import requests
-import json
 import argparse
 from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
+from auto_responder.graph_client import graph_get
+from auto_responder.config_registry import get_registry
 
 load_dotenv(override=True)
 
 USER_ACCESS_TOKEN = os.getenv("FB_USER_ACCESS_TOKEN")
 APP_ID = os.getenv("APP_ID")
 APP_SECRET = os.getenv("APP_SECRET")
-GRAPH_URL = "https://graph.facebook.com/v22.0"
-CONFIG_FOLDER = "configs"
 LOG_FILE = "logs/generate_page_token.log"
+MAX_WORKERS = 8  # concurrent token exchanges
+MIN_REMAINING_DAYS = 7  # tokens expiring later than this are left alone
+EXPIRES_AT_KEY = "page_access_token_expires_at"  # epoch seconds, or null for a token that doesn't expire
 
 if not USER_ACCESS_TOKEN:
     raise EnvironmentError("FB_USER_ACCESS_TOKEN environment variable is not set. Please set it in your .env file or environment.")
@@ -35,18 +42,24 @@ def get_pages():
     Returns:
         list: A list of page data dictionaries, or an empty list if an error occurs.
     """
-    url = f"{GRAPH_URL}/me/accounts?access_token={USER_ACCESS_TOKEN}"
+    pages = []
     try:
-        resp = requests.get(url, timeout=10)
-        resp.raise_for_status()
-        data = resp.json()
+        resp = graph_get("me/accounts", USER_ACCESS_TOKEN, timeout=10)
+        while True:
+            resp.raise_for_status()
+            data = resp.json()
+            pages.extend(data.get("data", []))
+            next_url = data.get("paging", {}).get("next")
+            if not next_url:
+                break
+            resp = graph_get(next_url, timeout=10)  # paging URLs already carry the token and cursor
     except requests.RequestException as e:
         print(f"Error fetching pages: {e}")
-        return []
+        return pages
     except ValueError:
         print("Error decoding JSON response from Facebook API.")
-        return []
-    return data.get("data", [])
+        return pages
+    return pages
 
 
 def exchange_for_long_lived_token(short_token):
@@ -57,15 +70,9 @@ def exchange_for_long_lived_token(short_token):
         short_token (str): The short-lived page access token.
 
     Returns:
-        str or None: The long-lived access token if successful, otherwise None.
+        tuple: (access_token, expires_in) if successful, otherwise (None, None).
+            expires_in is None when the token doesn't expire.
     """
-    url = f"{GRAPH_URL}/oauth/access_token"
-    params = {
-        "grant_type": "fb_exchange_token",
-        "client_id": APP_ID,
-        "client_secret": APP_SECRET,
-        "fb_exchange_token": short_token
-    }
     params = {
         "grant_type": "fb_exchange_token",
         "client_id": APP_ID,
@@ -73,20 +80,20 @@ def exchange_for_long_lived_token(short_token):
         "fb_exchange_token": short_token
     }
     try:
-        resp = requests.get(url, params=params, timeout=10)
+        resp = graph_get("oauth/access_token", params=params, timeout=10)
         resp.raise_for_status()
         data = resp.json()
         if "access_token" in data:
-            return data["access_token"]
+            return data["access_token"], data.get("expires_in")
         else:
             print(f"Error: 'access_token' not found in response: {data}")
-            return None
+            return None, None
     except requests.RequestException as e:
         print(f"HTTP request failed: {e}")
-        return None
+        return None, None
     except ValueError:
         print("Error decoding JSON response.")
-        return None
+        return None, None
 
 
 def log_update(message):
@@ -103,70 +110,121 @@ def log_update(message):
         print(f"Failed to write to log file: {e}")
 
 
-def update_config_with_token(page_id, long_token, dry_run=False):
+def token_is_fresh(config, min_remaining_days=MIN_REMAINING_DAYS):
     """
-    Update the config file for the given page_id with the new long-lived token.
-    If dry_run is True, do not write changes to disk.
+    True if the config's token was issued by this tool and won't expire within min_remaining_days.
     """
-    if not os.path.isdir(CONFIG_FOLDER):
-        print(f"⚠️ Config folder '{CONFIG_FOLDER}' does not exist. Token NOT saved.")
-        return
-    for filename in os.listdir(CONFIG_FOLDER):
-        if filename.endswith("_config.json"):
-            filepath = os.path.join(CONFIG_FOLDER, filename)
-            try:
-                with open(filepath, "r") as f:
-                    config = json.load(f)
-            except (IOError, OSError, json.JSONDecodeError) as e:
-                print(f"Error reading or parsing {filepath}: {e}")
-                continue
-
-            if config.get("page_ids", {}).get("facebook") == page_id:
-                config["page_access_token"] = long_token
-                if not dry_run:
-                    try:
-                        with open(filepath, "w") as f:
-                            json.dump(config, f, indent=2)
-                        print(f"✅ Updated config for {config['brand_name']} with new Page Access Token.")
-                        log_update(f"Updated config for {config['brand_name']} (Page ID: {page_id})")
-                    except (IOError, OSError) as e:
-                        print(f"❌ Failed to write updated config for {config['brand_name']} (Page ID: {page_id}): {e}")
-                else:
-                    print(f"[DRY RUN] Would update config for {config['brand_name']} (Page ID: {page_id})")
-                return
-    print(f"⚠️ No matching config found for Page ID {page_id}. Token NOT saved.")
-    return
+    if not config.page_access_token or EXPIRES_AT_KEY not in config.raw:
+        return False
+    expires_at = config.raw[EXPIRES_AT_KEY]
+    return expires_at is None or expires_at - time.time() > min_remaining_days * 86400
+
+
+def exchange_page_token(page):
+    """
+    Exchange one page's short-lived token.
+
+    Returns:
+        dict: The page with "token", "expires_at" and "error" filled in.
+    """
+    result = {"id": page.get("id"), "name": page.get("name"), "token": None, "expires_at": None, "error": None}
+    if not page.get("access_token"):
+        result["error"] = "no short-lived access token"
+        return result
+    long_token, expires_in = exchange_for_long_lived_token(page["access_token"])
+    if long_token is None:
+        result["error"] = "exchange failed"
+        return result
+    result["token"] = long_token
+    result["expires_at"] = int(time.time()) + int(expires_in) if expires_in else None
+    return result
+
+
+def apply_tokens(results, dry_run=False):
+    """
+    Write every exchanged token to its config in one pass.
+
+    Returns:
+        list: Page IDs whose config was updated (or would be, in a dry run).
+    """
+    registry = get_registry()
+    updated = []
+    for result in results:
+        if not result["token"]:
+            continue
+        config = registry.get_by_page_id(result["id"])
+        if config is None:
+            result["error"] = "config was removed"
+            continue
+        changes = {"page_access_token": result["token"], EXPIRES_AT_KEY: result["expires_at"]}
+        if dry_run:
+            print(f"[DRY RUN] Would update config for {config.brand_name} (Page ID: {result['id']})")
+            updated.append(result["id"])
+            continue
+        try:
+            registry.update(config, changes)
+            updated.append(result["id"])
+            log_update(f"Updated config for {config.brand_name} (Page ID: {result['id']}, expires: {format_expiry(result['expires_at'])})")
+        except (IOError, OSError, ValueError) as e:
+            result["error"] = f"failed to write config: {e}"
+    return updated
+
+
+def format_expiry(expires_at):
+    if expires_at is None:
+        return "never"
+    return datetime.fromtimestamp(expires_at).strftime("%Y-%m-%d %H:%M")
+
+
+def print_summary(results, skipped_fresh, unmatched):
+    """
+    Print one line per page and totals for the run.
+    """
+    print("\n--- Summary ---")
+    for result in results:
+        if result["token"] and not result["error"]:
+            print(f"✅ {result['name']} ({result['id']}): ...{result['token'][-10:]}, expires {format_expiry(result['expires_at'])}")
+        else:
+            print(f"❌ {result['name']} ({result['id']}): {result['error']}")
+    for config in skipped_fresh:
+        print(f"⏭️ {config.brand_name} ({config.facebook_page_id}): still fresh, expires {format_expiry(config.raw[EXPIRES_AT_KEY])}")
+    for page in unmatched:
+        print(f"⚠️ {page.get('name')} ({page.get('id')}): no matching config, skipped")
+    renewed = sum(1 for r in results if r["token"] and not r["error"])
+    print(f"Renewed: {renewed}, failed: {len(results) - renewed}, still fresh: {len(skipped_fresh)}, no config: {len(unmatched)}")
 
 
 def main():
     parser = argparse.ArgumentParser(description="Generate and assign long-lived Page Access Tokens.")
     parser.add_argument("--dry-run", action="store_true", help="Do not write changes to disk.")
+    parser.add_argument("--max-workers", type=int, default=MAX_WORKERS, help="Number of token exchanges to run at once.")
+    parser.add_argument("--min-remaining-days", type=float, default=MIN_REMAINING_DAYS,
+                        help="Renew tokens expiring within this many days; fresher ones are skipped.")
+    parser.add_argument("--force", action="store_true", help="Renew every token, even fresh ones.")
     args = parser.parse_args()
-    dry_run = args.dry_run
 
     pages = get_pages()
     if not pages:
         print("No pages found or failed to fetch pages.")
         return
 
+    registry = get_registry()
+    to_exchange, skipped_fresh, unmatched = [], [], []
     for page in pages:
-        name = page.get("name")
-        page_id = page.get("id")
-        short_token = page.get("access_token")
-        print("\n---")
-        print(f"Page: {name}")
-        print(f"Page ID: {page_id}")
-
-        if not short_token:
-            print("❌ No short-lived access token found for this page.")
-            continue
-
-        long_token = exchange_for_long_lived_token(short_token)
-        if long_token:
-            print(f"✅ Long-Lived Page Access Token generated: ...{long_token[-10:]}")
-            update_config_with_token(page_id, long_token, dry_run)
+        config = registry.get_by_page_id(page.get("id"))
+        if config is None:
+            unmatched.append(page)
+        elif not args.force and token_is_fresh(config, args.min_remaining_days):
+            skipped_fresh.append(config)
         else:
-            print("❌ Failed to generate long-lived token.")
+            to_exchange.append(page)
+
+    print(f"Exchanging {len(to_exchange)} token(s) with up to {args.max_workers} at a time...")
+    with ThreadPoolExecutor(max_workers=max(1, args.max_workers)) as executor:
+        results = list(executor.map(exchange_page_token, to_exchange))
+
+    apply_tokens(results, args.dry_run)
+    print_summary(results, skipped_fresh, unmatched)
 
 
 if __name__ == "__main__":
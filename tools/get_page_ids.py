@@ -1,18 +1,15 @@
-"""This script retrieves the IDs of Facebook Pages managed by the user."""
+"""This script retrieves the IDs of Facebook Pages managed by the user. Run from the repository root: python -m tools.get_page_ids"""
 
 import os
-import requests
 from dotenv import load_dotenv
+from auto_responder.graph_client import graph_get
 
 # Load user access token
 load_dotenv(override=True)
 USER_ACCESS_TOKEN = os.getenv("FB_USER_ACCESS_TOKEN")
 
-GRAPH_URL = "https://graph.facebook.com/v22.0"
-
 def get_managed_pages():
-    url = f"{GRAPH_URL}/me/accounts?access_token={USER_ACCESS_TOKEN}"
-    resp = requests.get(url)
+    resp = graph_get("me/accounts", USER_ACCESS_TOKEN)
     data = resp.json()
     
     if "data" not in data:
@@ -0,0 +1,78 @@
+"""
+This script sends a signed fake Page `feed` comment event to a local webhook receiver.
+It is used to exercise auto_responder.webhook without a live Meta subscription.
+The payload is signed with APP_SECRET exactly as Meta signs real deliveries (X-Hub-Signature-256).
+"""
+
+import os
+import hmac
+import json
+import time
+import hashlib
+import argparse
+import requests
+from dotenv import load_dotenv
+
+load_dotenv(override=True)
+APP_SECRET = os.getenv("APP_SECRET")
+
+
+def build_comment_event(page_id, post_id, comment_id, message, user_id="1234567890"):
+    """
+    Build a webhook payload for one newly added comment.
+    """
+    return {
+        "object": "page",
+        "entry": [{
+            "id": page_id,
+            "time": int(time.time()),
+            "changes": [{
+                "field": "feed",
+                "value": {
+                    "item": "comment",
+                    "verb": "add",
+                    "post_id": post_id,
+                    "comment_id": comment_id,
+                    "parent_id": post_id,
+                    "message": message,
+                    "from": {"id": user_id, "name": "Test User"},
+                    "created_time": int(time.time())
+                }
+            }]
+        }]
+    }
+
+
+def send_event(url, payload, app_secret):
+    """
+    POST the payload with a valid X-Hub-Signature-256 header and return the response.
+    """
+    body = json.dumps(payload).encode()
+    signature = "sha256=" + hmac.new(app_secret.encode(), body, hashlib.sha256).hexdigest()
+    return requests.post(url, data=body, timeout=10, headers={
+        "Content-Type": "application/json",
+        "X-Hub-Signature-256": signature
+    })
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Send a signed fake comment webhook to a local receiver.")
+    parser.add_argument("--url", default="http://localhost:8080/", help="Webhook receiver URL.")
+    parser.add_argument("--page-id", required=True, help="Facebook Page ID the event belongs to.")
+    parser.add_argument("--post-id", help="Post ID (defaults to <page_id>_1).")
+    parser.add_argument("--comment-id", help="Comment ID (defaults to a timestamp-based ID).")
+    parser.add_argument("--message", default="What supplements do you sell?", help="Comment text.")
+    args = parser.parse_args()
+
+    if not APP_SECRET:
+        raise EnvironmentError("APP_SECRET environment variable is not set. Please set it in your .env file or environment.")
+
+    post_id = args.post_id or f"{args.page_id}_1"
+    comment_id = args.comment_id or f"{post_id}_{int(time.time() * 1000)}"
+    payload = build_comment_event(args.page_id, post_id, comment_id, args.message)
+    resp = send_event(args.url, payload, APP_SECRET)
+    print(f"Webhook response: {resp.status_code} {resp.text}")
+
+
+if __name__ == "__main__":
+    main()